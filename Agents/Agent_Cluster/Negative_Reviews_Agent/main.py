@@ -1,9 +1,11 @@
 import os
 import time
+import asyncio
 import json
-import requests
+import httpx
 from datetime import datetime
 from uuid import uuid4
+from typing import Optional
 from dotenv import load_dotenv
 
 from uagents import Agent, Protocol, Context, Model
@@ -40,6 +42,23 @@ class NegativeReviewsResponse(Model):
     timestamp: str
     agent_address: str
 
+class RunStatusRequest(Model):
+    run_id: str
+
+class NegativeReviewsRunResponse(Model):
+    success: bool
+    run_id: str
+    status: str
+    coalesced: bool = False
+    brand_name: str
+    sentiment: str
+    reviews_result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
+    timestamp: str
+    agent_address: str
+
 # ASI:One API configuration
 ASI_BASE_URL = "https://api.asi1.ai/v1"
 ASI_HEADERS = {
@@ -47,11 +66,25 @@ ASI_HEADERS = {
     "Content-Type": "application/json"
 }
 
+# Async HTTP settings: pooled connections and explicit timeouts, so a slow upstream
+# call never blocks the agent's event loop or hangs forever
+ASI_TIMEOUT = httpx.Timeout(float(os.environ.get("ASI_TIMEOUT_SECONDS", "120")), connect=10.0)
+MCP_TIMEOUT = httpx.Timeout(float(os.environ.get("MCP_TIMEOUT_SECONDS", "300")), connect=10.0)
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+# Upper bound on tool calls from one ASI:One response that run at the same time
+MAX_CONCURRENT_TOOL_CALLS = int(os.environ.get("MAX_CONCURRENT_TOOL_CALLS", "4"))
+
+# REST requests always need the tool, so by default they call it directly and skip the
+# tool-selection LLM call; set DIRECT_TOOL_MODE=false to let ASI:One decide as in chat
+DIRECT_TOOL_MODE = os.environ.get("DIRECT_TOOL_MODE", "true").lower() != "false"
+
 class ReviewsSearchAgent:
     def __init__(self):
         self.reviews_endpoint = REVIEWS_MCP_ENDPOINT
+        self.http_client = httpx.AsyncClient(limits=HTTP_LIMITS)
         
-    def search_reviews(self, brand_name: str, sentiment: str = "negative") -> dict:
+    async def search_reviews(self, brand_name: str, sentiment: str = "negative") -> dict:
         """Search for brand reviews using the reviews MCP endpoint"""
         try:
             print(f"🔍 Starting reviews search for brand: '{brand_name}' with sentiment: '{sentiment}'")
@@ -65,10 +98,11 @@ class ReviewsSearchAgent:
             print(f"📤 Sending request to reviews endpoint: {self.reviews_endpoint}")
             print(f"📤 Request payload: {json.dumps(payload, indent=2)}")
             
-            response = requests.post(
+            response = await self.http_client.post(
                 self.reviews_endpoint,
                 json=payload,
-                headers={"Content-Type": "application/json"}
+                headers={"Content-Type": "application/json"},
+                timeout=MCP_TIMEOUT
             )
             
             print(f"📥 Reviews API response status: {response.status_code}")
@@ -130,8 +164,13 @@ class ReviewsSearchAgent:
             }
         }
 
-    def process_reviews_query(self, user_query: str) -> str:
-        """Process user query using ASI:One with reviews search tool"""
+    async def process_reviews_query(self, user_query: str, tool_args: Optional[dict] = None) -> str:
+        """Process user query using ASI:One with reviews search tool
+        
+        When ``tool_args`` is given the caller already knows search_reviews is needed,
+        so the tool-selection call is skipped: the tool runs directly with these
+        arguments and ASI:One is only asked to format its results.
+        """
         try:
             reviews_tool = self.create_reviews_tool_schema()
             
@@ -206,33 +245,46 @@ Your response should be a direct presentation of actual review quotes with their
                 {"role": "user", "content": user_query}
             ]
 
-            # Let ASI:One decide whether to use the tool based on reasoning
-            payload = {
-                "model": "asi1-extended",
-                "messages": messages,
-                "tools": [reviews_tool],
-                "tool_choice": "auto",  # Let the model decide intelligently
-                "temperature": 0.3
-            }
+            if tool_args is not None:
+                # Direct mode: skip the "should I call the tool?" round trip
+                print("Direct tool mode: calling search_reviews without a selection call")
+                choice = {
+                    "content": "",
+                    "tool_calls": [{
+                        "id": "direct_tool_call",
+                        "type": "function",
+                        "function": {"name": "search_reviews", "arguments": json.dumps(tool_args)}
+                    }]
+                }
+            else:
+                # Let ASI:One decide whether to use the tool based on reasoning
+                payload = {
+                    "model": "asi1-extended",
+                    "messages": messages,
+                    "tools": [reviews_tool],
+                    "tool_choice": "auto",  # Let the model decide intelligently
+                    "temperature": 0.3
+                }
 
-            print(f"Making ASI:One request with tool_choice: {payload['tool_choice']}")
+                print(f"Making ASI:One request with tool_choice: {payload['tool_choice']}")
             
-            response = requests.post(
-                f"{ASI_BASE_URL}/chat/completions",
-                headers=ASI_HEADERS,
-                json=payload
-            )
+                response = await self.http_client.post(
+                    f"{ASI_BASE_URL}/chat/completions",
+                    headers=ASI_HEADERS,
+                    json=payload,
+                    timeout=ASI_TIMEOUT
+                )
 
-            if response.status_code != 200:
-                return f"ASI:One API error: {response.status_code} - {response.text}"
+                if response.status_code != 200:
+                    return f"ASI:One API error: {response.status_code} - {response.text}"
 
-            response_data = response.json()
-            print(f"ASI:One response: {json.dumps(response_data, indent=2)}")
+                response_data = response.json()
+                print(f"ASI:One response: {json.dumps(response_data, indent=2)}")
             
-            if "choices" not in response_data or not response_data["choices"]:
-                return "No response received from ASI:One"
+                if "choices" not in response_data or not response_data["choices"]:
+                    return "No response received from ASI:One"
 
-            choice = response_data["choices"][0]["message"]
+                choice = response_data["choices"][0]["message"]
             
             # Check if the model wants to call a tool
             if "tool_calls" in choice and choice["tool_calls"]:
@@ -244,35 +296,43 @@ Your response should be a direct presentation of actual review quotes with their
                     "tool_calls": choice["tool_calls"]
                 })
                 
-                for tool_call in choice["tool_calls"]:
-                    print(f"🔧 Processing tool call: {tool_call}")
-                    if tool_call["function"]["name"] == "search_reviews":
-                        # Parse arguments
-                        args = json.loads(tool_call["function"]["arguments"])
-                        print(f"🔍 Reviews search arguments: {args}")
-                        
-                        # Execute reviews search
-                        print("🚀 Executing reviews search...")
-                        search_result = self.search_reviews(
-                            brand_name=args["brand_name"],
-                            sentiment=args.get("sentiment", "negative")
-                        )
-                        
-                        print(f"📊 Reviews search result status: {'✅ Success' if search_result.get('success') else '❌ Error'}")
-                        if search_result.get('success'):
-                            print(f"📄 Reviews data available for: {search_result.get('brand_name')}")
-                            print(f"🎯 Sentiment filter: {search_result.get('sentiment')}")
-                        else:
-                            print(f"❌ Error details: {search_result.get('error', 'Unknown error')}")
-                        
-                        print(f"📋 Full search result keys: {list(search_result.keys())}")
-                        
-                        # Add tool result to messages
-                        messages.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call["id"],
-                            "content": json.dumps(search_result)
-                        })
+                semaphore = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
+                
+                async def run_tool_call(tool_call: dict):
+                    async with semaphore:
+                        print(f"🔧 Processing tool call: {tool_call}")
+                        if tool_call["function"]["name"] == "search_reviews":
+                            # Parse arguments
+                            args = json.loads(tool_call["function"]["arguments"])
+                            print(f"🔍 Reviews search arguments: {args}")
+                            
+                            # Execute reviews search
+                            print("🚀 Executing reviews search...")
+                            search_result = await self.search_reviews(
+                                brand_name=args["brand_name"],
+                                sentiment=args.get("sentiment", "negative")
+                            )
+                            
+                            print(f"📊 Reviews search result status: {'✅ Success' if search_result.get('success') else '❌ Error'}")
+                            if search_result.get('success'):
+                                print(f"📄 Reviews data available for: {search_result.get('brand_name')}")
+                                print(f"🎯 Sentiment filter: {search_result.get('sentiment')}")
+                            else:
+                                print(f"❌ Error details: {search_result.get('error', 'Unknown error')}")
+                            
+                            print(f"📋 Full search result keys: {list(search_result.keys())}")
+                            
+                            # Hand the tool result back to be added to messages
+                            return {
+                                "role": "tool",
+                                "tool_call_id": tool_call["id"],
+                                "content": json.dumps(search_result)
+                            }
+                    return None
+                
+                # Independent tool calls run concurrently; results keep the original order
+                tool_messages = await asyncio.gather(*(run_tool_call(tool_call) for tool_call in choice["tool_calls"]))
+                messages.extend(message for message in tool_messages if message is not None)
 
                 # Send updated conversation back to ASI:One for final response
                 print("📤 Sending final request to ASI:One with reviews results...")
@@ -283,10 +343,11 @@ Your response should be a direct presentation of actual review quotes with their
                     "temperature": 0.3
                 }
 
-                final_response = requests.post(
+                final_response = await self.http_client.post(
                     f"{ASI_BASE_URL}/chat/completions",
                     headers=ASI_HEADERS,
-                    json=final_payload
+                    json=final_payload,
+                    timeout=ASI_TIMEOUT
                 )
 
                 print(f"📥 Final ASI:One response status: {final_response.status_code}")
@@ -313,7 +374,7 @@ Your response should be a direct presentation of actual review quotes with their
 
         except json.JSONDecodeError as e:
             return f"JSON parsing error: {str(e)}"
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             return f"Request error: {str(e)}"
         except Exception as e:
             return f"Unexpected error: {str(e)}"
@@ -321,6 +382,86 @@ Your response should be a direct presentation of actual review quotes with their
 # Initialize the reviews search agent
 reviews_search_agent = ReviewsSearchAgent()
 
+class RunRegistry:
+    """Background runs keyed by request, so retries and polling never redo in-flight work.
+    
+    ``submit`` hands back the run already in flight for an identical request
+    instead of starting a second one. Finished runs are kept (up to
+    ``max_runs``) so their results can still be fetched by run ID.
+    """
+    
+    def __init__(self, max_runs: int = 200):
+        self.max_runs = max_runs
+        self.runs = {}
+        self.tasks = {}
+        self.in_flight = {}
+    
+    def submit(self, key: str, subject: str, work):
+        """Start ``work()`` in the background unless a run for ``key`` is already in flight.
+        
+        Returns ``(run, coalesced)``.
+        """
+        run_id = self.in_flight.get(key)
+        if run_id is not None:
+            return self.runs[run_id], True
+        
+        run_id = str(uuid4())
+        run = {
+            "run_id": run_id,
+            "key": key,
+            "subject": subject,
+            "status": "running",
+            "result": None,
+            "error": None,
+            "created_at": datetime.utcnow().isoformat(),
+            "finished_at": None
+        }
+        self.runs[run_id] = run
+        self.in_flight[key] = run_id
+        self.tasks[run_id] = asyncio.create_task(self._execute(run, work))
+        return run, False
+    
+    async def _execute(self, run: dict, work):
+        try:
+            run["result"] = await work()
+            run["status"] = "completed"
+        except Exception as e:
+            run["error"] = str(e)
+            run["status"] = "failed"
+        finally:
+            run["finished_at"] = datetime.utcnow().isoformat()
+            self.in_flight.pop(run["key"], None)
+            self.tasks.pop(run["run_id"], None)
+            self._prune()
+    
+    async def wait(self, run: dict) -> dict:
+        """Wait for a run to finish without cancelling it if the caller goes away."""
+        task = self.tasks.get(run["run_id"])
+        if task is not None:
+            await asyncio.shield(task)
+        return run
+    
+    def get(self, run_id: str):
+        return self.runs.get(run_id)
+    
+    def _prune(self):
+        finished = [run_id for run_id, run in self.runs.items() if run["status"] != "running"]
+        for run_id in finished[:max(0, len(self.runs) - self.max_runs)]:
+            del self.runs[run_id]
+
+# Runs of the negative reviews search, shared by every REST route below
+search_runs = RunRegistry()
+
+def start_search_run(brand_name: str):
+    """Submit (or join) the negative reviews run for this brand."""
+    reviews_query = f"Find negative reviews for {brand_name}"
+    tool_args = {"brand_name": brand_name, "sentiment": "negative"} if DIRECT_TOOL_MODE else None
+    return search_runs.submit(
+        f"negative:{brand_name.strip().lower()}",
+        brand_name,
+        lambda: reviews_search_agent.process_reviews_query(reviews_query, tool_args)
+    )
+
 # Create uAgent
 agent = Agent(
     name="brandx_negative_reviews_search_agent",
@@ -342,6 +483,11 @@ async def startup_handler(ctx: Context):
     ctx.logger.info("The agent will reason about whether queries need negative review searches or can be answered directly")
     ctx.logger.info("REST API endpoint available at: http://localhost:8080/reviews/negative")
 
+# Shutdown Handler
+@agent.on_event("shutdown")
+async def shutdown_handler(ctx: Context):
+    await reviews_search_agent.http_client.aclose()
+
 # Message Handler
 @chat_proto.on_message(ChatMessage)
 async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
@@ -362,7 +508,7 @@ async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
     
     try:
         # Process the query using ASI:One with reviews search
-        response_text = reviews_search_agent.process_reviews_query(user_query)
+        response_text = await reviews_search_agent.process_reviews_query(user_query)
         
         # Send response back to sender
         response_msg = ChatMessage(
@@ -398,8 +544,11 @@ async def handle_negative_reviews(ctx: Context, req: NegativeReviewsRequest) ->
     
     try:
         # Process the negative reviews query using the existing reviews search agent
-        reviews_query = f"Find negative reviews for {req.brand_name}"
-        response_text = reviews_search_agent.process_reviews_query(reviews_query)
+        run, _ = start_search_run(req.brand_name)
+        run = await search_runs.wait(run)
+        if run["status"] == "failed":
+            raise RuntimeError(run["error"])
+        response_text = run["result"]
         
         ctx.logger.info(f"Negative reviews search completed for: {req.brand_name}")
         
@@ -425,6 +574,47 @@ async def handle_negative_reviews(ctx: Context, req: NegativeReviewsRequest) ->
             agent_address=ctx.agent.address
         )
 
+def build_run_response(ctx: Context, run: dict, brand_name: str, coalesced: bool = False) -> NegativeReviewsRunResponse:
+    return NegativeReviewsRunResponse(
+        success=run["status"] != "failed",
+        run_id=run["run_id"],
+        status=run["status"],
+        coalesced=coalesced,
+        brand_name=brand_name,
+        sentiment="negative",
+        reviews_result=run["result"],
+        error=run["error"],
+        created_at=run["created_at"],
+        finished_at=run["finished_at"],
+        timestamp=datetime.utcnow().isoformat(),
+        agent_address=ctx.agent.address
+    )
+
+# Async job API: submit returns a run ID right away, status returns progress or the result.
+# uAgents REST routes match exact paths only, so the run ID travels in the POST body.
+@agent.on_rest_post("/reviews/negative/runs", NegativeReviewsRequest, NegativeReviewsRunResponse)
+async def handle_submit_run(ctx: Context, req: NegativeReviewsRequest) -> NegativeReviewsRunResponse:
+    run, coalesced = start_search_run(req.brand_name)
+    ctx.logger.info(f"{'Joined' if coalesced else 'Started'} negative reviews run {run['run_id']} for: {req.brand_name}")
+    return build_run_response(ctx, run, req.brand_name, coalesced)
+
+@agent.on_rest_post("/reviews/negative/status", RunStatusRequest, NegativeReviewsRunResponse)
+async def handle_run_status(ctx: Context, req: RunStatusRequest) -> NegativeReviewsRunResponse:
+    run = search_runs.get(req.run_id)
+    if run is None:
+        return NegativeReviewsRunResponse(
+            success=False,
+            run_id=req.run_id,
+            status="not_found",
+            brand_name="",
+            sentiment="negative",
+            error=f"Unknown run: {req.run_id}",
+            created_at="",
+            timestamp=datetime.utcnow().isoformat(),
+            agent_address=ctx.agent.address
+        )
+    return build_run_response(ctx, run, run["subject"])
+
 # Include the chat protocol
 agent.include(chat_proto, publish_manifest=True)
 
@@ -437,6 +627,8 @@ if __name__ == '__main__':
     print("\n🌐 REST API Endpoint:")
     print("POST http://localhost:8080/reviews/negative")
     print("Body: {\"brand_name\": \"Tesla\", \"sentiment\": \"negative\"}")
+    print("POST http://localhost:8080/reviews/negative/runs  (submit, returns run_id)")
+    print("POST http://localhost:8080/reviews/negative/status  Body: {\"run_id\": \"...\"}")
     print("\n🧪 Test queries (agent will decide whether to search negative reviews):")
     print("- 'Find negative reviews for Tesla' (will search negative reviews)")
     print("- 'What do customers complain about Apple products?' (will search negative reviews)")
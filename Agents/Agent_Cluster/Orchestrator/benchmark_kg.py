@@ -0,0 +1,165 @@
+# benchmark_kg.py
+"""Microbenchmark for the orchestrator's knowledge graph.
+
+Fills a BrandKnowledgeGraph with synthetic brands and measures the latency of
+``get_brand_summary`` (served from the hash index) as the graph grows. For
+comparison it also times the old per-lookup ``!(match &self ...)`` MeTTa
+queries, but only up to ``--metta-max`` brands: running match queries on
+spaces of ~1000 brands crashed the hyperon build this was written against.
+
+It also measures startup restore throughput of the durable graph: from the
+journal alone, and from a snapshot plus a journal tail; and the latency of
+full-text ``search`` across brands with synthetic reviews (a topic word such
+as "battery" appears in roughly 2% of the items).
+
+Usage:
+    python benchmark_kg.py --sizes 100,1000,10000 --queries 500
+    python benchmark_kg.py --mode restore --restore-sizes 1000,5000
+    python benchmark_kg.py --mode search --search-sizes 1000,10000
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+from knowledge_graph import BrandKnowledgeGraph
+
+def make_brand_data(i: int) -> dict:
+    text = f"Synthetic research text for brand {i}. " * 20
+    return {
+        'web_results': f"web: {text}",
+        'positive_reddit': f"positive reddit: {text}",
+        'negative_reddit': f"negative reddit: {text}",
+        'positive_reviews': f"positive reviews: {text}",
+        'negative_reviews': f"negative reviews: {text}",
+        'positive_social': f"positive social: {text}",
+        'negative_social': f"negative social: {text}"
+    }
+
+SEARCH_WORDS = ("battery charging screen delivery refund support price quality camera app update crash "
+                "shipping warranty paint range software service noise comfort").split()
+
+def make_review_data(i: int) -> dict:
+    """Five structured negative reviews of filler words; about a third also name one topic word."""
+    reviews = []
+    for n in range(5):
+        words = [f"w{random.randrange(5000)}" for _ in range(12)]
+        if random.random() < 0.3:
+            words[random.randrange(12)] = random.choice(SEARCH_WORDS)
+        reviews.append(f"### Negative Review {n + 1}\n\"{' '.join(words)}\"\n- Reviewer: User {i}-{n}\n- Rating: {n % 3 + 1} stars\n- Source: Trustpilot")
+    return {'negative_reviews': "\n\n".join(reviews), 'web_results': f"Brand {i} web summary mentioning {random.choice(SEARCH_WORDS)}"}
+
+def metta_first(kg: BrandKnowledgeGraph, query_str: str) -> list:
+    results = kg.run_query(query_str)
+    return results[0][:1] if results else []
+
+def metta_brand_summary(kg: BrandKnowledgeGraph, brand_name: str) -> dict:
+    """The summary as it used to be built: one MeTTa match query per field."""
+    brand_id = kg.brand_id_for(brand_name)
+    return {
+        'brand_name': brand_name,
+        'web_results': metta_first(kg, f'!(match &self (web_result {brand_id} $content) $content)'),
+        'positive_reddit': metta_first(kg, f'!(match &self (reddit_thread {brand_id}_pos $content) $content)'),
+        'negative_reddit': metta_first(kg, f'!(match &self (reddit_thread {brand_id}_neg $content) $content)'),
+        'positive_reviews': metta_first(kg, f'!(match &self (review {brand_id}_pos $content) $content)'),
+        'negative_reviews': metta_first(kg, f'!(match &self (review {brand_id}_neg $content) $content)'),
+        'positive_social': metta_first(kg, f'!(match &self (social_comment {brand_id}_pos $content) $content)'),
+        'negative_social': metta_first(kg, f'!(match &self (social_comment {brand_id}_neg $content) $content)')
+    }
+
+def time_calls(fn, brand_names: list) -> list:
+    latencies = []
+    for brand_name in brand_names:
+        started = time.perf_counter()
+        fn(brand_name)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+def describe(latencies: list) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+    return f"mean {statistics.mean(latencies):8.3f} ms   p50 {statistics.median(latencies):8.3f} ms   p95 {p95:8.3f} ms"
+
+def benchmark_summaries(sizes: list, queries: int, metta_max: int):
+    kg = BrandKnowledgeGraph()
+    loaded = 0
+    for size in sizes:
+        started = time.perf_counter()
+        for i in range(loaded, size):
+            kg.add_brand_data(f"Brand {i}", make_brand_data(i))
+        loaded = size
+        print(f"\n📦 {size} brands (loaded in {time.perf_counter() - started:.2f}s)")
+        
+        sample = [f"Brand {random.randrange(size)}" for _ in range(queries)]
+        assert kg.get_brand_summary(sample[0])['web_results'], "index lookup returned no data"
+        print(f"   index summary: {describe(time_calls(kg.get_brand_summary, sample))}")
+        if size <= metta_max:
+            metta_sample = sample[:max(20, queries // 10)]
+            print(f"   metta summary: {describe(time_calls(lambda name: metta_brand_summary(kg, name), metta_sample))}")
+
+def time_restore(data_dir: str) -> tuple:
+    started = time.perf_counter()
+    kg = BrandKnowledgeGraph(data_dir, snapshot_every=10 ** 9)
+    elapsed = time.perf_counter() - started
+    kg.store.close()
+    return len(kg.get_all_brands()), elapsed
+
+def benchmark_restore(sizes: list):
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            kg = BrandKnowledgeGraph(data_dir, snapshot_every=10 ** 9)
+            started = time.perf_counter()
+            for i in range(size):
+                kg.add_brand_data(f"Brand {i}", make_brand_data(i))
+            print(f"\n💾 {size} brands journaled in {time.perf_counter() - started:.2f}s")
+            
+            brands, elapsed = time_restore(data_dir)
+            print(f"   restore from journal:         {brands} brands in {elapsed:.2f}s ({brands / elapsed:,.0f} brands/s)")
+            
+            # Snapshot everything, then add a 10% tail that only lives in the journal
+            kg.snapshot()
+            for i in range(size, size + size // 10):
+                kg.add_brand_data(f"Brand {i}", make_brand_data(i))
+            kg.store.close()
+            brands, elapsed = time_restore(data_dir)
+            print(f"   restore from snapshot + tail: {brands} brands in {elapsed:.2f}s ({brands / elapsed:,.0f} brands/s)")
+
+def benchmark_search(sizes: list, queries: int):
+    kg = BrandKnowledgeGraph()
+    loaded = 0
+    for size in sizes:
+        started = time.perf_counter()
+        for i in range(loaded, size):
+            kg.add_brand_data(f"Brand {i}", make_review_data(i))
+        loaded = size
+        print(f"\n🔎 {size} brands, {kg.search_index.stats()['documents']} items indexed in {time.perf_counter() - started:.2f}s")
+        
+        terms = [random.choice(SEARCH_WORDS) for _ in range(queries)]
+        pairs = [f"{random.choice(SEARCH_WORDS)} {random.choice(SEARCH_WORDS)}" for _ in range(queries)]
+        brand = [f"Brand {random.randrange(size)}" for _ in range(queries)]
+        print(f"   one term:          {describe(time_calls(lambda q: kg.search(q, limit=20), terms))}")
+        print(f"   two terms (all):   {describe(time_calls(lambda q: kg.search(q, limit=20), pairs))}")
+        print(f"   one term, 1 brand: {describe(time_calls(lambda b: kg.search('battery', brands=[b], limit=20), brand))}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BrandKnowledgeGraph summary latency")
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma separated brand counts")
+    parser.add_argument("--queries", type=int, default=500, help="summaries timed per size")
+    parser.add_argument("--metta-max", type=int, default=300, help="largest size to also time with MeTTa match queries")
+    parser.add_argument("--mode", choices=("summary", "restore", "search", "all"), default="all", help="which benchmarks to run")
+    parser.add_argument("--restore-sizes", default="1000,5000", help="comma separated brand counts for the restore benchmark")
+    parser.add_argument("--search-sizes", default="1000,10000", help="comma separated brand counts for the search benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the sampled brand names")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    if args.mode in ("summary", "all"):
+        benchmark_summaries(sorted(int(size) for size in args.sizes.split(",")), args.queries, args.metta_max)
+    if args.mode in ("restore", "all"):
+        benchmark_restore(sorted(int(size) for size in args.restore_sizes.split(",")))
+    if args.mode in ("search", "all"):
+        benchmark_search(sorted(int(size) for size in args.search_sizes.split(",")), args.queries)
+
+if __name__ == "__main__":
+    main()
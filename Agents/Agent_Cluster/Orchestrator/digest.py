@@ -0,0 +1,129 @@
+# digest.py
+from collections import Counter
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from item_parser import render_item
+from vector_index import features
+
+# Items summarized per map step, and what a digest keeps
+CHUNK_ITEMS = 20
+HIGHLIGHTS = 3
+THEMES = 5
+PLATFORMS = 3
+
+# Source field -> heading used in the rendered brand digest
+SOURCE_LABELS = {
+    'web_results': 'Web',
+    'positive_reviews': 'Positive reviews',
+    'negative_reviews': 'Negative reviews',
+    'positive_reddit': 'Positive Reddit',
+    'negative_reddit': 'Negative Reddit',
+    'positive_social': 'Positive social',
+    'negative_social': 'Negative social'
+}
+
+def map_chunk(items: List[Dict], vectors: np.ndarray, offset: int) -> Dict:
+    """Partial digest of one chunk of items: counters, a centroid sum and its most central items."""
+    ratings = [item['rating'] for item in items if item['rating'] is not None]
+    centroid = vectors.sum(axis=0)
+    centrality = vectors @ centroid
+    best = np.argsort(-centrality, kind="stable")[:HIGHLIGHTS]
+    return {
+        'count': len(items),
+        'rating_sum': sum(ratings),
+        'rating_count': len(ratings),
+        'platforms': Counter(item['platform'] for item in items if item['platform']),
+        # Items mentioning each term or bigram (not occurrences), so one long item cannot dominate
+        'terms': Counter(term for item in items for term in features(item['quote'])),
+        'centroid': centroid,
+        'candidates': [offset + int(index) for index in best]
+    }
+
+def reduce_chunks(partials: List[Dict], items: List[Dict], vectors: np.ndarray, idf: Callable[[str], float],
+                  exclude_terms=frozenset()) -> Dict:
+    """Merge chunk partials into a source digest; highlights are re-ranked against the whole source."""
+    count = sum(partial['count'] for partial in partials)
+    rating_count = sum(partial['rating_count'] for partial in partials)
+    platforms = sum((partial['platforms'] for partial in partials), Counter())
+    terms = sum((partial['terms'] for partial in partials), Counter())
+    centroid = sum(partial['centroid'] for partial in partials)
+    candidates = [index for partial in partials for index in partial['candidates']]
+    centrality = vectors[candidates] @ centroid
+    highlights = [candidates[int(index)] for index in np.argsort(-centrality, kind="stable")[:HIGHLIGHTS]]
+    return {
+        'items': count,
+        'chunks': len(partials),
+        'avg_rating': round(sum(partial['rating_sum'] for partial in partials) / rating_count, 2) if rating_count else None,
+        'platforms': dict(platforms.most_common(PLATFORMS)),
+        'themes': pick_themes(terms, 2 if count > 1 else 1, idf, exclude_terms),
+        'highlights': [render_item(items[index]) for index in highlights]
+    }
+
+def pick_themes(terms: Counter, minimum: int, idf: Callable[[str], float], exclude_terms) -> List[str]:
+    """Terms and phrases several items share, weighted by how distinctive their words are across the graph.
+    
+    A phrase scores the sum of its words' weights, so it wins over its words
+    when they occur together; a theme sharing a word with a better one is
+    skipped, which keeps "charger overheats" from also listing "charger".
+    """
+    ranked = sorted(
+        (term for term, mentions in terms.items()
+         if mentions >= minimum and not exclude_terms.intersection(term.split(" "))),
+        key=lambda term: (-terms[term] * sum(idf(word) for word in term.split(" ")), term)
+    )
+    themes = []
+    used_words = set()
+    for term in ranked:
+        words = set(term.split(" "))
+        if words & used_words:
+            continue
+        themes.append(term)
+        used_words |= words
+        if len(themes) == THEMES:
+            break
+    return themes
+
+def source_digest(items: List[Dict], vectors: np.ndarray, idf: Callable[[str], float],
+                  exclude_terms=frozenset()) -> Dict:
+    """Map-reduce digest of one source's items (``vectors`` are their unit-length embeddings)."""
+    if not items:
+        return {'items': 0, 'chunks': 0, 'avg_rating': None, 'platforms': {}, 'themes': [], 'highlights': [], 'text': ''}
+    partials = [
+        map_chunk(items[start:start + CHUNK_ITEMS], vectors[start:start + CHUNK_ITEMS], start)
+        for start in range(0, len(items), CHUNK_ITEMS)
+    ]
+    digest = reduce_chunks(partials, items, vectors, idf, exclude_terms)
+    digest['text'] = render_source_digest(digest)
+    return digest
+
+def render_source_digest(digest: Dict) -> str:
+    facts = [f"{digest['items']} items"]
+    if digest['avg_rating'] is not None:
+        facts.append(f"avg rating {digest['avg_rating']:g}/5")
+    if digest['platforms']:
+        facts.append(", ".join(f"{platform} {count}" for platform, count in digest['platforms'].items()))
+    lines = ["; ".join(facts)]
+    if digest['themes']:
+        lines.append("Themes: " + ", ".join(digest['themes']))
+    lines.extend(f"- {highlight}" for highlight in digest['highlights'])
+    return "\n".join(lines)
+
+def brand_digest(brand_name: str, version: int, sources: Dict[str, Dict]) -> Dict:
+    """Reduce the per-source digests into the brand digest (counts by sentiment and the rendered text)."""
+    positive = sum(digest['items'] for field, digest in sources.items() if field.startswith('positive'))
+    negative = sum(digest['items'] for field, digest in sources.items() if field.startswith('negative'))
+    sections = [f"BRAND DIGEST: {brand_name} (version {version}; {positive} positive and {negative} negative items)"]
+    for field, label in SOURCE_LABELS.items():
+        digest = sources.get(field)
+        if digest and digest['items']:
+            sections.append(f"{label.upper()}: {digest['text']}")
+    return {
+        'brand_name': brand_name,
+        'version': version,
+        'positive_items': positive,
+        'negative_items': negative,
+        'sources': sources,
+        'text': "\n\n".join(sections)
+    }
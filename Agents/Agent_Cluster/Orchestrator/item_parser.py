@@ -0,0 +1,168 @@
+# item_parser.py
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+# Field labels the source agents' markdown uses ("- Reviewer: Mike R.", "**Rating:** 1 star")
+FIELD_ALIASES = {
+    'quote': ('quote', 'review', 'comment', 'post', 'text', 'content', 'excerpt'),
+    'author': ('reviewer', 'author', 'user', 'username', 'name', 'posted by', 'commenter', 'account', 'customer'),
+    'rating': ('rating', 'stars', 'star rating', 'score'),
+    'date': ('date', 'posted', 'posted on', 'published', 'review date', 'time'),
+    'platform': ('source', 'platform', 'site', 'subreddit', 'community', 'source platform'),
+    'url': ('url', 'link', 'source link', 'permalink', 'source url')
+}
+FIELD_LABELS = {alias: field for field, aliases in FIELD_ALIASES.items() for alias in aliases}
+
+# Platform assumed when an item names none, per data type
+DEFAULT_PLATFORMS = {
+    'reddit_threads': 'Reddit',
+    'social_comments': 'Instagram'
+}
+KNOWN_PLATFORMS = ('Trustpilot', 'Google Reviews', 'Google', 'Yelp', 'Amazon', 'Reddit', 'Instagram', 'TikTok',
+                   'Twitter', 'Facebook', 'YouTube', 'Glassdoor', 'Sitejabber', 'BBB', 'App Store', 'Play Store')
+
+# Lines that start a new item: headings, horizontal rules, numbered entries, a bold title on its own line
+BOUNDARY = re.compile(r'^\s*(#{1,6}\s|[-*_]{3,}\s*$|\d+[.)]\s|\*\*[^*]+\*\*\s*:?\s*$)')
+RULE = re.compile(r'^\s*[-*_]{3,}\s*$')
+FIELD_LINE = re.compile(r'^\s*(?:[-*•]\s*)?\**([A-Za-z][A-Za-z /]{1,20}?)\**\s*:\s*\**\s*(.*?)\s*$')
+QUOTED = re.compile(r'"([^"\n]{10,})"|“([^”\n]{10,})”')
+MARKDOWN_LINK = re.compile(r'\[([^\]]*)\]\((https?://[^)\s]+)\)')
+BARE_URL = re.compile(r'https?://[^\s)>\]"]+')
+RATING = re.compile(r'(\d(?:\.\d)?)\s*(?:/\s*5|out of 5|-?\s*stars?|★)', re.IGNORECASE)
+STARS = re.compile(r'[★⭐]')
+DATE = re.compile(
+    r'\b(\d{4}-\d{2}-\d{2}'
+    r'|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.? \d{1,2},? \d{4}'
+    r'|\d{1,2} (?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]* \d{4})\b'
+)
+HANDLE = re.compile(r'(?<![\w/])(u/[\w-]+|@[\w.]+)')
+SUBREDDIT = re.compile(r'(?<![\w/])(r/[\w]+)')
+
+def clean(text: str) -> str:
+    """Strip markdown emphasis, blockquote markers and surrounding quotes."""
+    text = MARKDOWN_LINK.sub(r'\1', text)
+    text = re.sub(r'^\s*>\s?', '', text, flags=re.MULTILINE)
+    text = text.replace('**', '').replace('__', '').strip()
+    return text.strip('"“”').strip()
+
+def parse_rating(text: str) -> Optional[float]:
+    match = RATING.search(text)
+    if match:
+        return float(match.group(1))
+    stars = len(STARS.findall(text))
+    return float(stars) if stars else None
+
+def find_url(text: str) -> Optional[str]:
+    match = MARKDOWN_LINK.search(text) or BARE_URL.search(text)
+    if not match:
+        return None
+    return (match.group(2) if match.re is MARKDOWN_LINK else match.group(0)).rstrip('.,')
+
+def find_platform(text: str, url: Optional[str], data_type: str) -> Optional[str]:
+    subreddit = SUBREDDIT.search(text)
+    if subreddit:
+        return f"Reddit ({subreddit.group(1)})"
+    for platform in KNOWN_PLATFORMS:
+        if platform.lower() in text.lower():
+            return platform
+    if url:
+        return urlparse(url).netloc.removeprefix('www.') or None
+    return DEFAULT_PLATFORMS.get(data_type)
+
+def split_blocks(text: str) -> List[List[str]]:
+    """Split markdown into item blocks at headings, rules, numbered entries and bold title lines."""
+    blocks = [[]]
+    for line in text.splitlines():
+        if BOUNDARY.match(line) and blocks[-1]:
+            blocks.append([])
+        if not RULE.match(line):
+            blocks[-1].append(line)
+    return [block for block in blocks if any(line.strip() for line in block)]
+
+def parse_block(lines: List[str], data_type: str, sentiment: Optional[str], structured: bool) -> Optional[Dict]:
+    """One item record from a block of lines, or None when the block holds no quote."""
+    fields = {}
+    body = []
+    for line in lines:
+        match = FIELD_LINE.match(line)
+        label = match.group(1).strip().lower() if match else None
+        if label in FIELD_LABELS and match.group(2):
+            fields.setdefault(FIELD_LABELS[label], match.group(2))
+        elif line.strip() and not re.match(r'^\s*#{1,6}\s', line):
+            body.append(line)
+    
+    block_text = "\n".join(lines)
+    body_text = "\n".join(body)
+    # Web results are prose; only user content items are reduced to their quoted excerpt
+    quoted = None if data_type == 'web_results' else QUOTED.search(fields.get('quote', '')) or QUOTED.search(body_text)
+    if quoted:
+        quote = quoted.group(1) or quoted.group(2)
+    elif fields.get('quote'):
+        quote = fields['quote']
+    elif not structured or data_type == 'web_results' or fields:
+        # Unquoted entries: the block's own text is the item
+        quote = re.sub(r'^\s*(?:\d+[.)]|[-*•])\s*', '', body_text, flags=re.MULTILINE)
+    else:
+        return None
+    quote = clean(quote)
+    if not quote:
+        return None
+    
+    url = find_url(fields.get('url', '')) or find_url(block_text)
+    author = fields.get('author')
+    if not author:
+        handle = HANDLE.search(block_text)
+        author = handle.group(1) if handle else None
+    rating_text = fields.get('rating')
+    date = fields.get('date')
+    if not date:
+        found = DATE.search(block_text)
+        date = found.group(1) if found else None
+    platform = fields.get('platform')
+    return {
+        'quote': quote,
+        'author': clean(author) if author else None,
+        'rating': parse_rating(rating_text) if rating_text else parse_rating(block_text) if data_type == 'reviews' else None,
+        'date': clean(date) if date else None,
+        'platform': clean(platform) if platform and not BARE_URL.match(clean(platform)) else find_platform(block_text, url, data_type),
+        'url': url,
+        'sentiment': sentiment
+    }
+
+def parse_items(text: str, data_type: str, sentiment: Optional[str] = None) -> List[Dict]:
+    """Parse a source agent's markdown result into item records.
+    
+    Each record has ``quote``, ``author``, ``rating``, ``date``, ``platform``,
+    ``url`` and ``sentiment`` (missing values are None). Structured results
+    (one heading, numbered entry or bold title per review/post) give one item
+    per entry. Narrative paragraphs (the socials and reddit agents' usual
+    output) give one item per quoted excerpt, or one per paragraph when they
+    quote nothing. Error messages give no items.
+    """
+    if not text or not text.strip() or text.lstrip().startswith("Error"):
+        return []
+    
+    blocks = split_blocks(text)
+    if len(blocks) > 1:
+        items = [parse_block(block, data_type, sentiment, structured=True) for block in blocks]
+        items = [item for item in items if item]
+        if items:
+            return items
+    
+    # Narrative text: every quoted excerpt is an item, otherwise every paragraph
+    paragraphs = [paragraph for paragraph in re.split(r'\n\s*\n', text) if paragraph.strip()]
+    quotes = [match.group(1) or match.group(2) for match in QUOTED.finditer(text)]
+    if quotes and data_type != 'web_results':
+        paragraphs = quotes
+    items = [parse_block(paragraph.splitlines(), data_type, sentiment, structured=False) for paragraph in paragraphs]
+    return [item for item in items if item]
+
+def render_item(item: Dict) -> str:
+    """One line per item for prompts: the quote followed by whatever attribution it has."""
+    details = [item['author'] or None]
+    if item['rating'] is not None:
+        details.append(f"{item['rating']:g}/5")
+    details.extend([item['date'], item['platform'], item['url']])
+    attribution = ", ".join(detail for detail in details if detail)
+    return f"\"{item['quote']}\" ({attribution})" if attribution else f"\"{item['quote']}\""
@@ -0,0 +1,46 @@
+# job_events.py
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Optional
+
+class JobEvents:
+    """Ordered log of one research job's progress events, replayed to every stream subscriber.
+    
+    Events are numbered from 1, so a client that reconnects can resume after the
+    last event ID it saw. The log is closed by the job's final event (its result
+    or error); subscribers stop once they have read it.
+    """
+    
+    def __init__(self):
+        self.events: List[Dict] = []
+        self.closed = False
+        self.changed = asyncio.Event()
+    
+    def publish(self, event: str, data: Dict, final: bool = False):
+        self.events.append({"id": len(self.events) + 1, "event": event, "data": data})
+        self.closed = self.closed or final
+        # Wake the current subscribers; later waits use a fresh event
+        self.changed.set()
+        self.changed = asyncio.Event()
+    
+    async def subscribe(self, after: int = 0, keepalive: float = 15.0) -> AsyncIterator[Optional[Dict]]:
+        """Events after ID ``after``, then new ones as they are published, until the log closes.
+        
+        Yields None when ``keepalive`` seconds pass without an event.
+        """
+        while True:
+            while after < len(self.events):
+                after += 1
+                yield self.events[after - 1]
+            if self.closed:
+                return
+            try:
+                await asyncio.wait_for(self.changed.wait(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+def format_sse(event: Optional[Dict]) -> str:
+    """Server-Sent Events framing of an event (a comment line for a keep-alive)."""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
@@ -0,0 +1,50 @@
+# job_store.py
+import json
+import os
+from typing import List
+
+class JobStore:
+    """Durable checkpoints of research jobs: one JSON file per job in ``data_dir``.
+    
+    A job's file is rewritten (atomically, via a temp file) whenever the job
+    changes state or a pipeline step finishes, so after a crash it holds the
+    job's metadata and the results of every step completed so far. With
+    ``fsync`` on, each checkpoint is fsynced before ``save`` returns.
+    """
+    
+    def __init__(self, data_dir: str, fsync: bool = False):
+        self.data_dir = data_dir
+        self.fsync = fsync
+        os.makedirs(data_dir, exist_ok=True)
+    
+    def path(self, job_id: str) -> str:
+        return os.path.join(self.data_dir, f"{job_id}.json")
+    
+    def save(self, record: dict):
+        path = self.path(record["job_id"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(record, f)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    
+    def delete(self, job_id: str):
+        try:
+            os.remove(self.path(job_id))
+        except FileNotFoundError:
+            pass
+    
+    def load(self) -> List[dict]:
+        """Every checkpointed job, oldest first (unreadable files are skipped)."""
+        records = []
+        for name in os.listdir(self.data_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.data_dir, name)) as f:
+                    records.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping unreadable job checkpoint {name}: {e}")
+        return sorted(records, key=lambda record: record["created_at"])
@@ -0,0 +1,201 @@
+# kg_worker.py
+import asyncio
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict
+
+from knowledge_graph import BrandKnowledgeGraph
+
+# Latency samples kept per operation for the metrics percentiles
+LATENCY_SAMPLES = 500
+
+class OperationStats:
+    """Counters and recent latencies (queue wait and execution, in ms) for one KG operation."""
+    
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.wait_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.run_ms = deque(maxlen=LATENCY_SAMPLES)
+    
+    def record(self, wait_ms: float, run_ms: float, failed: bool):
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.wait_ms.append(wait_ms)
+        self.run_ms.append(run_ms)
+    
+    @staticmethod
+    def summarize(samples) -> Dict:
+        if not samples:
+            return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        ordered = sorted(samples)
+        return {
+            "mean": round(statistics.mean(ordered), 3),
+            "p50": round(ordered[len(ordered) // 2], 3),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+            "max": round(ordered[-1], 3)
+        }
+    
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "queue_wait_ms": self.summarize(self.wait_ms),
+            "run_ms": self.summarize(self.run_ms)
+        }
+
+class KnowledgeGraphWorker:
+    """Runs every knowledge graph operation on one dedicated thread that owns the graph.
+    
+    Hyperon calls are synchronous, so calling the graph from FastAPI handlers
+    blocks the event loop that also drives the research jobs and status polls.
+    ``call`` instead puts the operation on a queue and returns an awaitable
+    future; the worker thread builds the graph itself (so the MeTTa space is
+    only ever touched from that thread) and resolves the future on the
+    caller's loop when the operation is done.
+    
+    The worker drains up to ``batch_size`` queued operations at a time and runs
+    them in order. Journal writes made by a batch are flushed (and fsynced)
+    once, before any of its futures resolve, so a burst of ingestions costs a
+    single group commit. If that flush fails, every future of the batch fails
+    with the error; the worker keeps serving later operations.
+    """
+    
+    def __init__(self, factory: Callable[[], BrandKnowledgeGraph], batch_size: int = 32):
+        self.factory = factory
+        self.batch_size = batch_size
+        self.requests = queue.Queue()
+        self.kg = None
+        self.ready = threading.Event()
+        self.startup_error = None
+        self.thread = threading.Thread(target=self.run, name="kg-worker", daemon=True)
+        self.operations: Dict[str, OperationStats] = {}
+        self.max_queue_depth = 0
+        self.batches = 0
+        self.batched_operations = 0
+        self.stopped = False
+    
+    def start(self):
+        """Start the worker thread and wait until the graph is built (and restored from disk)."""
+        self.thread.start()
+        self.ready.wait()
+        if self.startup_error is not None:
+            raise self.startup_error
+    
+    def call(self, op: str, *args, **kwargs) -> asyncio.Future:
+        """Queue ``BrandKnowledgeGraph.<op>(*args, **kwargs)``; await the returned future for its result."""
+        if self.stopped:
+            raise RuntimeError("Knowledge graph worker is stopped")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.requests.put((op, args, kwargs, loop, future, time.perf_counter()))
+        self.max_queue_depth = max(self.max_queue_depth, self.requests.qsize())
+        return future
+    
+    def stop(self, timeout: float = 30.0):
+        """Finish the queued operations, close the graph (final snapshot) and stop the thread."""
+        if self.stopped:
+            return
+        self.stopped = True
+        self.requests.put(None)
+        self.thread.join(timeout)
+    
+    def run(self):
+        try:
+            self.kg = self.factory()
+        except Exception as e:
+            self.startup_error = e
+            self.ready.set()
+            return
+        self.ready.set()
+        
+        while True:
+            batch = [self.requests.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            
+            stopping = None in batch
+            batch = [request for request in batch if request is not None]
+            if batch:
+                try:
+                    self.run_batch(batch)
+                except Exception as e:
+                    # Never let one batch kill the thread: every caller would hang
+                    print(f"❌ Knowledge graph batch failed: {e}")
+                    self.resolve_batch(batch, [(None, e)] * len(batch))
+            if stopping:
+                break
+        
+        try:
+            self.kg.close()
+        except Exception as e:
+            print(f"❌ Knowledge graph close failed: {e}")
+    
+    def run_batch(self, batch: list):
+        self.batches += 1
+        self.batched_operations += len(batch)
+        store = self.kg.store
+        if store is not None:
+            store.batching = True
+        
+        outcomes = []
+        sync_error = None
+        try:
+            for op, args, kwargs, loop, future, enqueued_at in batch:
+                started = time.perf_counter()
+                try:
+                    outcome = (getattr(self.kg, op)(*args, **kwargs), None)
+                except Exception as e:
+                    outcome = (None, e)
+                finished = time.perf_counter()
+                self.operations.setdefault(op, OperationStats()).record(
+                    (started - enqueued_at) * 1000, (finished - started) * 1000, outcome[1] is not None)
+                outcomes.append(outcome)
+        finally:
+            if store is not None:
+                store.batching = False
+                try:
+                    store.sync()
+                except Exception as e:
+                    sync_error = e
+        
+        if sync_error is not None:
+            # The batch's journal writes may not be on disk, so none of it is confirmed
+            print(f"❌ Knowledge graph journal sync failed: {sync_error}")
+            outcomes = [(None, sync_error)] * len(batch)
+        self.resolve_batch(batch, outcomes)
+    
+    def resolve_batch(self, batch: list, outcomes: list):
+        for (op, args, kwargs, loop, future, enqueued_at), (result, error) in zip(batch, outcomes):
+            try:
+                loop.call_soon_threadsafe(self.resolve, future, result, error)
+            except RuntimeError:
+                # The caller's event loop is already closed
+                pass
+    
+    @staticmethod
+    def resolve(future: asyncio.Future, result, error):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    def metrics(self) -> Dict:
+        return {
+            "queue_depth": self.requests.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "mean_batch_size": round(self.batched_operations / self.batches, 2) if self.batches else 0.0,
+            "running": self.thread.is_alive(),
+            "operations": {op: stats.to_dict() for op, stats in sorted(self.operations.items())}
+        }
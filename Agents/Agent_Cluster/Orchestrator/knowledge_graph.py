@@ -0,0 +1,657 @@
+# knowledge_graph.py
+import hashlib
+import json
+import math
+import os
+import time
+from datetime import datetime
+import numpy as np
+from hyperon import MeTTa, E, S, ValueAtom
+from digest import brand_digest, source_digest
+from item_parser import parse_items, render_item
+from search_index import InvertedIndex, tokenize
+from vector_index import embed, embed_query, select_passages
+from typing import Dict, List, Optional, Tuple
+
+# Research result key -> (data type, sentiment) used by the index and the query API
+BRAND_DATA_FIELDS = {
+    'web_results': ('web_results', None),
+    'positive_reddit': ('reddit_threads', 'positive'),
+    'negative_reddit': ('reddit_threads', 'negative'),
+    'positive_reviews': ('reviews', 'positive'),
+    'negative_reviews': ('reviews', 'negative'),
+    'positive_social': ('social_comments', 'positive'),
+    'negative_social': ('social_comments', 'negative')
+}
+
+FIELDS_BY_KEY = {key: field for field, key in BRAND_DATA_FIELDS.items()}
+
+SENTIMENTS = {'pos': 'positive', 'neg': 'negative'}
+
+# Data type -> (value relation, brand link relation, sentiment relation) of its MeTTa atoms
+ATOM_RELATIONS = {
+    'web_results': ('web_result', 'brand_has_web', None),
+    'reddit_threads': ('reddit_thread', 'brand_has_reddit', 'thread_sentiment'),
+    'reviews': ('review', 'brand_has_review', 'review_sentiment'),
+    'social_comments': ('social_comment', 'brand_has_social', 'comment_sentiment')
+}
+
+def content_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+class KnowledgeGraphStore:
+    """Durable storage for the knowledge graph: a compact snapshot plus an append-only journal.
+    
+    Every mutation is appended to ``journal.jsonl`` with an increasing sequence
+    number before the call returns. Every ``snapshot_every`` mutations (and on
+    shutdown) the whole graph is written to ``snapshot.json`` (atomically, via a
+    temp file) and the journal is truncated. Restoring loads the snapshot and
+    replays only the journal entries newer than it, so a crash between writing
+    the snapshot and truncating the journal does not apply anything twice.
+    
+    While ``batching`` is set, appends are only written; the caller flushes
+    (and fsyncs) the whole batch at once with ``sync``.
+    """
+    
+    def __init__(self, data_dir: str, snapshot_every: int = 500, fsync: bool = False):
+        self.data_dir = data_dir
+        self.snapshot_path = os.path.join(data_dir, "snapshot.json")
+        self.journal_path = os.path.join(data_dir, "journal.jsonl")
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.seq = 0
+        self.entries_since_snapshot = 0
+        self.journal = None
+        self.batching = False
+        os.makedirs(data_dir, exist_ok=True)
+    
+    def load(self) -> Tuple[List[dict], List[dict]]:
+        """Return the snapshot records and the journal entries written after that snapshot."""
+        records = []
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            records = snapshot["records"]
+            snapshot_seq = snapshot["seq"]
+        
+        entries = []
+        if os.path.exists(self.journal_path):
+            valid_bytes = 0
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    valid_bytes += len(line)
+                    if entry["seq"] > snapshot_seq:
+                        entries.append(entry)
+            if valid_bytes < os.path.getsize(self.journal_path):
+                # Drop the torn tail so new entries start on a clean line
+                os.truncate(self.journal_path, valid_bytes)
+        
+        self.seq = max([snapshot_seq] + [entry["seq"] for entry in entries])
+        self.entries_since_snapshot = len(entries)
+        return records, entries
+    
+    def append(self, entry: dict) -> dict:
+        if self.journal is None:
+            self.journal = open(self.journal_path, "a")
+        self.seq += 1
+        entry = {"seq": self.seq, "ts": time.time(), **entry}
+        self.journal.write(json.dumps(entry) + "\n")
+        if not self.batching:
+            self.sync()
+        self.entries_since_snapshot += 1
+        return entry
+    
+    def sync(self):
+        """Flush (and with ``fsync`` on, fsync) the journal writes made so far."""
+        if self.journal is None:
+            return
+        self.journal.flush()
+        if self.fsync:
+            os.fsync(self.journal.fileno())
+    
+    def should_snapshot(self) -> bool:
+        return self.entries_since_snapshot >= self.snapshot_every
+    
+    def write_snapshot(self, records: List[dict]):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"seq": self.seq, "created_at": time.time(), "records": records}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        
+        # Everything in the journal is now covered by the snapshot
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = open(self.journal_path, "w")
+        self.entries_since_snapshot = 0
+    
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+class BrandKnowledgeGraph:
+    """Brand research knowledge graph.
+    
+    Every ingestion of a brand is a versioned run with a timestamp. Each value
+    is kept in a hash index keyed by ``(data_type, brand_id, sentiment)`` as a
+    list of ``{value, version, ts, hash, items}`` entries, oldest first. A value whose
+    content hash matches the latest one is skipped, and only the last
+    ``keep_versions`` values per key are kept. Lookups used by the API
+    endpoints (``query_brand_data``, ``get_brand_summary``, ``get_all_brands``)
+    read the index in O(1) and return the latest version unless asked for an
+    older version or a time range.
+    
+    Each value is also parsed at write time into item records (one per review,
+    post or comment, see ``item_parser``) so consumers can count, page and
+    sample items (``get_brand_items``, or ``itemized=True`` on the summary)
+    instead of passing whole agent results around. A restore leaves parsing to
+    the first read of each value, like the MeTTa atoms.
+    
+    The items of every key's latest value are also kept in a full-text
+    ``InvertedIndex`` for ``search`` across brands. It is updated on each
+    ingestion and, after a restore, built on the first search.
+    
+    ``retrieve`` picks the items of one brand most relevant to a task for an
+    LLM prompt: items are embedded as hashed term vectors (cached with the
+    value on first use), scored against an IDF-weighted query vector and
+    taken best first within a ``k`` and token budget.
+    
+    The latest value of every key is also stored as a MeTTa atom (superseded
+    atoms are removed), so the space can still be used for reasoning queries
+    through ``run_query``.
+    
+    With a ``data_dir`` the graph is durable: ingestions are journaled through
+    ``KnowledgeGraphStore`` and the graph is restored from disk on creation.
+    """
+    
+    def __init__(self, data_dir: Optional[str] = None, snapshot_every: int = 500, fsync: bool = False,
+                 keep_versions: int = 3):
+        # The latest value is always needed, and a slice of [:-0] would silently keep everything
+        if keep_versions < 1:
+            raise ValueError(f"keep_versions must be at least 1 (got {keep_versions})")
+        self.metta = MeTTa()
+        self.index: Dict[Tuple[str, str, Optional[str]], List[dict]] = {}
+        self.brand_names: Dict[str, str] = {}
+        self.versions: Dict[str, List[dict]] = {}
+        self.keep_versions = keep_versions
+        # Changes whenever a brand is added; used as the validator for the brand list
+        self.brands_tag = "empty"
+        self.atoms_loaded = True
+        self.search_index = InvertedIndex()
+        self.search_loaded = True
+        # brand_id -> digest of the brand's latest version
+        self.digests: Dict[str, dict] = {}
+        self.initialize_schema()
+        self.store = KnowledgeGraphStore(data_dir, snapshot_every, fsync) if data_dir else None
+        if self.store is not None:
+            self.restore()
+    
+    def initialize_schema(self):
+        """Initialize the knowledge graph schema for brand data."""
+        # Brand relationships
+        self.metta.space().add_atom(E(S("brand_has"), S("brand"), S("web_results")))
+        self.metta.space().add_atom(E(S("brand_has"), S("brand"), S("reddit_threads")))
+        self.metta.space().add_atom(E(S("brand_has"), S("brand"), S("reviews")))
+        self.metta.space().add_atom(E(S("brand_has"), S("brand"), S("social_comments")))
+        
+        # Sentiment relationships
+        self.metta.space().add_atom(E(S("has_sentiment"), S("reddit_threads"), S("positive")))
+        self.metta.space().add_atom(E(S("has_sentiment"), S("reddit_threads"), S("negative")))
+        self.metta.space().add_atom(E(S("has_sentiment"), S("reviews"), S("positive")))
+        self.metta.space().add_atom(E(S("has_sentiment"), S("reviews"), S("negative")))
+        self.metta.space().add_atom(E(S("has_sentiment"), S("social_comments"), S("positive")))
+        self.metta.space().add_atom(E(S("has_sentiment"), S("social_comments"), S("negative")))
+    
+    @staticmethod
+    def brand_id_for(brand_name: str) -> str:
+        return brand_name.lower().replace(" ", "_")
+    
+    def add_brand_data(self, brand_name, data):
+        """Ingest a research run for a brand as a new version (journaled when persistence is on)."""
+        return self.ingest_brand_data(brand_name, data)["message"]
+    
+    def ingest_brand_data(self, brand_name, data) -> dict:
+        """``add_brand_data`` that also reports the resulting version and how many fields changed."""
+        record = self.prepare_record(brand_name, data)
+        if record is None:
+            latest = self.versions[self.brand_id_for(brand_name)][-1]["version"]
+            return {
+                "message": f"No changes for brand: {brand_name} (still version {latest})",
+                "version": latest,
+                "fields_changed": 0
+            }
+        
+        # Journal first: if the append fails, readers never see a write that a restart would lose
+        if self.store is not None:
+            self.store.append({"op": "add_brand_data", **record})
+        self.apply_record(record)
+        if self.store is not None and self.store.should_snapshot():
+            self.snapshot()
+        # Digest once at ingestion (after a restore the first read digests instead, once search is indexed)
+        if self.search_loaded:
+            self.get_brand_digest(brand_name)
+        return {
+            "message": f"Successfully added data for brand: {brand_name} (version {record['version']}, {len(record['data'])} fields changed)",
+            "version": record["version"],
+            "fields_changed": len(record["data"])
+        }
+    
+    def prepare_record(self, brand_name, data, ts: Optional[float] = None) -> Optional[dict]:
+        """Build the next version's record with only the fields whose content changed, or None if nothing did."""
+        brand_id = self.brand_id_for(brand_name)
+        changed = {}
+        for field, (data_type, sentiment) in BRAND_DATA_FIELDS.items():
+            value = data.get(field)
+            if not value:
+                continue
+            entries = self.index.get((data_type, brand_id, sentiment))
+            if entries and entries[-1]["hash"] == content_hash(value):
+                continue
+            changed[field] = value
+        
+        runs = self.versions.get(brand_id)
+        if runs and not changed:
+            return None
+        return {
+            "brand_name": brand_name,
+            "version": runs[-1]["version"] + 1 if runs else 1,
+            "ts": ts if ts is not None else time.time(),
+            "data": changed
+        }
+    
+    def apply_record(self, record: dict, parse: bool = True):
+        """Write one versioned ingestion into the index (and the MeTTa space), compacting superseded values."""
+        brand_name = record["brand_name"]
+        brand_id = self.brand_id_for(brand_name)
+        if brand_id not in self.brand_names:
+            self.brand_names[brand_id] = brand_name
+            self.brands_tag = content_hash(f"{self.brands_tag}|{brand_id}")
+            if self.atoms_loaded:
+                self.metta.space().add_atom(E(S("brand_name"), S(brand_id), ValueAtom(brand_name)))
+        self.versions.setdefault(brand_id, []).append({
+            "version": record["version"],
+            "ts": record["ts"],
+            # Snapshot records carry the original field list, since compaction may have dropped some values
+            "fields": record.get("fields", sorted(record["data"]))
+        })
+        
+        for field, value in record["data"].items():
+            data_type, sentiment = BRAND_DATA_FIELDS[field]
+            entries = self.index.setdefault((data_type, brand_id, sentiment), [])
+            if self.atoms_loaded:
+                if entries:
+                    self.remove_value_atom(data_type, brand_id, sentiment, entries[-1]["value"])
+                self.add_value_atoms(data_type, brand_id, sentiment, value, link=not entries)
+            entry = {"value": value, "version": record["version"], "ts": record["ts"], "hash": content_hash(value)}
+            if parse:
+                entry["items"] = parse_items(value, data_type, sentiment)
+            entries.append(entry)
+            if self.search_loaded:
+                self.index_items((data_type, brand_id, sentiment))
+            # Superseded values beyond the retention window are compacted away
+            del entries[:-self.keep_versions]
+    
+    @staticmethod
+    def atom_subject(brand_id: str, sentiment: Optional[str]) -> str:
+        return brand_id if sentiment is None else f"{brand_id}_{sentiment[:3]}"
+    
+    def add_value_atoms(self, data_type: str, brand_id: str, sentiment: Optional[str], value: str, link: bool = True):
+        """Add the value atom (and, for a new key, its brand and sentiment link atoms) to the MeTTa space."""
+        relation, link_relation, sentiment_relation = ATOM_RELATIONS[data_type]
+        subject = self.atom_subject(brand_id, sentiment)
+        self.metta.space().add_atom(E(S(relation), S(subject), ValueAtom(value)))
+        if link:
+            self.metta.space().add_atom(E(S(link_relation), S(brand_id), S(subject)))
+            if sentiment_relation:
+                self.metta.space().add_atom(E(S(sentiment_relation), S(subject), S(sentiment)))
+    
+    def remove_value_atom(self, data_type: str, brand_id: str, sentiment: Optional[str], value: str):
+        relation = ATOM_RELATIONS[data_type][0]
+        self.metta.space().remove_atom(E(S(relation), S(self.atom_subject(brand_id, sentiment)), ValueAtom(value)))
+    
+    @staticmethod
+    def value_sentiments(data_type, sentiment=None) -> List[Optional[str]]:
+        """The index sentiments a query for ``data_type`` / ``sentiment`` covers."""
+        if data_type == 'web_results':
+            return [None]
+        if data_type in ('reddit_threads', 'reviews', 'social_comments'):
+            if sentiment:
+                # Matches the old "{brand_id}_{sentiment[:3]}" atom naming: "pos"/"positive", "neg"/"negative"
+                return [SENTIMENTS.get(sentiment[:3])]
+            return ['positive', 'negative']
+        return []
+    
+    @staticmethod
+    def entry_items(entry: dict, data_type: str, sentiment: Optional[str]) -> List[dict]:
+        if "items" not in entry:
+            entry["items"] = parse_items(entry["value"], data_type, sentiment)
+        return entry["items"]
+    
+    def entry_values(self, entry: dict, data_type: str, sentiment: Optional[str], itemized: bool) -> List[str]:
+        if not itemized:
+            return [entry["value"]]
+        # Fall back to the whole value when nothing could be parsed out of it
+        return [render_item(item) for item in self.entry_items(entry, data_type, sentiment)] or [entry["value"]]
+    
+    @staticmethod
+    def entry_vectors(entry: dict, items: List[dict]) -> np.ndarray:
+        if "vectors" not in entry:
+            entry["vectors"] = embed([item["quote"] for item in items])
+        return entry["vectors"]
+    
+    def entry_digest(self, entry: dict, data_type: str, brand_id: str, sentiment: Optional[str]) -> dict:
+        """The map-reduce digest of one source value, computed on first use and kept with the entry."""
+        if "digest" not in entry:
+            items = self.entry_items(entry, data_type, sentiment)
+            # The brand's own name is in most items, so it is never a theme
+            entry["digest"] = source_digest(items, self.entry_vectors(entry, items), self.term_idf,
+                                            frozenset(tokenize(self.brand_names[brand_id])))
+        return entry["digest"]
+    
+    def index_items(self, key: Tuple[str, str, Optional[str]]):
+        """(Re)index the items of a key's latest value for full-text search."""
+        data_type, brand_id, sentiment = key
+        field = FIELDS_BY_KEY[(data_type, sentiment)]
+        items = self.entry_items(self.index[key][-1], data_type, sentiment)
+        self.search_index.replace(key, [
+            (item["quote"], (brand_id, field, data_type, sentiment, position))
+            for position, item in enumerate(items)
+        ])
+    
+    def build_search_index(self):
+        """Index the items skipped by a restore (parsing any value not read yet)."""
+        if self.search_loaded:
+            return
+        started = time.perf_counter()
+        for key, entries in self.index.items():
+            if entries:
+                self.index_items(key)
+        self.search_loaded = True
+        print(f"🔎 Search index built: {self.search_index.stats()['documents']} items in {time.perf_counter() - started:.2f}s")
+    
+    def search(self, query, brands=None, data_types=None, sentiments=None, offset=0, limit=20, match_all=True):
+        """Full-text search over the items of every brand's latest data, best BM25 score first.
+        
+        ``brands``, ``data_types`` and ``sentiments`` narrow the items searched;
+        ``match_all`` requires every query term (otherwise any term matches).
+        """
+        self.build_search_index()
+        brand_ids = {self.brand_id_for(brand_name) for brand_name in brands} if brands else None
+        wanted_sentiments = {SENTIMENTS.get(sentiment[:3]) for sentiment in sentiments} if sentiments else None
+        
+        def accept(meta):
+            brand_id, field, data_type, sentiment, position = meta
+            return ((brand_ids is None or brand_id in brand_ids)
+                    and (not data_types or data_type in data_types)
+                    and (wanted_sentiments is None or sentiment in wanted_sentiments))
+        
+        # With a brand filter only that brand's documents are candidates
+        keys = None
+        if brand_ids is not None:
+            keys = [(data_type, brand_id, sentiment) for brand_id in brand_ids for data_type, sentiment in BRAND_DATA_FIELDS.values()]
+        filtered = brand_ids is not None or data_types or wanted_sentiments is not None
+        total, ranked = self.search_index.search(query, accept if filtered else None, match_all, offset + limit, keys)
+        results = []
+        for score, (brand_id, field, data_type, sentiment, position) in ranked[offset:]:
+            item = self.index[(data_type, brand_id, sentiment)][-1]["items"][position]
+            results.append({"brand_name": self.brand_names[brand_id], "field": field, "data_type": data_type, "score": score, **item})
+        return {"query": query, "total": total, "results": results}
+    
+    def term_idf(self, term: str) -> float:
+        """Inverse document frequency over all indexed items (bigrams average their two words)."""
+        if " " in term:
+            return sum(self.term_idf(word) for word in term.split(" ")) / 2
+        documents = len(self.search_index)
+        return math.log((documents + 1) / (len(self.search_index.postings.get(term, ())) + 1)) + 1
+    
+    def retrieve(self, brand_name, query, k=8, token_budget=1500, data_types=None, sentiments=None):
+        """The brand's items most relevant to ``query``, best first, within ``k`` items and ``token_budget`` tokens.
+        
+        Each passage is an item record plus ``field``, ``data_type``, ``score``, its
+        prompt ``text`` (the rendered item) and that text's estimated ``tokens``.
+        """
+        self.build_search_index()
+        brand_id = self.brand_id_for(brand_name)
+        wanted_sentiments = {SENTIMENTS.get(sentiment[:3]) for sentiment in sentiments} if sentiments else None
+        
+        candidates = []
+        blocks = []
+        for field, (data_type, sentiment) in BRAND_DATA_FIELDS.items():
+            if (data_types and data_type not in data_types) or (wanted_sentiments is not None and sentiment not in wanted_sentiments):
+                continue
+            entries = self.index.get((data_type, brand_id, sentiment))
+            if not entries:
+                continue
+            entry = entries[-1]
+            items = self.entry_items(entry, data_type, sentiment)
+            if not items:
+                continue
+            blocks.append(self.entry_vectors(entry, items))
+            candidates.extend((field, data_type, item) for item in items)
+        
+        passages = []
+        tokens_used = 0
+        if candidates:
+            scores = np.vstack(blocks) @ embed_query(query, self.term_idf)
+            texts = [render_item(item) for _, _, item in candidates]
+            for index, score, tokens in select_passages(scores, texts, k, token_budget):
+                field, data_type, item = candidates[index]
+                passages.append({"field": field, "data_type": data_type, "score": round(score, 4),
+                                 "text": texts[index], "tokens": tokens, **item})
+                tokens_used += tokens
+        return {"brand_name": brand_name, "query": query, "candidates": len(candidates),
+                "tokens_used": tokens_used, "passages": passages}
+    
+    def get_brand_digest(self, brand_name):
+        """The digest of a brand's latest data: one per source, reduced into a brand digest, or None if unknown.
+        
+        Source digests give each source's item count, average rating, top
+        platforms, recurring themes and its most representative items; the
+        brand digest adds the positive/negative item counts and renders it all
+        as one compact ``text`` block for prompts. Digests are computed once per
+        version and reused until the brand is ingested again.
+        """
+        brand_id = self.brand_id_for(brand_name)
+        runs = self.versions.get(brand_id)
+        if not runs:
+            return None
+        cached = self.digests.get(brand_id)
+        if cached is not None and cached["version"] == runs[-1]["version"]:
+            return cached
+        
+        self.build_search_index()
+        sources = {}
+        for field, (data_type, sentiment) in BRAND_DATA_FIELDS.items():
+            entries = self.index.get((data_type, brand_id, sentiment))
+            if entries:
+                sources[field] = self.entry_digest(entries[-1], data_type, brand_id, sentiment)
+        self.digests[brand_id] = brand_digest(self.brand_names[brand_id], runs[-1]["version"], sources)
+        return self.digests[brand_id]
+    
+    def query_brand_data(self, brand_name, data_type=None, sentiment=None, version=None, since=None, until=None,
+                         itemized=False):
+        """Query brand data from the knowledge graph index.
+        
+        Returns the latest value by default. ``version`` returns the value as of
+        that version; ``since``/``until`` (epoch seconds) return every retained
+        value ingested in that window, newest first. With ``itemized`` each value
+        is replaced by its parsed items, one rendered line per item.
+        """
+        brand_id = self.brand_id_for(brand_name)
+        
+        results = []
+        for value_sentiment in self.value_sentiments(data_type, sentiment):
+            entries = self.index.get((data_type, brand_id, value_sentiment), [])
+            if version is not None:
+                entries = [entry for entry in entries if entry["version"] <= version]
+            if since is not None or until is not None:
+                for entry in reversed(entries):
+                    if (since is None or entry["ts"] >= since) and (until is None or entry["ts"] <= until):
+                        results.extend(self.entry_values(entry, data_type, value_sentiment, itemized))
+            elif entries:
+                results.extend(self.entry_values(entries[-1], data_type, value_sentiment, itemized))
+        return results
+    
+    def get_brand_items(self, brand_name, data_type=None, sentiment=None, offset=0, limit=50, sample=None):
+        """Parsed item records of a brand's latest data, with per-field counts.
+        
+        Items come in summary field order (web results, then reddit, reviews and
+        social, positive before negative) and can be narrowed to one data type
+        and/or sentiment. ``sample`` picks that many items spread evenly over the
+        matches; otherwise ``offset``/``limit`` page through them.
+        """
+        brand_id = self.brand_id_for(brand_name)
+        wanted = self.value_sentiments(data_type, sentiment) if data_type else None
+        wanted_sentiment = SENTIMENTS.get(sentiment[:3]) if sentiment else None
+        
+        counts = {}
+        items = []
+        for field, (field_type, field_sentiment) in BRAND_DATA_FIELDS.items():
+            if data_type and (field_type != data_type or field_sentiment not in wanted):
+                continue
+            if not data_type and sentiment and field_sentiment not in (None, wanted_sentiment):
+                continue
+            entries = self.index.get((field_type, brand_id, field_sentiment))
+            field_items = self.entry_items(entries[-1], field_type, field_sentiment) if entries else []
+            counts[field] = len(field_items)
+            items.extend({"field": field, "data_type": field_type, **item} for item in field_items)
+        
+        total = len(items)
+        if sample is not None and sample < total:
+            step = total / sample
+            items = [items[int(i * step)] for i in range(sample)]
+        else:
+            items = items[offset:offset + limit] if limit is not None else items[offset:]
+        return {"brand_name": brand_name, "total": total, "counts": counts, "items": items}
+    
+    def get_brand_tag(self, brand_name) -> str:
+        """A token that changes whenever the brand's data changes (its latest version and when it was written)."""
+        runs = self.versions.get(self.brand_id_for(brand_name))
+        if not runs:
+            return "none"
+        return f"{runs[-1]['version']}-{int(runs[-1]['ts'] * 1000)}"
+    
+    def get_brand_versions(self, brand_name):
+        """List a brand's ingestion runs, oldest first."""
+        return [
+            {
+                "version": run["version"],
+                "timestamp": datetime.fromtimestamp(run["ts"]).isoformat(),
+                "changed_fields": run["fields"]
+            }
+            for run in self.versions.get(self.brand_id_for(brand_name), [])
+        ]
+    
+    def export_records(self) -> List[dict]:
+        """The graph as the list of versioned records that rebuild it (retained values only)."""
+        records = []
+        for brand_id, brand_name in self.brand_names.items():
+            by_version = {
+                run["version"]: {"brand_name": brand_name, "version": run["version"], "ts": run["ts"], "fields": run["fields"], "data": {}}
+                for run in self.versions[brand_id]
+            }
+            for field, (data_type, sentiment) in BRAND_DATA_FIELDS.items():
+                for entry in self.index.get((data_type, brand_id, sentiment), []):
+                    by_version[entry["version"]]["data"][field] = entry["value"]
+            records.extend(by_version.values())
+        return records
+    
+    def snapshot(self):
+        """Write a compact snapshot of the whole graph and reset the journal."""
+        started = time.perf_counter()
+        records = self.export_records()
+        self.store.write_snapshot(records)
+        print(f"💾 Knowledge graph snapshot written: {len(self.brand_names)} brands, {len(records)} records in {time.perf_counter() - started:.2f}s")
+    
+    def restore(self):
+        """Rebuild the graph from the last snapshot plus the journal entries written since."""
+        started = time.perf_counter()
+        records, entries = self.store.load()
+        if not records and not entries:
+            return
+        
+        # Only the index is rebuilt up front; adding MeTTa atoms (and parsing items for search) is the slow part
+        self.atoms_loaded = False
+        self.search_loaded = False
+        for record in records + entries:
+            if "version" not in record:
+                # Written before ingestions were versioned
+                record = self.prepare_record(record["brand_name"], record["data"], record.get("ts"))
+                if record is None:
+                    continue
+            self.apply_record(record, parse=False)
+        print(f"♻️ Knowledge graph restored: {len(self.brand_names)} brands from {len(records)} snapshot records "
+              f"and {len(entries)} journal entries in {time.perf_counter() - started:.2f}s")
+    
+    def close(self):
+        """Snapshot and close the journal (call on shutdown)."""
+        if self.store is not None:
+            if self.store.entries_since_snapshot:
+                self.snapshot()
+            self.store.close()
+    
+    def materialize_atoms(self):
+        """Add the MeTTa atoms skipped by a restore: the brand names and the latest value of every key."""
+        if self.atoms_loaded:
+            return
+        for brand_id, brand_name in self.brand_names.items():
+            self.metta.space().add_atom(E(S("brand_name"), S(brand_id), ValueAtom(brand_name)))
+        for (data_type, brand_id, sentiment), entries in self.index.items():
+            if entries:
+                self.add_value_atoms(data_type, brand_id, sentiment, entries[-1]["value"])
+        self.atoms_loaded = True
+    
+    def run_query(self, query_str: str):
+        """Run a MeTTa query against the atom space (for reasoning queries the index does not cover)."""
+        self.materialize_atoms()
+        return self.metta.run(query_str)
+    
+    def get_all_brands(self):
+        """Get all brands in the knowledge graph."""
+        return list(self.brand_names.values())
+    
+    def get_brands_tag(self) -> str:
+        return self.brands_tag
+    
+    def get_brands_batch(self, brand_names, data_types=None, sentiments=None):
+        """Summaries for many brands at once, optionally projected onto some data types / sentiments.
+        
+        Returns ``(results, missing)``: summary-shaped dicts keyed by the requested
+        brand name, and the requested brands that are not in the graph.
+        """
+        wanted_sentiments = {SENTIMENTS.get(sentiment[:3]) for sentiment in sentiments} if sentiments else None
+        fields = [
+            (field, data_type, sentiment)
+            for field, (data_type, sentiment) in BRAND_DATA_FIELDS.items()
+            if (not data_types or data_type in data_types)
+            and (wanted_sentiments is None or sentiment is None or sentiment in wanted_sentiments)
+        ]
+        
+        results = {}
+        missing = []
+        for brand_name in brand_names:
+            if self.brand_id_for(brand_name) not in self.brand_names:
+                missing.append(brand_name)
+                continue
+            results[brand_name] = {'brand_name': brand_name}
+            for field, data_type, sentiment in fields:
+                results[brand_name][field] = self.query_brand_data(brand_name, data_type, sentiment)
+        return results, missing
+    
+    def get_brand_summary(self, brand_name, version=None, since=None, until=None, itemized=False):
+        """Get a comprehensive summary of all data for a brand (latest version unless asked otherwise)."""
+        summary = {'brand_name': brand_name}
+        for field, (data_type, sentiment) in BRAND_DATA_FIELDS.items():
+            summary[field] = self.query_brand_data(brand_name, data_type, sentiment, version, since, until, itemized)
+        
+        return summary
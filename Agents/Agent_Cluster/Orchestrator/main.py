@@ -1,12 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import httpx
 import asyncio
+import hashlib
+import os
 from datetime import datetime
-from hyperon import MeTTa, E, S, ValueAtom
-import threading
+from knowledge_graph import ATOM_RELATIONS, BrandKnowledgeGraph
+from kg_worker import KnowledgeGraphWorker
+from job_store import JobStore
+from job_events import JobEvents, format_sse
 import time
-from typing import Dict, Optional
+import uuid
+import random
+from collections import OrderedDict
+from urllib.parse import urlparse
+from typing import Callable, Dict, List, Literal, Optional, Tuple
 # from pyngrok import ngrok
 
 # Set ngrok authtoken
@@ -16,9 +25,31 @@ app = FastAPI(title="Brand Research Orchestrator with Knowledge Graph", version=
 
 class BrandRequest(BaseModel):
     brand_name: str
+    # "fast" gives a quick first web search report in seconds, "deep" runs the full research job
+    depth: Literal["fast", "deep"] = "deep"
+    # Run the research again even if a cached result for this brand and depth is still fresh
+    refresh: bool = False
+
+class KGBatchRequest(BaseModel):
+    brands: List[str]
+    # Optional projections: data types (web_results, reddit_threads, reviews, social_comments)
+    # and sentiments (positive, negative); everything is returned when omitted
+    data_types: Optional[List[str]] = None
+    sentiments: Optional[List[str]] = None
+    include_all_brands: bool = False
+
+class KGRetrieveRequest(BaseModel):
+    brand_name: str
+    # What the prompt is for, e.g. "customer complaints about product quality"
+    query: str
+    k: int = 8
+    token_budget: int = 1500
+    data_types: Optional[List[str]] = None
+    sentiments: Optional[List[str]] = None
 
 class OrchestratorResponse(BaseModel):
     brand_name: str
+    depth: str = "deep"
     web_search_result: str
     negative_reviews_result: str
     positive_reviews_result: str
@@ -30,1481 +61,1599 @@ class OrchestratorResponse(BaseModel):
     bounty_result: str
     timestamp: str
     kg_storage_status: str
+    job_id: Optional[str] = None
+    # True when the result was served from the research cache (see `timestamp` for its age)
+    cached: bool = False
+    # Steps skipped or cut short because their upstream's circuit was open or the job's
+    # retry budget ran out; their results are the step fallbacks
+    degraded_steps: List[str] = []
+    # Sources the metrics were computed from, and whether metrics were recomputed after
+    # sources that missed the quorum arrived
+    metrics_sources: List[str] = []
+    metrics_refined: bool = False
+    # Deep research queued after a fast job (same brand); poll /research-status/{id} for it
+    follow_up_job_id: Optional[str] = None
+
 
+# Initialize the knowledge graph service. With KG_DATA_DIR set (an empty value turns
+# persistence off) every write is journaled there and the graph is restored on startup;
+# on Cloud Run point it at a mounted volume so it survives restarts and scale-in.
+KG_DATA_DIR = os.environ.get("KG_DATA_DIR", "kg_data")
+KG_SNAPSHOT_EVERY = int(os.environ.get("KG_SNAPSHOT_EVERY", "500"))
+KG_JOURNAL_FSYNC = os.environ.get("KG_JOURNAL_FSYNC", "false").lower() == "true"
+# Versions of each value kept for version / time range queries; older ones are compacted away
+KG_KEEP_VERSIONS = int(os.environ.get("KG_KEEP_VERSIONS", "3"))
+KG_BATCH_MAX_BRANDS = int(os.environ.get("KG_BATCH_MAX_BRANDS", "100"))
+KG_ITEMS_MAX_LIMIT = int(os.environ.get("KG_ITEMS_MAX_LIMIT", "500"))
+KG_SEARCH_MAX_LIMIT = int(os.environ.get("KG_SEARCH_MAX_LIMIT", "100"))
+KG_RETRIEVE_MAX_K = int(os.environ.get("KG_RETRIEVE_MAX_K", "50"))
+# Queued KG operations the worker thread runs (and group-commits to the journal) at a time
+KG_WORKER_BATCH = int(os.environ.get("KG_WORKER_BATCH", "32"))
 
-class BrandKnowledgeGraph:
-    def __init__(self):
-        self.metta = MeTTa()
-        self.initialize_schema()
+# All graph access goes through a single worker thread that owns the MeTTa space, so
+# synchronous hyperon calls never block the event loop; `await kg_worker.call(op, ...)`
+kg_worker = KnowledgeGraphWorker(
+    lambda: BrandKnowledgeGraph(KG_DATA_DIR or None, KG_SNAPSHOT_EVERY, KG_JOURNAL_FSYNC, KG_KEEP_VERSIONS),
+    KG_WORKER_BATCH
+)
+kg_worker.start()
+
+# Research job scheduling
+MAX_CONCURRENT_JOBS = int(os.environ.get("ORCHESTRATOR_MAX_CONCURRENT_JOBS", "4"))
+MAX_QUEUED_JOBS = int(os.environ.get("ORCHESTRATOR_MAX_QUEUED_JOBS", "50"))
+JOB_HISTORY_LIMIT = int(os.environ.get("ORCHESTRATOR_JOB_HISTORY", "200"))
+# Finished research results reused for the same brand and depth (a TTL of 0 turns the cache off)
+RESEARCH_CACHE_TTL = float(os.environ.get("ORCHESTRATOR_CACHE_TTL", "3600"))
+RESEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("ORCHESTRATOR_CACHE_MAX_ENTRIES", "100"))
+RESEARCH_CACHE_MAX_BYTES = int(os.environ.get("ORCHESTRATOR_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# A finished fast job queues deep research for the brand, reusing everything but the web research
+FAST_FOLLOW_UP = os.environ.get("ORCHESTRATOR_FAST_FOLLOW_UP", "true").lower() == "true"
+# Jobs are checkpointed here after every finished step and resumed on restart (empty turns it off)
+JOB_DATA_DIR = os.environ.get("ORCHESTRATOR_JOB_DIR", "job_data")
+JOB_FSYNC = os.environ.get("ORCHESTRATOR_JOB_FSYNC", "false").lower() == "true"
+# Seconds between keep-alive comments on an idle /research-stream connection
+STREAM_KEEPALIVE = float(os.environ.get("ORCHESTRATOR_STREAM_KEEPALIVE", "15"))
+
+class RetryPolicy:
+    """How a pipeline step retries: exponential backoff with jitter, bounded attempts and a deadline.
     
-    def initialize_schema(self):
-        """Initialize the knowledge graph schema for brand data."""
-        # Brand relationships
-        self.metta.space().add_atom(E(S("brand_has"), S("brand"), S("web_results")))
-        self.metta.space().add_atom(E(S("brand_has"), S("brand"), S("reddit_threads")))
-        self.metta.space().add_atom(E(S("brand_has"), S("brand"), S("reviews")))
-        self.metta.space().add_atom(E(S("brand_has"), S("brand"), S("social_comments")))
-        
-        # Sentiment relationships
-        self.metta.space().add_atom(E(S("has_sentiment"), S("reddit_threads"), S("positive")))
-        self.metta.space().add_atom(E(S("has_sentiment"), S("reddit_threads"), S("negative")))
-        self.metta.space().add_atom(E(S("has_sentiment"), S("reviews"), S("positive")))
-        self.metta.space().add_atom(E(S("has_sentiment"), S("reviews"), S("negative")))
-        self.metta.space().add_atom(E(S("has_sentiment"), S("social_comments"), S("positive")))
-        self.metta.space().add_atom(E(S("has_sentiment"), S("social_comments"), S("negative")))
-    
-    def add_brand_data(self, brand_name, data):
-        """Add comprehensive brand data to the knowledge graph."""
-        brand_id = brand_name.lower().replace(" ", "_")
-        
-        # Add brand name
-        self.metta.space().add_atom(E(S("brand_name"), S(brand_id), ValueAtom(brand_name)))
-        
-        # Add web results (single string)
-        if 'web_results' in data and data['web_results']:
-            self.metta.space().add_atom(E(S("web_result"), S(brand_id), ValueAtom(data['web_results'])))
-            self.metta.space().add_atom(E(S("brand_has_web"), S(brand_id), S(brand_id)))
-        
-        # Add positive reddit threads (single string)
-        if 'positive_reddit' in data and data['positive_reddit']:
-            self.metta.space().add_atom(E(S("reddit_thread"), S(f"{brand_id}_pos"), ValueAtom(data['positive_reddit'])))
-            self.metta.space().add_atom(E(S("brand_has_reddit"), S(brand_id), S(f"{brand_id}_pos")))
-            self.metta.space().add_atom(E(S("thread_sentiment"), S(f"{brand_id}_pos"), S("positive")))
-        
-        # Add negative reddit threads (single string)
-        if 'negative_reddit' in data and data['negative_reddit']:
-            self.metta.space().add_atom(E(S("reddit_thread"), S(f"{brand_id}_neg"), ValueAtom(data['negative_reddit'])))
-            self.metta.space().add_atom(E(S("brand_has_reddit"), S(brand_id), S(f"{brand_id}_neg")))
-            self.metta.space().add_atom(E(S("thread_sentiment"), S(f"{brand_id}_neg"), S("negative")))
-        
-        # Add positive reviews (single string)
-        if 'positive_reviews' in data and data['positive_reviews']:
-            self.metta.space().add_atom(E(S("review"), S(f"{brand_id}_pos"), ValueAtom(data['positive_reviews'])))
-            self.metta.space().add_atom(E(S("brand_has_review"), S(brand_id), S(f"{brand_id}_pos")))
-            self.metta.space().add_atom(E(S("review_sentiment"), S(f"{brand_id}_pos"), S("positive")))
-        
-        # Add negative reviews (single string)
-        if 'negative_reviews' in data and data['negative_reviews']:
-            self.metta.space().add_atom(E(S("review"), S(f"{brand_id}_neg"), ValueAtom(data['negative_reviews'])))
-            self.metta.space().add_atom(E(S("brand_has_review"), S(brand_id), S(f"{brand_id}_neg")))
-            self.metta.space().add_atom(E(S("review_sentiment"), S(f"{brand_id}_neg"), S("negative")))
-        
-        # Add positive social comments (single string)
-        if 'positive_social' in data and data['positive_social']:
-            self.metta.space().add_atom(E(S("social_comment"), S(f"{brand_id}_pos"), ValueAtom(data['positive_social'])))
-            self.metta.space().add_atom(E(S("brand_has_social"), S(brand_id), S(f"{brand_id}_pos")))
-            self.metta.space().add_atom(E(S("comment_sentiment"), S(f"{brand_id}_pos"), S("positive")))
-        
-        # Add negative social comments (single string)
-        if 'negative_social' in data and data['negative_social']:
-            self.metta.space().add_atom(E(S("social_comment"), S(f"{brand_id}_neg"), ValueAtom(data['negative_social'])))
-            self.metta.space().add_atom(E(S("brand_has_social"), S(brand_id), S(f"{brand_id}_neg")))
-            self.metta.space().add_atom(E(S("comment_sentiment"), S(f"{brand_id}_neg"), S("negative")))
-        
-        return f"Successfully added data for brand: {brand_name}"
+    Attempt ``n`` failing waits ``min(max_delay, base_delay * multiplier ** (n - 1))``,
+    of which the upper ``jitter`` fraction is randomized so that jobs retrying the
+    same agent do not hit it in lockstep. The step gives up after ``max_attempts``
+    attempts or once ``deadline`` seconds have passed since it started.
+    """
     
-    def query_brand_data(self, brand_name, data_type=None, sentiment=None):
-        """Query brand data from the knowledge graph."""
-        brand_id = brand_name.lower().replace(" ", "_")
-        results = []
-        
-        if data_type == 'web_results':
-            query_str = f'!(match &self (web_result {brand_id} $content) $content)'
-            web_results = self.metta.run(query_str)
-            if web_results and web_results[0]:
-                results.append(web_results[0][0].get_object().value)
-        
-        elif data_type == 'reddit_threads':
-            if sentiment:
-                query_str = f'!(match &self (reddit_thread {brand_id}_{sentiment[:3]} $content) $content)'
-            else:
-                query_str = f'!(match &self (reddit_thread {brand_id}_pos $content) $content)'
-                pos_results = self.metta.run(query_str)
-                if pos_results and pos_results[0]:
-                    results.append(pos_results[0][0].get_object().value)
-                
-                query_str = f'!(match &self (reddit_thread {brand_id}_neg $content) $content)'
-                neg_results = self.metta.run(query_str)
-                if neg_results and neg_results[0]:
-                    results.append(neg_results[0][0].get_object().value)
-                return results
-            
-            thread_results = self.metta.run(query_str)
-            if thread_results and thread_results[0]:
-                results.append(thread_results[0][0].get_object().value)
-        
-        elif data_type == 'reviews':
-            if sentiment:
-                query_str = f'!(match &self (review {brand_id}_{sentiment[:3]} $content) $content)'
+    def __init__(self, max_attempts: int = 5, base_delay: float = 2.0, max_delay: float = 30.0,
+                 multiplier: float = 2.0, jitter: float = 0.5, deadline: Optional[float] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+    
+    @classmethod
+    def from_env(cls, name: str, **defaults):
+        """Build a policy whose settings can be overridden with ORCHESTRATOR_<NAME>_* env vars."""
+        prefix = f"ORCHESTRATOR_{name.upper()}_"
+        settings = dict(defaults)
+        for field, cast in (("max_attempts", int), ("base_delay", float), ("max_delay", float), ("deadline", float)):
+            value = os.environ.get(prefix + field.upper())
+            if value:
+                settings[field] = cast(value)
+        return cls(**settings)
+    
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (self.multiplier ** (attempt - 1)))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+class CircuitBreaker:
+    """Per-upstream circuit breaker (closed -> open -> half-open -> closed).
+    
+    After ``failure_threshold`` consecutive upstream failures the circuit opens
+    and calls are refused without touching the upstream. Once ``reset_timeout``
+    seconds have passed it goes half-open and lets a single probe call through:
+    success closes the circuit again, failure re-opens it.
+    """
+    
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self.retries = 0
+        self.last_error = None
+    
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self.probe_in_flight = False
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+    
+    def release_probe(self):
+        """End the half-open probe without an outcome (e.g. it was cancelled) so another can go through."""
+        self.probe_in_flight = False
+    
+    def record_success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        if self.state != "closed":
+            print(f"🟢 Circuit for {self.name} closed")
+        self.state = "closed"
+    
+    def record_failure(self, error: str):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        self.last_error = error
+        if self.state == "half_open" or (self.state == "closed" and self.consecutive_failures >= self.failure_threshold):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            print(f"🔴 Circuit for {self.name} opened after {self.consecutive_failures} consecutive failures: {error}")
+    
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected_calls": self.rejected,
+            "times_opened": self.times_opened,
+            "retries": self.retries,
+            "retry_in_seconds": round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1) if self.state == "open" else None,
+            "last_error": self.last_error
+        }
+
+class RetryRateLimiter:
+    """Token bucket shared by every job: at most ``rate`` retries per second after a burst of ``burst``.
+    
+    A retry over the limit is not refused but delayed until its token is due, so a
+    failing upstream sees a bounded retry rate however many jobs are calling it.
+    A ``rate`` of 0 turns the limit off.
+    """
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.granted = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+    
+    def reserve(self) -> float:
+        """Take a token and return how many seconds the caller has to wait for it."""
+        self.granted += 1
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate) - 1
+        self.updated = now
+        if self.tokens >= 0:
+            return 0.0
+        wait = -self.tokens / self.rate
+        self.throttled += 1
+        self.throttled_seconds += wait
+        return wait
+    
+    def stats(self) -> Dict:
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "retries": self.granted,
+            "throttled": self.throttled,
+            "throttled_seconds": round(self.throttled_seconds, 1)
+        }
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Errors that say the upstream is down or overloaded (not that its run is still going).
+    
+    That includes an agent that is up but reports a failure of the LLM or MCP
+    service behind it.
+    """
+    if isinstance(error, StepUpstreamError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+class Quorum:
+    """Lets a step start before all of its dependencies have finished.
+    
+    The step is ready once ``min_count`` of its dependencies have finished,
+    including every ``required`` one, or once ``deadline`` seconds have passed
+    since the pipeline started and at least one has.
+    """
+    
+    def __init__(self, min_count: int, required: Optional[List[str]] = None, deadline: Optional[float] = None):
+        self.min_count = min_count
+        self.required = required or []
+        self.deadline = deadline
+    
+    def ready(self, finished: List[str], elapsed: float) -> bool:
+        if not finished:
+            return False
+        if self.deadline is not None and elapsed >= self.deadline:
+            return True
+        return len(finished) >= self.min_count and all(key in finished for key in self.required)
+
+class PipelineStep:
+    """One declared step of the research pipeline.
+    
+    Agent steps call ``url`` and extract ``result_field`` from the JSON reply
+    (or keep the whole reply as a string with ``keep_response``). Local steps run
+    ``handler(brand_name, results)`` instead; a handler may return
+    ``(result, details)``, and the ``details`` dict is recorded in the step's
+    status. Steps with ``send_run_id`` also pass
+    the pipeline run ID so agents can tie their work to this run. Steps with
+    ``job_api`` submit to ``<url>/runs`` and poll ``<url>/status`` instead of
+    re-posting the request, so polling never restarts the agent's work. A step with a
+    ``fallback`` value never fails the pipeline: once its retry policy is
+    exhausted the fallback is used. A step with a ``quorum`` may start before all
+    of ``depends_on`` have finished. ``skip(results, steps)`` (``steps`` being the
+    per-step status) can return a result to use without running the step (None
+    runs it).
+    """
+    
+    def __init__(self, key: str, label: str, url: Optional[str] = None, method: str = "POST",
+                 payload_field: Optional[str] = "brand_name", result_field: Optional[str] = None,
+                 keep_response: bool = False, check_error_text: bool = True,
+                 retry: Optional[RetryPolicy] = None, depends_on: Optional[List[str]] = None,
+                 fallback: Optional[str] = None, handler=None,
+                 is_source: bool = False, send_run_id: bool = False,
+                 extra_payload: Optional[Dict] = None, job_api: bool = False,
+                 request_fields: Optional[List[str]] = None, quorum: Optional[Quorum] = None,
+                 skip: Optional[Callable[[Dict, Dict], Optional[str]]] = None):
+        self.key = key
+        self.label = label
+        self.url = url
+        self.method = method
+        self.payload_field = payload_field
+        self.result_field = result_field
+        self.keep_response = keep_response
+        self.check_error_text = check_error_text
+        self.retry = retry or RetryPolicy()
+        self.depends_on = depends_on or []
+        self.fallback = fallback
+        self.handler = handler
+        self.is_source = is_source
+        self.send_run_id = send_run_id
+        self.extra_payload = extra_payload or {}
+        self.job_api = job_api
+        self.request_fields = request_fields or []
+        self.quorum = quorum
+        self.skip = skip
+
+class StepNotReady(Exception):
+    """The agent answered but did not return a usable result yet."""
+
+class StepUpstreamError(StepNotReady):
+    """The agent answered, but its run failed or its result is an error from its own upstream (LLM, MCP)."""
+
+class StepFailed(Exception):
+    """The agent reported that this run failed for good; retrying will not help."""
+
+class StepDegraded(Exception):
+    """The step was given up early (open circuit or exhausted retry budget) so the run can move on."""
+
+class PipelineError(Exception):
+    """A required pipeline step failed."""
+
+def looks_like_error(text: str) -> bool:
+    return "error" in text.lower() or "500" in text
+
+def extract_result(step: PipelineStep, data: Dict) -> str:
+    result = str(data) if step.keep_response else data[step.result_field]
+    if step.check_error_text and looks_like_error(result):
+        raise StepUpstreamError(f"{step.label} returned an error result")
+    return result
+
+def build_step_payload(step: PipelineStep, brand_name: str, options: Optional[Dict] = None) -> Dict:
+    """Request body for an agent step: the brand, fixed extras and any request options the step takes."""
+    payload = {step.payload_field: brand_name, **step.extra_payload}
+    for field in step.request_fields:
+        if options and field in options:
+            payload[field] = options[field]
+    return payload
+
+async def call_job_api_step(client: httpx.AsyncClient, step: PipelineStep, brand_name: str, options: Optional[Dict] = None) -> str:
+    """Submit a run to the agent's async job API and poll its status until the run finishes."""
+    response = await client.post(f"{step.url}/runs", json=build_step_payload(step, brand_name, options))
+    response.raise_for_status()
+    run = response.json()
+    if run.get("coalesced"):
+        print(f"🔗 {step.label} joined in-flight run {run.get('run_id')}")
+    
+    delay = JOB_POLL_INTERVAL
+    while run.get("status") == "running":
+        await asyncio.sleep(delay)
+        delay = min(delay * 1.5, JOB_POLL_MAX_INTERVAL)
+        response = await client.post(f"{step.url}/status", json={"run_id": run["run_id"]})
+        response.raise_for_status()
+        run = response.json()
+    
+    if run.get("status") != "completed" or run.get(step.result_field) is None:
+        raise StepUpstreamError(f"{step.label} run {run.get('run_id')} ended with status {run.get('status')}: {run.get('error')}")
+    return extract_result(step, run)
+
+async def call_agent_step(client: httpx.AsyncClient, step: PipelineStep, brand_name: str, run_id: Optional[str] = None, options: Optional[Dict] = None) -> str:
+    """Make a single call to an agent step and return its result, or raise if it is not usable."""
+    if step.job_api:
+        return await call_job_api_step(client, step, brand_name, options)
+    if step.method == "GET":
+        response = await client.get(step.url)
+    else:
+        payload = build_step_payload(step, brand_name, options)
+        if step.send_run_id:
+            payload["run_id"] = run_id
+        response = await client.post(step.url, json=payload)
+    response.raise_for_status()
+    data = response.json()
+    
+    if data.get("success") and data.get(step.result_field) not in (None, {}):
+        return extract_result(step, data)
+    if data.get("status") == "error":
+        raise StepUpstreamError(f"{step.label} agent encountered an error")
+    if data.get("status") == "failed":
+        raise StepFailed(f"{step.label} agent reported a failed run: {data.get('error', 'unknown error')}")
+    raise StepNotReady(f"{step.label} agent not ready yet (status: {data.get('status', 'unknown')})")
+
+async def run_step(client: httpx.AsyncClient, step: PipelineStep, brand_name: str, results: Dict, step_status: Dict, run_id: Optional[str] = None, options: Optional[Dict] = None,
+                   retry_budget: Optional[Dict] = None) -> str:
+    """Run one step under its retry policy until it succeeds, runs out of attempts or hits its deadline.
+    
+    Calls go through the upstream's circuit breaker: while it is open the step
+    gives up at once with ``StepDegraded``, as it does when the job's
+    ``retry_budget`` (``{"limit", "used"}``, shared by all its steps) runs out.
+    Retries after an upstream failure are charged to that budget and take a token
+    from the global retry rate limiter; re-polls of an agent that answered "not
+    ready yet" are bounded by the step's policy only.
+    """
+    policy = step.retry
+    breaker = upstream_breaker(step)
+    started = time.monotonic()
+    last_error = None
+    for attempt in range(1, policy.max_attempts + 1):
+        remaining = None if policy.deadline is None else policy.deadline - (time.monotonic() - started)
+        if remaining is not None and remaining <= 0:
+            break
+        if breaker is not None and not breaker.allow():
+            raise StepDegraded(f"{step.label} skipped: circuit for {breaker.name} is open ({breaker.last_error})")
+        probe = breaker is not None and breaker.state == "half_open"
+        upstream_failed = False
+        step_status["attempts"] = attempt
+        try:
+            print(f"{step.label} attempt {attempt}/{policy.max_attempts}")
+            if step.handler is not None:
+                call = step.handler(brand_name, results)
             else:
-                query_str = f'!(match &self (review {brand_id}_pos $content) $content)'
-                pos_results = self.metta.run(query_str)
-                if pos_results and pos_results[0]:
-                    results.append(pos_results[0][0].get_object().value)
-                
-                query_str = f'!(match &self (review {brand_id}_neg $content) $content)'
-                neg_results = self.metta.run(query_str)
-                if neg_results and neg_results[0]:
-                    results.append(neg_results[0][0].get_object().value)
-                return results
-            
-            review_results = self.metta.run(query_str)
-            if review_results and review_results[0]:
-                results.append(review_results[0][0].get_object().value)
+                call = call_agent_step(client, step, brand_name, run_id, options)
+            result = await asyncio.wait_for(call, timeout=remaining)
+            if breaker is not None:
+                breaker.record_success()
+            print(f"✅ {step.label} completed successfully after {attempt} attempts!")
+            return result
+        except asyncio.TimeoutError:
+            last_error = f"deadline of {policy.deadline}s exceeded"
+            if breaker is not None:
+                breaker.record_failure(last_error)
+            break
+        except StepFailed as e:
+            last_error = str(e)
+            if breaker is not None:
+                breaker.record_success()
+            break
+        except Exception as e:
+            last_error = str(e) or type(e).__name__
+            # Only outages count against the circuit and the retry budgets; an agent
+            # that answers "not ready" is up
+            upstream_failed = is_upstream_failure(e)
+            if breaker is not None:
+                if upstream_failed:
+                    breaker.record_failure(last_error)
+                else:
+                    breaker.record_success()
+        finally:
+            if probe:
+                # A probe cancelled before it had an outcome must not block later probes
+                breaker.release_probe()
         
-        elif data_type == 'social_comments':
-            if sentiment:
-                query_str = f'!(match &self (social_comment {brand_id}_{sentiment[:3]} $content) $content)'
+        if attempt < policy.max_attempts:
+            delay = policy.backoff(attempt)
+            if upstream_failed:
+                if retry_budget is not None:
+                    if retry_budget["used"] >= retry_budget["limit"]:
+                        raise StepDegraded(f"{step.label} gave up: job retry budget of {retry_budget['limit']} exhausted ({last_error})")
+                    retry_budget["used"] += 1
+                if breaker is not None:
+                    breaker.retries += 1
+                delay = max(delay, retry_limiter.reserve())
+            if remaining is not None:
+                delay = min(delay, max(0, policy.deadline - (time.monotonic() - started)))
+            print(f"❌ {step.label}: {last_error}, retrying in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
+    
+    raise PipelineError(f"{step.label} failed after {step_status['attempts']} attempts: {last_error}")
+
+def update_pipeline_progress(status: Dict):
+    """Summarize per-step progress into the human readable progress string."""
+    steps = status["steps"]
+    finished = [s for s in steps.values() if s["status"] in ("completed", "skipped", "failed")]
+    running = [s["label"] for s in steps.values() if s["status"] == "running"]
+    progress = f"Pipeline: {len(finished)}/{len(steps)} steps finished"
+    if running:
+        progress += f" (running: {', '.join(running)})"
+    status["progress"] = progress
+
+async def run_pipeline(client: httpx.AsyncClient, steps: List[PipelineStep], brand_name: str, status: Dict, run_id: Optional[str] = None, options: Optional[Dict] = None,
+                       results: Optional[Dict[str, str]] = None, on_step: Optional[Callable[[str], None]] = None,
+                       on_start: Optional[Callable[[str], None]] = None) -> Dict[str, str]:
+    """Run the declared steps, each as soon as its dependencies have finished.
+    
+    Per-step progress is recorded in ``status["steps"]`` (source steps are also
+    exposed under ``status["sources"]``). A step that fails falls back to its
+    ``fallback`` value; a failing step without one raises ``PipelineError``.
+    ``options`` holds request options (e.g. ``depth``) passed on to the steps
+    that list them in ``request_fields``.
+    
+    Step results are collected into ``results``; steps already in it (a resumed
+    run) are not run again. ``on_start(key)`` is called when a step starts and
+    ``on_step(key)`` after it finishes, once its result is in ``results``. Each
+    step records the dependencies that had finished when it started under ``inputs``.
+    """
+    results = results if results is not None else {}
+    # Retries left for the whole run (kept across a resume)
+    retry_budget = status.setdefault("retry_budget", {"limit": JOB_RETRY_BUDGET, "used": 0})
+    previous = status.get("steps") or {}
+    status["steps"] = {
+        step.key: previous[step.key] if step.key in results and step.key in previous else {
+            "label": step.label,
+            "status": "completed" if step.key in results else "pending",
+            "attempts": 0,
+            "started_at": None,
+            "finished_at": None,
+            "result_length": len(results.get(step.key, "")),
+            "error": None,
+            "degraded": False,
+            "inputs": []
+        }
+        for step in steps
+    }
+    status["sources"] = {step.key: status["steps"][step.key] for step in steps if step.is_source}
+    
+    async def execute(step: PipelineStep):
+        step_status = status["steps"][step.key]
+        step_status["status"] = "running"
+        step_status["started_at"] = datetime.now().isoformat()
+        step_status["inputs"] = [dep for dep in step.depends_on if dep in results]
+        update_pipeline_progress(status)
+        if on_start is not None:
+            on_start(step.key)
+        try:
+            skipped = step.skip(results, status["steps"]) if step.skip is not None else None
+            if skipped is not None:
+                print(f"\n⏭️ Skipping {step.label} for {brand_name}")
+                result = skipped
+                step_status["status"] = "skipped"
             else:
-                query_str = f'!(match &self (social_comment {brand_id}_pos $content) $content)'
-                pos_results = self.metta.run(query_str)
-                if pos_results and pos_results[0]:
-                    results.append(pos_results[0][0].get_object().value)
-                
-                query_str = f'!(match &self (social_comment {brand_id}_neg $content) $content)'
-                neg_results = self.metta.run(query_str)
-                if neg_results and neg_results[0]:
-                    results.append(neg_results[0][0].get_object().value)
-                return results
-            
-            comment_results = self.metta.run(query_str)
-            if comment_results and comment_results[0]:
-                results.append(comment_results[0][0].get_object().value)
-        
+                print(f"\n🔎 Calling {step.label} for {brand_name}...")
+                result = await run_step(client, step, brand_name, results, step_status, run_id, options, retry_budget)
+                if isinstance(result, tuple):
+                    result, details = result
+                    step_status.update(details)
+                step_status["status"] = "completed"
+        except Exception as e:
+            print(f"❌ {step.label} failed: {e}")
+            step_status["status"] = "failed"
+            step_status["error"] = str(e)
+            step_status["degraded"] = isinstance(e, StepDegraded)
+            if step.fallback is None:
+                step_status["finished_at"] = datetime.now().isoformat()
+                update_pipeline_progress(status)
+                raise PipelineError(str(e))
+            result = step.fallback
+        step_status["result_length"] = len(result)
+        step_status["finished_at"] = datetime.now().isoformat()
+        results[step.key] = result
+        update_pipeline_progress(status)
+        if on_step is not None:
+            on_step(step.key)
+        print(f"\n=== {step.label.upper()} RESULT FOR {brand_name.upper()} ===")
+        print(result)
+        print("=" * 50)
+    
+    if DISPATCH_MODE == "sequential":
+        for step in steps:
+            if step.key not in results:
+                await execute(step)
         return results
     
-    def get_all_brands(self):
-        """Get all brands in the knowledge graph."""
-        query_str = '!(match &self (brand_name $brand_id $name) $name)'
-        results = self.metta.run(query_str)
-        return [result[0].get_object().value for result in results if result and len(result) > 0]
+    started = time.monotonic()
+    
+    def ready(step: PipelineStep) -> bool:
+        if all(dep in results for dep in step.depends_on):
+            return True
+        finished = [dep for dep in step.depends_on if dep in results]
+        return step.quorum is not None and step.quorum.ready(finished, time.monotonic() - started)
+    
+    def next_quorum_deadline() -> Optional[float]:
+        """Seconds until a pending step's quorum deadline passes (None when none is ahead)."""
+        elapsed = time.monotonic() - started
+        waits = [step.quorum.deadline - elapsed for step in pending.values()
+                 if step.quorum is not None and step.quorum.deadline is not None and step.quorum.deadline > elapsed]
+        return min(waits) if waits else None
+    
+    pending = {step.key: step for step in steps if step.key not in results}
+    running = {}
+    try:
+        while pending or running:
+            for key, step in list(pending.items()):
+                if ready(step):
+                    running[asyncio.create_task(execute(step))] = key
+                    del pending[key]
+            if not running:
+                raise PipelineError(f"Unresolvable step dependencies: {', '.join(pending)}")
+            done, _ = await asyncio.wait(running, timeout=next_quorum_deadline(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                del running[task]
+                task.result()
+    finally:
+        for task in running:
+            task.cancel()
+    
+    return results
+
+# "concurrent" starts every step as soon as its dependencies are done, "sequential" keeps the old step-by-step order
+DISPATCH_MODE = os.environ.get("ORCHESTRATOR_DISPATCH_MODE", "concurrent").lower()
+
+# Upstream protection: a circuit breaker per agent host, a retry budget per job and a
+# retry rate limit shared by all jobs
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("ORCHESTRATOR_BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(os.environ.get("ORCHESTRATOR_BREAKER_RESET_SECONDS", "60"))
+JOB_RETRY_BUDGET = int(os.environ.get("ORCHESTRATOR_JOB_RETRY_BUDGET", "40"))
+retry_limiter = RetryRateLimiter(float(os.environ.get("ORCHESTRATOR_RETRY_RATE", "2")),
+                                 int(os.environ.get("ORCHESTRATOR_RETRY_BURST", "20")))
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+def upstream_breaker(step: PipelineStep) -> Optional[CircuitBreaker]:
+    """The circuit breaker of the host a step calls (None for local steps)."""
+    if step.url is None:
+        return None
+    host = urlparse(step.url).netloc
+    if host not in circuit_breakers:
+        circuit_breakers[host] = CircuitBreaker(host, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+    return circuit_breakers[host]
+
+def degraded_steps(status: Dict) -> List[str]:
+    return [key for key, step_status in status.get("steps", {}).items() if step_status.get("degraded")]
+
+# Retry policies shared by the pipeline steps (override with ORCHESTRATOR_<NAME>_MAX_ATTEMPTS,
+# _BASE_DELAY, _MAX_DELAY and _DEADLINE)
+WEB_SEARCH_RETRY = RetryPolicy.from_env("web_search", max_attempts=2, base_delay=5, max_delay=30, deadline=900)
+SOURCE_RETRY = RetryPolicy.from_env("source", max_attempts=6, base_delay=2, max_delay=30, deadline=600)
+METRICS_RETRY = RetryPolicy.from_env("metrics", max_attempts=8, base_delay=4, max_delay=60, deadline=900)
+# Each bounty attempt is a long-poll that blocks on the bounty agent for up to
+# BOUNTY_WAIT_TIMEOUT seconds, so retries only need a short pause in between
+BOUNTY_RETRY = RetryPolicy.from_env("bounty", max_attempts=20, base_delay=1, max_delay=5, deadline=300)
+BOUNTY_WAIT_TIMEOUT = float(os.environ.get("ORCHESTRATOR_BOUNTY_WAIT_TIMEOUT", "25"))
+
+# Status polling of source agents' async job runs (grows 1.5x per poll up to the max)
+JOB_POLL_INTERVAL = float(os.environ.get("ORCHESTRATOR_JOB_POLL_INTERVAL", "3"))
+JOB_POLL_MAX_INTERVAL = float(os.environ.get("ORCHESTRATOR_JOB_POLL_MAX_INTERVAL", "15"))
+
+async def store_in_knowledge_graph(brand_name: str, results: Dict) -> Tuple[str, Dict]:
+    """Pipeline step: write the source results collected so far to the knowledge graph.
+    
+    Sources that have not arrived yet are left out; a later write with them only
+    adds a version for the fields whose content changed. Returns the status text
+    and, for the step's status, the version written and ``fields_changed``.
+    A failed write raises, so the step falls back and records the error.
+    """
+    brand_data = {
+        field: results[key] for key, field in (
+            ("web_search", "web_results"),
+            ("positive_reddit", "positive_reddit"),
+            ("negative_reddit", "negative_reddit"),
+            ("positive_reviews", "positive_reviews"),
+            ("negative_reviews", "negative_reviews"),
+            ("positive_social", "positive_social"),
+            ("negative_social", "negative_social")
+        ) if key in results
+    }
+    
+    kg_result = await kg_worker.call("ingest_brand_data", brand_name, brand_data)
+    print(f"✅ Knowledge Graph storage successful: {kg_result['message']}")
+    return (
+        f"Successfully stored in Knowledge Graph: {kg_result['message']}",
+        {"kg_version": kg_result["version"], "fields_changed": kg_result["fields_changed"]}
+    )
+
+SOURCE_KEYS = [
+    "web_search",
+    "negative_reviews",
+    "positive_reviews",
+    "negative_reddit",
+    "positive_reddit",
+    "negative_social",
+    "positive_social"
+]
+
+# When the KG write (and so metrics) may start: once ORCHESTRATOR_METRICS_QUORUM of the seven
+# sources have finished, including every ORCHESTRATOR_METRICS_REQUIRED one, or once
+# ORCHESTRATOR_METRICS_QUORUM_DEADLINE seconds have passed. Sources that arrive later are
+# written afterwards and metrics are recomputed if they changed the KG.
+METRICS_QUORUM = Quorum(
+    int(os.environ.get("ORCHESTRATOR_METRICS_QUORUM", "5")),
+    [key for key in os.environ.get("ORCHESTRATOR_METRICS_REQUIRED", "").split(",") if key],
+    float(os.environ.get("ORCHESTRATOR_METRICS_QUORUM_DEADLINE", "420")) or None
+)
+
+def kg_write_changed(step_status: Dict) -> bool:
+    """Whether a KG write step stored a new version (rather than finding nothing changed or failing)."""
+    return step_status["status"] == "completed" and step_status.get("fields_changed", 0) > 0
+
+def metrics_sources(status: Dict, results: Dict) -> List[str]:
+    """The sources (with content) the latest metrics were computed from."""
+    refreshed = status["steps"].get("metrics_refresh", {}).get("status") == "completed"
+    basis = SOURCE_KEYS if refreshed else status["steps"].get("kg_write", {}).get("inputs", [])
+    return [key for key in basis if results.get(key)]
+
+# The research pipeline. Source agents have no dependencies on each other and run
+# together; the KG write waits for a quorum of them, metrics read from the KG, and the
+# bounty agent is fed by the metrics agent. Late sources are written and metrics
+# refreshed once every source has finished.
+RESEARCH_PIPELINE = [
+    PipelineStep(
+        key="web_search",
+        label="Web Search",
+        url="https://websearchagent-739298578243.us-central1.run.app/research/brand",
+        result_field="research_result",
+        check_error_text=False,
+        retry=WEB_SEARCH_RETRY,
+        fallback="",
+        is_source=True,
+        job_api=True,
+        request_fields=["depth"]
+    ),
+    PipelineStep(
+        key="negative_reviews",
+        label="Negative Reviews",
+        url="https://negativereviewsagent-739298578243.us-central1.run.app/reviews/negative",
+        result_field="reviews_result",
+        retry=SOURCE_RETRY,
+        fallback="",
+        is_source=True,
+        job_api=True
+    ),
+    PipelineStep(
+        key="positive_reviews",
+        label="Positive Reviews",
+        url="https://positivereviewsagent-739298578243.us-central1.run.app/reviews/positive",
+        result_field="reviews_result",
+        retry=SOURCE_RETRY,
+        fallback="",
+        is_source=True,
+        job_api=True
+    ),
+    PipelineStep(
+        key="negative_reddit",
+        label="Negative Reddit",
+        url="https://redditnegativeagent-739298578243.us-central1.run.app/reddit/negative",
+        payload_field="product_name",
+        result_field="reddit_result",
+        retry=SOURCE_RETRY,
+        fallback="",
+        is_source=True,
+        job_api=True
+    ),
+    PipelineStep(
+        key="positive_reddit",
+        label="Positive Reddit",
+        url="https://redditpositiveagent-739298578243.us-central1.run.app/reddit/positive",
+        payload_field="product_name",
+        result_field="reddit_result",
+        retry=SOURCE_RETRY,
+        fallback="",
+        is_source=True,
+        job_api=True
+    ),
+    PipelineStep(
+        key="negative_social",
+        label="Negative Social",
+        url="https://negativesocialsagent-739298578243.us-central1.run.app/social/negative",
+        result_field="social_media_result",
+        retry=SOURCE_RETRY,
+        fallback="",
+        is_source=True,
+        job_api=True
+    ),
+    PipelineStep(
+        key="positive_social",
+        label="Positive Social",
+        url="https://positivesocialsagent-739298578243.us-central1.run.app/social/positive",
+        result_field="social_media_result",
+        retry=SOURCE_RETRY,
+        fallback="",
+        is_source=True,
+        job_api=True
+    ),
+    PipelineStep(
+        key="kg_write",
+        label="Knowledge Graph Storage",
+        handler=store_in_knowledge_graph,
+        retry=RetryPolicy(max_attempts=1),
+        depends_on=SOURCE_KEYS,
+        quorum=METRICS_QUORUM,
+        fallback="Knowledge Graph storage failed"
+    ),
+    PipelineStep(
+        key="metrics",
+        label="Metrics Agent",
+        url="https://metricsagent-739298578243.us-central1.run.app/brand/metrics",
+        result_field="metrics",
+        keep_response=True,
+        retry=METRICS_RETRY,
+        depends_on=["kg_write"],
+        send_run_id=True,
+        fallback='{"success": false, "error": "Metrics agent unavailable", "metrics": {}}'
+    ),
+    PipelineStep(
+        key="bounty",
+        label="Bounty Agent",
+        url="https://bountyagent-739298578243.us-central1.run.app/bounties/wait",
+        result_field="auto_generated_bounties",
+        keep_response=True,
+        check_error_text=False,
+        retry=BOUNTY_RETRY,
+        depends_on=["metrics"],
+        send_run_id=True,
+        extra_payload={"timeout_seconds": BOUNTY_WAIT_TIMEOUT},
+        fallback='{"success": false, "error": "Max attempts exceeded", "auto_generated_bounties": {}}'
+    ),
+    # Sources that missed the quorum: write them (only changed fields become a new version)
+    # and recompute metrics if they changed anything, otherwise keep the early metrics
+    PipelineStep(
+        key="kg_refresh",
+        label="Knowledge Graph Refresh",
+        handler=store_in_knowledge_graph,
+        retry=RetryPolicy(max_attempts=1),
+        depends_on=SOURCE_KEYS + ["kg_write"],
+        fallback="Knowledge Graph storage failed"
+    ),
+    PipelineStep(
+        key="metrics_refresh",
+        label="Metrics Refresh",
+        url="https://metricsagent-739298578243.us-central1.run.app/brand/metrics",
+        result_field="metrics",
+        keep_response=True,
+        retry=METRICS_RETRY,
+        depends_on=["kg_refresh", "metrics"],
+        send_run_id=True,
+        # Bounties were already generated from the early metrics; don't start a second generation
+        extra_payload={"forward_to_bounty": False},
+        skip=lambda results, steps: None if kg_write_changed(steps["kg_refresh"]) else results["metrics"],
+        fallback='{"success": false, "error": "Metrics agent unavailable", "metrics": {}}'
+    )
+]
+
+# Create the breakers up front so /upstreams lists every agent host
+for pipeline_step in RESEARCH_PIPELINE:
+    upstream_breaker(pipeline_step)
+
+def build_orchestrator_response(brand_name: str, results: Dict, status: Dict, job_id: Optional[str] = None,
+                                depth: str = "deep") -> OrchestratorResponse:
+    refined = status["steps"]["metrics_refresh"]["status"] == "completed"
+    kg_storage_status = results["kg_write"]
+    if kg_write_changed(status["steps"]["kg_refresh"]):
+        kg_storage_status += f"; late sources: {results['kg_refresh']}"
+    return OrchestratorResponse(
+        brand_name=brand_name,
+        depth=depth,
+        web_search_result=results["web_search"],
+        negative_reviews_result=results["negative_reviews"],
+        positive_reviews_result=results["positive_reviews"],
+        negative_reddit_result=results["negative_reddit"],
+        positive_reddit_result=results["positive_reddit"],
+        negative_social_result=results["negative_social"],
+        positive_social_result=results["positive_social"],
+        metrics_result=results["metrics_refresh"] if refined else results["metrics"],
+        bounty_result=results["bounty"],
+        timestamp=datetime.now().isoformat(),
+        kg_storage_status=kg_storage_status,
+        job_id=job_id,
+        degraded_steps=degraded_steps(status),
+        metrics_sources=metrics_sources(status, results),
+        metrics_refined=refined
+    )
+
+def job_state_event(job: Dict) -> Dict:
+    return {
+        "job_id": job["job_id"],
+        "brand_name": job["brand_name"],
+        "depth": job["depth"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "timestamp": job["timestamp"]
+    }
+
+def step_event(job: Dict, key: str, finished: bool = True) -> Dict:
+    """Stream event for a pipeline step that started or (with its result) finished."""
+    step_status = job["steps"][key]
+    event = {
+        "step": key,
+        "label": step_status["label"],
+        "status": step_status["status"],
+        "is_source": key in SOURCE_KEYS,
+        "inputs": step_status.get("inputs", []),
+        "progress": job["progress"]
+    }
+    if finished:
+        event.update({
+            "attempts": step_status["attempts"],
+            "degraded": step_status.get("degraded", False),
+            "error": step_status["error"],
+            "result": job["results"][key]
+        })
+        if key in ("metrics", "metrics_refresh"):
+            event["metrics_sources"] = metrics_sources(job, job["results"])
+    return event
+
+def publish_job_state(job: Dict, events: JobEvents):
+    """Publish the job's state; a finished job's result or error closes its event log."""
+    events.publish("job", job_state_event(job))
+    if job["status"] == "completed" and job["result"]:
+        events.publish("result", job["result"].model_dump(), final=True)
+    elif job["status"] == "error":
+        events.publish("error", {"job_id": job["job_id"], "error_message": job["error_message"]}, final=True)
+
+async def process_brand_research(job: Dict, checkpoint: Optional[Callable[[Dict], None]] = None,
+                                 events: Optional[JobEvents] = None):
+    """Background task to process brand research for one scheduled job.
+    
+    Steps whose results are already in ``job["results"]`` (a job resumed after a
+    restart) are skipped. ``checkpoint(job)`` is called whenever the job changes
+    state or a step finishes, and every state change and step start and finish
+    is published to ``events`` for /research-stream. The final state (which
+    closes the event log) is published by the caller once the job is finished.
+    """
+    brand_name = job["brand_name"]
+    checkpoint = checkpoint or (lambda job: None)
+    events = events or JobEvents()
+    
+    def step_started(key: str):
+        events.publish("step_started", step_event(job, key, finished=False))
+    
+    def step_finished(key: str):
+        checkpoint(job)
+        events.publish("step_finished", step_event(job, key))
     
-    def get_brand_summary(self, brand_name):
-        """Get a comprehensive summary of all data for a brand."""
-        brand_id = brand_name.lower().replace(" ", "_")
-        
-        summary = {
-            'brand_name': brand_name,
-            'web_results': self.query_brand_data(brand_name, 'web_results'),
-            'positive_reddit': self.query_brand_data(brand_name, 'reddit_threads', 'positive'),
-            'negative_reddit': self.query_brand_data(brand_name, 'reddit_threads', 'negative'),
-            'positive_reviews': self.query_brand_data(brand_name, 'reviews', 'positive'),
-            'negative_reviews': self.query_brand_data(brand_name, 'reviews', 'negative'),
-            'positive_social': self.query_brand_data(brand_name, 'social_comments', 'positive'),
-            'negative_social': self.query_brand_data(brand_name, 'social_comments', 'negative')
-        }
-        
-        return summary
-
-# Initialize the knowledge graph service
-kg_service = BrandKnowledgeGraph()
-
-# Global status tracking
-global_status = {
-    "is_processing": False,
-    "brand_name": None,
-    "progress": "Ready",
-    "result": None,
-    "error_message": None,
-    "timestamp": None
-}
-
-async def process_brand_research(brand_name: str):
-    """Background task to process brand research"""
     try:
-        # Update global status to processing
-        global_status["is_processing"] = True
-        global_status["brand_name"] = brand_name
-        global_status["progress"] = "Starting brand analysis..."
-        global_status["timestamp"] = datetime.now().isoformat()
-        global_status["result"] = None
-        global_status["error_message"] = None
+        # Update job status to processing
+        resumed = bool(job["results"]) and not job.get("follow_up_of")
+        job["status"] = "processing"
+        job["is_processing"] = True
+        if job.get("follow_up_of"):
+            job["progress"] = "Starting deep web research..."
+        else:
+            job["progress"] = "Resuming brand analysis..." if resumed else "Starting brand analysis..."
+        job["started_at"] = job["started_at"] or datetime.now().isoformat()
+        job["timestamp"] = datetime.now().isoformat()
+        job["result"] = None
+        job["error_message"] = None
+        checkpoint(job)
+        publish_job_state(job, events)
         
-        print(f"🚀 Starting background brand analysis for: {brand_name}")
+        if job.get("follow_up_of"):
+            print(f"🔭 Starting deep follow-up of fast job {job['follow_up_of']} for: {brand_name} (job {job['job_id']})")
+        elif resumed:
+            print(f"♻️ Resuming {job['depth']} brand analysis for: {brand_name} (job {job['job_id']}, {len(job['results'])} steps already done)")
+        else:
+            print(f"🚀 Starting background {job['depth']} brand analysis for: {brand_name} (job {job['job_id']})")
         print(f"🔄 Background task is running independently...")
         
         async with httpx.AsyncClient(timeout=None) as client:
-            
-            # === 1. WEB SEARCH AGENT ===
-            global_status["progress"] = "Step 1: Web Search Agent..."
-            print(f"\n🔍 Step 1: Calling Web Search Agent for {brand_name}...")
-            print(f"🔄 Background task continuing - Step 1 started")
-            web_search_response = await client.post(
-                "https://websearchagent-739298578243.us-central1.run.app/research/brand",
-                json={"brand_name": brand_name}
-            )
-            web_search_response.raise_for_status()
-            web_search_data = web_search_response.json()
-            
-            # Check if we got the final result immediately
-            if web_search_data.get("success") and "research_result" in web_search_data:
-                web_search_result = web_search_data["research_result"]
-            else:
-                # The agent is still processing, we need to poll for results
-                print(f"Web search agent is processing... Status: {web_search_data.get('status', 'unknown')}")
-                
-                # Poll for results indefinitely until we get a result
-                poll_interval = 4
-                attempt = 0
-                
-                while True:
-                    attempt += 1
-                    print(f"Web search polling attempt {attempt}")
-                    await asyncio.sleep(poll_interval)
-                    
-                    # Make another request to check status
-                    poll_response = await client.post(
-                        "https://websearchagent-739298578243.us-central1.run.app/research/brand",
-                        json={"brand_name": brand_name}
-                    )
-                    poll_response.raise_for_status()
-                    poll_data = poll_response.json()
-                    
-                    # Check if research is complete
-                    if poll_data.get("success") and "research_result" in poll_data:
-                        web_search_result = poll_data["research_result"]
-                        print(f"✅ Web search completed after {attempt} polling attempts!")
-                        break
-                    elif poll_data.get("status") == "error":
-                        raise HTTPException(status_code=500, detail="Web search agent encountered an error")
-                    else:
-                        print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-            
-            # === 2. NEGATIVE REVIEWS AGENT ===
-            global_status["progress"] = "Step 2: Negative Reviews Agent..."
-            print(f"\n👎 Step 2: Calling Negative Reviews Agent for {brand_name}...")
-            print(f"🔄 Background task continuing - Step 2 started")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Negative reviews attempt {attempt}")
-                    negative_reviews_response = await client.post(
-                        "https://negativereviewsagent-739298578243.us-central1.run.app/reviews/negative",
-                        json={"brand_name": brand_name}
-                    )
-                    negative_reviews_response.raise_for_status()
-                    negative_reviews_data = negative_reviews_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if negative_reviews_data.get("success") and "reviews_result" in negative_reviews_data:
-                        # Check if the result contains an error message
-                        if "error" in negative_reviews_data["reviews_result"].lower() or "500" in negative_reviews_data["reviews_result"]:
-                            print(f"❌ Negative reviews returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        negative_reviews_result = negative_reviews_data["reviews_result"]
-                        print(f"✅ Negative reviews completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Negative reviews agent is processing... Status: {negative_reviews_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Negative reviews polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://negativereviewsagent-739298578243.us-central1.run.app/reviews/negative",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "reviews_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["reviews_result"].lower() or "500" in poll_data["reviews_result"]:
-                                    print(f"❌ Negative reviews polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                negative_reviews_result = poll_data["reviews_result"]
-                                print(f"✅ Negative reviews completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Negative reviews agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'negative_reviews_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Negative reviews request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            print(f"\n=== NEGATIVE REVIEWS RESULT FOR {brand_name.upper()} ===")
-            print(negative_reviews_result)
-            print("=" * 50)
-            
-            # === 3. POSITIVE REVIEWS AGENT ===
-            global_status["progress"] = "Step 3: Positive Reviews Agent..."
-            print(f"\n👍 Step 3: Calling Positive Reviews Agent for {brand_name}...")
-            print(f"🔄 Background task continuing - Step 3 started")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Positive reviews attempt {attempt}")
-                    positive_reviews_response = await client.post(
-                        "https://positivereviewsagent-739298578243.us-central1.run.app/reviews/positive",
-                        json={"brand_name": brand_name}
-                    )
-                    positive_reviews_response.raise_for_status()
-                    positive_reviews_data = positive_reviews_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if positive_reviews_data.get("success") and "reviews_result" in positive_reviews_data:
-                        # Check if the result contains an error message
-                        if "error" in positive_reviews_data["reviews_result"].lower() or "500" in positive_reviews_data["reviews_result"]:
-                            print(f"❌ Positive reviews returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        positive_reviews_result = positive_reviews_data["reviews_result"]
-                        print(f"✅ Positive reviews completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Positive reviews agent is processing... Status: {positive_reviews_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Positive reviews polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://positivereviewsagent-739298578243.us-central1.run.app/reviews/positive",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "reviews_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["reviews_result"].lower() or "500" in poll_data["reviews_result"]:
-                                    print(f"❌ Positive reviews polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                positive_reviews_result = poll_data["reviews_result"]
-                                print(f"✅ Positive reviews completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Positive reviews agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'positive_reviews_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Positive reviews request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            print(f"\n=== POSITIVE REVIEWS RESULT FOR {brand_name.upper()} ===")
-            print(positive_reviews_result)
-            print("=" * 50)
-            
-            # === 4. NEGATIVE REDDIT AGENT ===
-            global_status["progress"] = "Step 4: Negative Reddit Agent..."
-            print(f"\n📱👎 Step 4: Calling Negative Reddit Agent for {brand_name}...")
-            print(f"🔄 Background task continuing - Step 4 started")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Negative reddit attempt {attempt}")
-                    negative_reddit_response = await client.post(
-                        "https://redditnegativeagent-739298578243.us-central1.run.app/reddit/negative",
-                        json={"product_name": brand_name}
-                    )
-                    negative_reddit_response.raise_for_status()
-                    negative_reddit_data = negative_reddit_response.json()
-                    
-                    if negative_reddit_data.get("success") and "reddit_result" in negative_reddit_data:
-                        if "error" in negative_reddit_data["reddit_result"].lower() or "500" in negative_reddit_data["reddit_result"]:
-                            print(f"❌ Negative reddit returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        negative_reddit_result = negative_reddit_data["reddit_result"]
-                        print(f"✅ Negative reddit completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        print(f"Negative reddit agent is processing... Status: {negative_reddit_data.get('status', 'unknown')}")
-                        await asyncio.sleep(4)
-                        continue
-                        
-                except Exception as e:
-                    print(f"❌ Negative reddit request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            print(f"\n=== NEGATIVE REDDIT RESULT FOR {brand_name.upper()} ===")
-            print(negative_reddit_result)
-            print("=" * 50)
-            # === 5. POSITIVE REDDIT AGENT ===
-            global_status["progress"] = "Step 5: Positive Reddit Agent..."
-            print(f"\n📱👍 Step 5: Calling Positive Reddit Agent for {brand_name}...")
-            print(f"🔄 Background task continuing - Step 5 started")
-            
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Positive reddit attempt {attempt}")
-                    positive_reddit_response = await client.post(
-                        "https://redditpositiveagent-739298578243.us-central1.run.app/reddit/positive",
-                        json={"product_name": brand_name}
-                    )
-                    positive_reddit_response.raise_for_status()
-                    positive_reddit_data = positive_reddit_response.json()
-                    
-                    if positive_reddit_data.get("success") and "reddit_result" in positive_reddit_data:
-                        if "error" in positive_reddit_data["reddit_result"].lower() or "500" in positive_reddit_data["reddit_result"]:
-                            print(f"❌ Positive reddit returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        positive_reddit_result = positive_reddit_data["reddit_result"]
-                        print(f"✅ Positive reddit completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        print(f"Positive reddit agent is processing... Status: {positive_reddit_data.get('status', 'unknown')}")
-                        await asyncio.sleep(4)
-                        continue
-                        
-                except Exception as e:
-                    print(f"❌ Positive reddit request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            print(f"\n=== POSITIVE REDDIT RESULT FOR {brand_name.upper()} ===")
-            print(positive_reddit_result)
-            print("=" * 50)
-            
-            # === 6. NEGATIVE SOCIAL AGENT ===
-            global_status["progress"] = "Step 6: Negative Social Agent..."
-            print(f"\n📱👎 Step 6: Calling Negative Social Agent for {brand_name}...")
-            print(f"🔄 Background task continuing - Step 6 started")
-            
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Negative social attempt {attempt}")
-                    negative_social_response = await client.post(
-                        "https://negativesocialsagent-739298578243.us-central1.run.app/social/negative",
-                        json={"brand_name": brand_name}
-                    )
-                    negative_social_response.raise_for_status()
-                    negative_social_data = negative_social_response.json()
-                    
-                    if negative_social_data.get("success") and "social_media_result" in negative_social_data:
-                        if "error" in negative_social_data["social_media_result"].lower() or "500" in negative_social_data["social_media_result"]:
-                            print(f"❌ Negative social returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        negative_social_result = negative_social_data["social_media_result"]
-                        print(f"✅ Negative social completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        print(f"Negative social agent is processing... Status: {negative_social_data.get('status', 'unknown')}")
-                        await asyncio.sleep(4)
-                        continue
-                        
-                except Exception as e:
-                    print(f"❌ Negative social request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            print(f"\n=== NEGATIVE SOCIAL RESULT FOR {brand_name.upper()} ===")
-            print(negative_social_result)
-            print("=" * 50)
-            
-            # === 7. POSITIVE SOCIAL AGENT ===
-            global_status["progress"] = "Step 7: Positive Social Agent..."
-            print(f"\n📱👍 Step 7: Calling Positive Social Agent for {brand_name}...")
-            print(f"🔄 Background task continuing - Step 7 started")
-            
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Positive social attempt {attempt}")
-                    positive_social_response = await client.post(
-                        "https://positivesocialsagent-739298578243.us-central1.run.app/social/positive",
-                        json={"brand_name": brand_name}
-                    )
-                    positive_social_response.raise_for_status()
-                    positive_social_data = positive_social_response.json()
-                    
-                    if positive_social_data.get("success") and "social_media_result" in positive_social_data:
-                        if "error" in positive_social_data["social_media_result"].lower() or "500" in positive_social_data["social_media_result"]:
-                            print(f"❌ Positive social returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        positive_social_result = positive_social_data["social_media_result"]
-                        print(f"✅ Positive social completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        print(f"Positive social agent is processing... Status: {positive_social_data.get('status', 'unknown')}")
-                        await asyncio.sleep(4)
-                        continue
-                        
-                except Exception as e:
-                    print(f"❌ Positive social request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            print(f"\n=== POSITIVE SOCIAL RESULT FOR {brand_name.upper()} ===")
-            print(positive_social_result)
-            print("=" * 50)
-            
-            print(f"\n🎉 ALL ANALYSIS COMPLETE FOR {brand_name.upper()}!")
-            
-            # === STORE RESULTS IN KNOWLEDGE GRAPH ===
-            global_status["progress"] = "Storing results in Knowledge Graph..."
-            print(f"\n🗄️ Storing results in Knowledge Graph for {brand_name}...")
-            try:
-                brand_data = {
-                    "web_results": web_search_result,
-                    "positive_reddit": positive_reddit_result,
-                    "negative_reddit": negative_reddit_result,
-                    "positive_reviews": positive_reviews_result,
-                    "negative_reviews": negative_reviews_result,
-                    "positive_social": positive_social_result,
-                    "negative_social": negative_social_result
-                }
-                
-                kg_result = kg_service.add_brand_data(brand_name, brand_data)
-                print(f"✅ Knowledge Graph storage successful: {kg_result}")
-                kg_storage_status = "Successfully stored in Knowledge Graph"
-                
-            except Exception as e:
-                print(f"❌ Knowledge Graph storage failed: {e}")
-                kg_storage_status = f"Knowledge Graph storage failed: {str(e)}"
-            
-            # === 8. METRICS AGENT ===
-            global_status["progress"] = "Step 8: Metrics Agent..."
-            print(f"\n📊 Step 8: Calling Metrics Agent for {brand_name}...")
-            print(f"🔄 Background task continuing - Step 8 started")
-            
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Metrics agent attempt {attempt}")
-                    metrics_response = await client.post(
-                        "https://metricsagent-739298578243.us-central1.run.app/brand/metrics",
-                        json={"brand_name": brand_name}
-                    )
-                    metrics_response.raise_for_status()
-                    metrics_data = metrics_response.json()
-                    
-                    if metrics_data.get("success") and "metrics" in metrics_data:
-                        if "error" in str(metrics_data).lower() or "500" in str(metrics_data):
-                            print(f"❌ Metrics agent returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        metrics_result = str(metrics_data)
-                        print(f"✅ Metrics agent completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        print(f"Metrics agent is processing... Status: {metrics_data.get('status', 'unknown')}")
-                        await asyncio.sleep(4)
-                        continue
-                        
-                except Exception as e:
-                    print(f"❌ Metrics agent request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            print(f"\n=== METRICS RESULT FOR {brand_name.upper()} ===")
-            print(metrics_result)
-            print("=" * 50)
-            
-            # === 9. BOUNTY AGENT (with 1 minute delay) ===
-            global_status["progress"] = "Step 9: Waiting before Bounty Agent..."
-            print(f"\n🎯 Step 9: Waiting 2.5 minutes before calling Bounty Agent for {brand_name}...")
-            await asyncio.sleep(150)  # Wait for 2.5 minutes
-            
-            global_status["progress"] = "Step 9: Bounty Agent..."
-            print(f"\n🎯 Calling Bounty Agent for {brand_name}...")
-            print(f"🔄 Background task continuing - Step 9 started")
-            
-            # Simple retry logic: get bounty data or retry (max 50 attempts)
-            attempt = 0
-            max_attempts = 50
-            bounty_result = None
-            
-            while attempt < max_attempts and bounty_result is None:
-                attempt += 1
-                try:
-                    print(f"Bounty agent attempt {attempt}/{max_attempts}")
-                    bounty_response = await client.get(
-                        "https://bountyagent-739298578243.us-central1.run.app/bounties/auto-generated"
-                    )
-                    bounty_response.raise_for_status()
-                    bounty_data = bounty_response.json()
-                    
-                    if bounty_data.get("success") and bounty_data.get("auto_generated_bounties"):
-                        bounty_result = str(bounty_data)
-                        print(f"✅ Bounty agent completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        print(f"❌ Bounty agent not ready yet, retrying in 4 seconds...")
-                        await asyncio.sleep(4)
-                        
-                except Exception as e:
-                    print(f"❌ Bounty agent request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-            
-            # If we still don't have bounty data after max attempts, use empty result
-            if bounty_result is None:
-                print(f"❌ Bounty agent failed after {max_attempts} attempts, using empty result")
-                bounty_result = '{"success": false, "error": "Max attempts exceeded", "auto_generated_bounties": {}}'
-            
-            print(f"\n=== BOUNTY RESULT FOR {brand_name.upper()} ===")
-            print(bounty_result)
-            print("=" * 50)
-            
-            print(f"\n🎉 ALL STEPS COMPLETED! Preparing final response...")
-            
-            response = OrchestratorResponse(
-                brand_name=brand_name,
-                web_search_result=web_search_result,
-                negative_reviews_result=negative_reviews_result,
-                positive_reviews_result=positive_reviews_result,
-                negative_reddit_result=negative_reddit_result,
-                positive_reddit_result=positive_reddit_result,
-                negative_social_result=negative_social_result,
-                positive_social_result=positive_social_result,
-                metrics_result=metrics_result,
-                bounty_result=bounty_result,
-                timestamp=datetime.now().isoformat(),
-                kg_storage_status=kg_storage_status
-            )
+            results = await run_pipeline(client, RESEARCH_PIPELINE, brand_name, job, run_id=job["job_id"], options={"depth": job["depth"]},
+                                         results=job["results"], on_step=step_finished, on_start=step_started)
         
-        # Update global status to completed
-        global_status["is_processing"] = False
-        global_status["progress"] = "All analysis completed successfully!"
-        global_status["result"] = response
-        global_status["timestamp"] = datetime.now().isoformat()
+        print(f"\n🎉 ALL STEPS COMPLETED! Preparing final response...")
+        response = build_orchestrator_response(brand_name, results, job, job["job_id"], job["depth"])
+        
+        # Update job status to completed
+        job["status"] = "completed"
+        job["is_processing"] = False
+        job["progress"] = "All analysis completed successfully!"
+        job["result"] = response
+        job["finished_at"] = datetime.now().isoformat()
+        job["timestamp"] = job["finished_at"]
         
     except Exception as e:
         print(f"❌ Background processing failed: {e}")
-        global_status["is_processing"] = False
-        global_status["error_message"] = str(e)
-        global_status["timestamp"] = datetime.now().isoformat()
+        job["status"] = "error"
+        job["is_processing"] = False
+        job["error_message"] = str(e)
+        job["finished_at"] = datetime.now().isoformat()
+        job["timestamp"] = job["finished_at"]
+    checkpoint(job)
 
-@app.post("/research-brand")
-async def research_brand(request: BrandRequest):
-    """
-    Start brand research and return immediately with status
+class QueueFullError(Exception):
+    """Raised when the research queue cannot admit another job."""
+
+def all_steps_completed(status: Dict) -> bool:
+    """True when no pipeline step had to fall back, i.e. the result is worth reusing."""
+    return all(step["status"] in ("completed", "skipped") for step in status.get("steps", {}).values())
+
+def brand_key(brand_name: str) -> str:
+    """A brand name with case and whitespace folded, so spellings of one brand share cache entries and ETags."""
+    return ' '.join(brand_name.lower().split())
+
+class ResearchCache:
+    """LRU cache of finished research responses, keyed by normalized brand name and depth.
+    
+    Entries expire ``ttl`` seconds after they were stored. Beyond ``max_entries``
+    entries or ``max_bytes`` (the size of the serialized responses) the least
+    recently used entries are evicted.
     """
-    brand_name = request.brand_name
     
-    # Check if already processing
-    if global_status["is_processing"]:
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    @staticmethod
+    def key(brand_name: str, depth: str) -> str:
+        return f"{brand_key(brand_name)}|{depth}"
+    
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self.entries.get(key)
+        if entry is not None and time.time() - entry["stored_at"] > self.ttl:
+            self.remove(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+    
+    def put(self, key: str, response: OrchestratorResponse, job_id: Optional[str] = None, stored_at: Optional[float] = None):
+        size = len(response.model_dump_json())
+        stored_at = stored_at or time.time()
+        if self.ttl <= 0 or size > self.max_bytes or time.time() - stored_at > self.ttl:
+            return
+        self.remove(key)
+        self.entries[key] = {"response": response, "job_id": job_id, "stored_at": stored_at, "bytes": size}
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+    
+    def fresh(self, key: str) -> bool:
+        """True when an unexpired entry exists (without counting a lookup or reordering)."""
+        entry = self.entries.get(key)
+        return entry is not None and time.time() - entry["stored_at"] <= self.ttl
+    
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry["bytes"]
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
         return {
-            "status": "processing",
-            "brand_name": global_status["brand_name"],
-            "progress": global_status["progress"],
-            "timestamp": global_status["timestamp"]
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
         }
+
+class JobScheduler:
+    """Bounded worker pool that runs brand research jobs from a queue.
     
-    # Start background task using asyncio to ensure proper isolation
-    asyncio.create_task(process_brand_research(brand_name))
+    Each request gets its own job record (job ID, progress, per-source status
+    and result). At most ``max_concurrent`` jobs run at once; up to
+    ``max_queued`` more wait in the queue and anything beyond that is rejected.
     
-    # Return immediately with processing status
-    return {
-        "status": "processing",
-        "brand_name": brand_name,
-        "progress": "Initializing brand research...",
-        "timestamp": datetime.now().isoformat()
-    }
-
-@app.get("/research-status")
-async def get_research_status():
-    """
-    Get the current status of brand research
+    A request for a brand and depth that is already queued or running joins
+    that job instead of starting another (single flight), and one whose result
+    is still in ``cache`` is answered with a completed job right away.
+    
+    With a ``store`` every job is checkpointed, including the result of each
+    finished step. ``restore`` reloads the checkpoints on startup: finished jobs
+    come back as history, and unfinished ones are queued again and resume from
+    their first incomplete step.
+    
+    Every job has an event log (``events``) that /research-stream replays and
+    follows; a restored job's log starts with the steps it had finished.
     """
-    print(f"📊 Status check - is_processing: {global_status['is_processing']}, progress: {global_status['progress']}")
     
-    if global_status["is_processing"]:
+    def __init__(self, max_concurrent: int, max_queued: int, history_limit: int, cache: ResearchCache,
+                 store: Optional[JobStore] = None):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.history_limit = history_limit
+        self.cache = cache
+        self.store = store
+        # Restored jobs waiting for the queue to exist
+        self.resumable: List[str] = []
+        self.jobs: Dict[str, Dict] = {}
+        self.latest_job_id: Optional[str] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers = []
+        # Cache key -> ID of the queued or running job for it
+        self.inflight: Dict[str, str] = {}
+        self.coalesced = 0
+        self.events: Dict[str, JobEvents] = {}
+    
+    def ensure_workers(self):
+        """Start the worker pool on the running event loop (once)."""
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+            for job_id in self.resumable:
+                self.queue.put_nowait(job_id)
+            self.resumable = []
+        if not self.workers:
+            self.workers = [
+                asyncio.create_task(self.worker(worker_id))
+                for worker_id in range(self.max_concurrent)
+            ]
+            print(f"👷 Started {self.max_concurrent} research workers")
+    
+    def count(self, status: str) -> int:
+        return sum(1 for job in self.jobs.values() if job["status"] == status)
+    
+    def submit(self, brand_name: str, depth: str = "deep", refresh: bool = False) -> Dict:
+        """Join the in-flight job for this brand and depth, answer from the cache, or queue a new job."""
+        self.ensure_workers()
+        key = self.cache.key(brand_name, depth)
+        inflight = self.jobs.get(self.inflight.get(key))
+        if inflight is not None and inflight["status"] in ("queued", "processing"):
+            self.coalesced += 1
+            inflight["requests"] += 1
+            self.latest_job_id = inflight["job_id"]
+            print(f"🔗 Joined in-flight research job {inflight['job_id']} for {brand_name}")
+            return inflight
+        
+        entry = None if refresh else self.cache.get(key)
+        if entry is None and self.count("queued") >= self.max_queued:
+            raise QueueFullError(f"Research queue is full ({self.max_queued} jobs waiting)")
+        
+        job = self.new_job(brand_name, depth)
+        self.latest_job_id = job["job_id"]
+        if entry is not None:
+            print(f"📦 Serving cached research for {brand_name} (from job {entry['job_id']})")
+            job.update({
+                "status": "completed",
+                "progress": "Served from the research cache",
+                "result": entry["response"].model_copy(update={"job_id": job["job_id"], "cached": True}),
+                "cached_from": entry["job_id"],
+                "started_at": job["created_at"],
+                "finished_at": job["created_at"]
+            })
+        else:
+            self.inflight[key] = job["job_id"]
+            self.queue.put_nowait(job["job_id"])
+        self.checkpoint(job)
+        self.open_events(job)
+        self.prune()
+        return job
+    
+    def new_job(self, brand_name: str, depth: str) -> Dict:
+        now = datetime.now().isoformat()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "brand_name": brand_name,
+            "depth": depth,
+            "status": "queued",
+            "is_processing": False,
+            "progress": "Queued for research...",
+            "result": None,
+            "error_message": None,
+            "sources": {},
+            "results": {},
+            "requests": 1,
+            "cached_from": None,
+            "follow_up_of": None,
+            "follow_up_job_id": None,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "timestamp": now
+        }
+        self.jobs[job["job_id"]] = job
+        return job
+    
+    def checkpoint(self, job: Dict):
+        if self.store is None:
+            return
+        try:
+            self.store.save({**job, "result": job["result"].model_dump() if job["result"] else None})
+        except Exception as e:
+            print(f"❌ Checkpoint of job {job['job_id']} failed: {e}")
+    
+    def open_events(self, job: Dict):
+        """Start the job's event log with the steps it has finished and its current state."""
+        events = self.events[job["job_id"]] = JobEvents()
+        for key in job["results"]:
+            events.publish("step_finished", step_event(job, key))
+        publish_job_state(job, events)
+    
+    def restore(self):
+        """Reload checkpointed jobs: history for finished ones, a place in the queue for the rest."""
+        if self.store is None:
+            return
+        resumed = 0
+        for record in self.store.load():
+            job = {**record, "result": OrchestratorResponse(**record["result"]) if record.get("result") else None}
+            self.jobs[job["job_id"]] = job
+            self.latest_job_id = job["job_id"]
+            if job["status"] in ("queued", "processing"):
+                job.update({"status": "queued", "is_processing": False, "progress": "Queued to resume after a restart..."})
+                self.inflight[self.cache.key(job["brand_name"], job["depth"])] = job["job_id"]
+                self.resumable.append(job["job_id"])
+                resumed += 1
+            elif job["status"] == "completed" and not job["cached_from"] and all_steps_completed(job):
+                finished = datetime.fromisoformat(job["finished_at"]).timestamp()
+                self.cache.put(self.cache.key(job["brand_name"], job["depth"]), job["result"], job["job_id"], finished)
+            self.open_events(job)
+        if self.jobs:
+            print(f"♻️ Restored {len(self.jobs)} research jobs ({resumed} to resume)")
+    
+    def finish(self, job: Dict):
+        """Release the job's single-flight slot and cache its result if every step succeeded."""
+        key = self.cache.key(job["brand_name"], job["depth"])
+        if self.inflight.get(key) == job["job_id"]:
+            del self.inflight[key]
+        if job["status"] == "completed" and all_steps_completed(job):
+            self.cache.put(key, job["result"], job["job_id"])
+        if job["status"] == "completed" and job["depth"] == "fast" and FAST_FOLLOW_UP:
+            self.follow_up(job)
+    
+    def follow_up(self, job: Dict):
+        """Queue deep research after a finished fast job.
+        
+        The follow-up starts from the fast job's results, so only the web research
+        is redone; the late-source KG write then stores the deep web result and the
+        metrics are refreshed if it changed anything. Nothing is queued while a
+        deep result for the brand is still cached or already being researched.
+        """
+        key = self.cache.key(job["brand_name"], "deep")
+        inflight = self.jobs.get(self.inflight.get(key))
+        if self.cache.fresh(key) or (inflight is not None and inflight["status"] in ("queued", "processing")):
+            return
+        if self.count("queued") >= self.max_queued:
+            print(f"⚠️ Research queue is full; no deep follow-up for fast job {job['job_id']}")
+            return
+        
+        follow_up = self.new_job(job["brand_name"], "deep")
+        follow_up["follow_up_of"] = job["job_id"]
+        follow_up["progress"] = "Queued for deep web research..."
+        follow_up["results"] = {
+            step: result for step, result in job["results"].items()
+            if step not in ("web_search", "kg_refresh", "metrics_refresh")
+        }
+        # Carry over the latest metrics (refreshed ones if the fast job refreshed them)
+        follow_up["results"]["metrics"] = job["result"].metrics_result
+        follow_up["steps"] = {step: dict(job["steps"][step]) for step in follow_up["results"]}
+        follow_up["steps"]["kg_write"]["inputs"] = list(job["result"].metrics_sources)
+        
+        self.inflight[key] = follow_up["job_id"]
+        self.queue.put_nowait(follow_up["job_id"])
+        self.checkpoint(follow_up)
+        self.open_events(follow_up)
+        job["follow_up_job_id"] = follow_up["job_id"]
+        job["result"] = job["result"].model_copy(update={"follow_up_job_id": follow_up["job_id"]})
+        print(f"🔭 Queued deep follow-up {follow_up['job_id']} for fast job {job['job_id']} ({job['brand_name']})")
+    
+    async def worker(self, worker_id: int):
+        while True:
+            job_id = await self.queue.get()
+            job = self.jobs.get(job_id)
+            try:
+                if job is not None:
+                    print(f"👷 Worker {worker_id} picked up job {job_id} ({job['brand_name']})")
+                    await process_brand_research(job, self.checkpoint, self.events.get(job_id))
+            except Exception as e:
+                print(f"❌ Worker {worker_id} failed on job {job_id}: {e}")
+            finally:
+                if job is not None:
+                    try:
+                        self.finish(job)
+                    except Exception as e:
+                        print(f"❌ Worker {worker_id} could not finish job {job_id}: {e}")
+                    self.checkpoint(job)
+                    publish_job_state(job, self.events[job_id])
+                self.queue.task_done()
+    
+    async def wait(self, job: Dict):
+        """Wait until the job has finished (its event log is closed by the result or error)."""
+        events = self.events[job["job_id"]]
+        async for _ in events.subscribe(len(events.events), STREAM_KEEPALIVE):
+            pass
+    
+    def queue_position(self, job_id: str) -> Optional[int]:
+        queued = [jid for jid, job in self.jobs.items() if job["status"] == "queued"]
+        return queued.index(job_id) + 1 if job_id in queued else None
+    
+    def prune(self):
+        """Drop the oldest finished jobs once the history limit is exceeded."""
+        finished = [jid for jid, job in self.jobs.items() if job["status"] in ("completed", "error")]
+        for job_id in finished[:max(0, len(self.jobs) - self.history_limit)]:
+            del self.jobs[job_id]
+            self.events.pop(job_id, None)
+            if self.store is not None:
+                self.store.delete(job_id)
+    
+    def stats(self) -> Dict:
         return {
-            "status": "processing",
-            "brand_name": global_status["brand_name"],
-            "progress": global_status["progress"],
-            "timestamp": global_status["timestamp"]
+            "max_concurrent_jobs": self.max_concurrent,
+            "max_queued_jobs": self.max_queued,
+            "queued": self.count("queued"),
+            "processing": self.count("processing"),
+            "completed": self.count("completed"),
+            "error": self.count("error"),
+            "coalesced_requests": self.coalesced,
+            "cache": self.cache.stats()
         }
-    elif global_status["result"]:
-        print(f"✅ Returning completed results for {global_status['brand_name']}")
-        return global_status["result"]
-    elif global_status["error_message"]:
+
+# Initialize the research job scheduler, its result cache and job checkpoints
+research_cache = ResearchCache(RESEARCH_CACHE_TTL, RESEARCH_CACHE_MAX_ENTRIES, RESEARCH_CACHE_MAX_BYTES)
+job_scheduler = JobScheduler(MAX_CONCURRENT_JOBS, MAX_QUEUED_JOBS, JOB_HISTORY_LIMIT, research_cache,
+                             JobStore(JOB_DATA_DIR, JOB_FSYNC) if JOB_DATA_DIR else None)
+job_scheduler.restore()
+
+@app.on_event("startup")
+async def resume_research_jobs():
+    """Start the research workers right away so jobs restored from checkpoints resume without waiting for a request."""
+    job_scheduler.ensure_workers()
+
+def format_job_status(job: Dict):
+    """Render a job the way /research-status always has: progress while running, the full result when done."""
+    if job["status"] in ("queued", "processing"):
         return {
-            "status": "error",
-            "error_message": global_status["error_message"],
-            "timestamp": global_status["timestamp"]
+            "status": job["status"],
+            "job_id": job["job_id"],
+            "brand_name": job["brand_name"],
+            "depth": job["depth"],
+            "progress": job["progress"],
+            "queue_position": job_scheduler.queue_position(job["job_id"]),
+            "sources": job["sources"],
+            "retry_budget": job.get("retry_budget"),
+            # Early metrics are available as soon as the quorum of sources has been analysed
+            "metrics_result": job["results"].get("metrics"),
+            "metrics_sources": metrics_sources(job, job["results"]) if "metrics" in job["results"] else [],
+            # The web research result as soon as it is in (a fast job's quick report)
+            "web_search_result": job["results"].get("web_search"),
+            "follow_up_of": job.get("follow_up_of"),
+            "timestamp": job["timestamp"]
         }
+    elif job["result"]:
+        return job["result"]
     else:
+        return {
+            "status": "error",
+            "job_id": job["job_id"],
+            "brand_name": job["brand_name"],
+            "error_message": job["error_message"],
+            "timestamp": job["timestamp"]
+        }
+
+@app.post("/research-brand")
+async def research_brand(request: BrandRequest):
+    """
+    Queue brand research and return immediately with the job ID
+    """
+    try:
+        job = job_scheduler.submit(request.brand_name, request.depth, request.refresh)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    print(f"📥 {request.depth} research job {job['job_id']} for {request.brand_name}: {job['status']}")
+    return format_job_status(job)
+
+@app.get("/research-status")
+async def get_research_status():
+    """
+    Get the status of the most recently submitted brand research job
+    """
+    job = job_scheduler.jobs.get(job_scheduler.latest_job_id) if job_scheduler.latest_job_id else None
+    if job is None:
         return {
             "status": "ready",
             "message": "No research in progress",
             "timestamp": datetime.now().isoformat()
         }
+    
+    print(f"📊 Status check - job {job['job_id']}: {job['status']}, progress: {job['progress']}")
+    return format_job_status(job)
+
+@app.get("/research-status/{job_id}")
+async def get_research_job_status(job_id: str):
+    """
+    Get the status (or full result) of a specific brand research job
+    """
+    job = job_scheduler.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown research job: {job_id}")
+    return format_job_status(job)
+
+@app.get("/research-stream/{job_id}")
+async def stream_research_job(job_id: str, request: Request):
+    """
+    Stream a research job's progress as Server-Sent Events: state changes, each step's
+    start and finish (with source, KG write, metrics and bounty results as they land)
+    and finally the full result or error. Past events are replayed first; reconnecting
+    clients resume after their Last-Event-ID.
+    """
+    events = job_scheduler.events.get(job_id)
+    if events is None:
+        raise HTTPException(status_code=404, detail=f"Unknown research job: {job_id}")
+    last_event_id = request.headers.get("last-event-id", "0")
+    after = int(last_event_id) if last_event_id.isdigit() else 0
+    
+    async def stream():
+        async for event in events.subscribe(after, STREAM_KEEPALIVE):
+            yield format_sse(event)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/research-jobs")
+async def list_research_jobs(status: str = None):
+    """
+    List research jobs (without their full results) plus scheduler statistics
+    """
+    jobs = [
+        {
+            "job_id": job["job_id"],
+            "brand_name": job["brand_name"],
+            "depth": job["depth"],
+            "status": job["status"],
+            "progress": job["progress"],
+            "queue_position": job_scheduler.queue_position(job["job_id"]),
+            "requests": job["requests"],
+            "cached_from": job["cached_from"],
+            "follow_up_of": job.get("follow_up_of"),
+            "follow_up_job_id": job.get("follow_up_job_id"),
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+            "error_message": job["error_message"]
+        }
+        for job in job_scheduler.jobs.values()
+        if status is None or job["status"] == status
+    ]
+    return {"jobs": jobs, "scheduler": job_scheduler.stats(), "timestamp": datetime.now().isoformat()}
+
+@app.get("/upstreams")
+async def upstream_status():
+    """
+    Circuit breaker state and retry counts per agent host, plus the global retry rate limiter
+    """
+    return {
+        "breakers": {name: breaker.stats() for name, breaker in circuit_breakers.items()},
+        "retry_limiter": retry_limiter.stats(),
+        "job_retry_budget": JOB_RETRY_BUDGET,
+        "timestamp": datetime.now().isoformat()
+    }
 
 @app.post("/research-brand-sync", response_model=OrchestratorResponse)
 async def research_brand_sync(request: BrandRequest):
     """
-    Original synchronous endpoint for backward compatibility
+    Original synchronous endpoint for backward compatibility: runs the research as a
+    scheduled job (sharing the cache and any in-flight job for the same brand) and waits for it
     """
-    brand_name = request.brand_name
+    try:
+        job = job_scheduler.submit(request.brand_name, request.depth, request.refresh)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     
+    print(f"⏳ Waiting for {request.depth} research job {job['job_id']} for {request.brand_name} ({job['status']})")
+    await job_scheduler.wait(job)
+    if job["status"] != "completed":
+        raise HTTPException(status_code=502, detail=f"Pipeline error: {job['error_message']}")
+    return job["result"]
+
+def parse_time_param(name: str, value: Optional[str]) -> Optional[float]:
+    """Turn an ISO 8601 query parameter into epoch seconds."""
+    if value is None:
+        return None
     try:
-        print(f"Starting brand analysis for: {brand_name}")
-        
-        async with httpx.AsyncClient(timeout=None) as client:
-            
-            # === 1. WEB SEARCH AGENT ===
-            print(f"\n🔍 Step 1: Calling Web Search Agent for {brand_name}...")
-            web_search_response = await client.post(
-                "https://websearchagent-739298578243.us-central1.run.app/research/brand",
-                json={"brand_name": brand_name}
-            )
-            web_search_response.raise_for_status()
-            web_search_data = web_search_response.json()
-            
-            # Check if we got the final result immediately
-            if web_search_data.get("success") and "research_result" in web_search_data:
-                web_search_result = web_search_data["research_result"]
-            else:
-                # The agent is still processing, we need to poll for results
-                print(f"Web search agent is processing... Status: {web_search_data.get('status', 'unknown')}")
-                
-                # Poll for results indefinitely until we get a result
-                poll_interval = 4
-                attempt = 0
-                
-                while True:
-                    attempt += 1
-                    print(f"Web search polling attempt {attempt}")
-                    await asyncio.sleep(poll_interval)
-                    
-                    # Make another request to check status
-                    poll_response = await client.post(
-                        "https://websearchagent-739298578243.us-central1.run.app/research/brand",
-                        json={"brand_name": brand_name}
-                    )
-                    poll_response.raise_for_status()
-                    poll_data = poll_response.json()
-                    
-                    # Check if research is complete
-                    if poll_data.get("success") and "research_result" in poll_data:
-                        web_search_result = poll_data["research_result"]
-                        print(f"✅ Web search completed after {attempt} polling attempts!")
-                        break
-                    elif poll_data.get("status") == "error":
-                        raise HTTPException(status_code=500, detail="Web search agent encountered an error")
-                    else:
-                        print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-            
-            # Print the web search result
-            print(f"\n=== WEB SEARCH RESULT FOR {brand_name.upper()} ===")
-            print(web_search_result)
-            print("=" * 50)
-            
-            # === 2. NEGATIVE REVIEWS AGENT ===
-            print(f"\n👎 Step 2: Calling Negative Reviews Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Negative reviews attempt {attempt}")
-                    negative_reviews_response = await client.post(
-                        "https://negativereviewsagent-739298578243.us-central1.run.app/reviews/negative",
-                        json={"brand_name": brand_name}
-                    )
-                    negative_reviews_response.raise_for_status()
-                    negative_reviews_data = negative_reviews_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if negative_reviews_data.get("success") and "reviews_result" in negative_reviews_data:
-                        # Check if the result contains an error message
-                        if "error" in negative_reviews_data["reviews_result"].lower() or "500" in negative_reviews_data["reviews_result"]:
-                            print(f"❌ Negative reviews returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        negative_reviews_result = negative_reviews_data["reviews_result"]
-                        print(f"✅ Negative reviews completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Negative reviews agent is processing... Status: {negative_reviews_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Negative reviews polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://negativereviewsagent-739298578243.us-central1.run.app/reviews/negative",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "reviews_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["reviews_result"].lower() or "500" in poll_data["reviews_result"]:
-                                    print(f"❌ Negative reviews polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                negative_reviews_result = poll_data["reviews_result"]
-                                print(f"✅ Negative reviews completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Negative reviews agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'negative_reviews_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Negative reviews request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the negative reviews result
-            print(f"\n=== NEGATIVE REVIEWS RESULT FOR {brand_name.upper()} ===")
-            print(negative_reviews_result)
-            print("=" * 50)
-            
-            # === 3. POSITIVE REVIEWS AGENT ===
-            print(f"\n👍 Step 3: Calling Positive Reviews Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Positive reviews attempt {attempt}")
-                    positive_reviews_response = await client.post(
-                        "https://positivereviewsagent-739298578243.us-central1.run.app/reviews/positive",
-                        json={"brand_name": brand_name}
-                    )
-                    positive_reviews_response.raise_for_status()
-                    positive_reviews_data = positive_reviews_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if positive_reviews_data.get("success") and "reviews_result" in positive_reviews_data:
-                        # Check if the result contains an error message
-                        if "error" in positive_reviews_data["reviews_result"].lower() or "500" in positive_reviews_data["reviews_result"]:
-                            print(f"❌ Positive reviews returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        positive_reviews_result = positive_reviews_data["reviews_result"]
-                        print(f"✅ Positive reviews completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Positive reviews agent is processing... Status: {positive_reviews_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Positive reviews polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://positivereviewsagent-739298578243.us-central1.run.app/reviews/positive",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "reviews_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["reviews_result"].lower() or "500" in poll_data["reviews_result"]:
-                                    print(f"❌ Positive reviews polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                positive_reviews_result = poll_data["reviews_result"]
-                                print(f"✅ Positive reviews completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Positive reviews agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'positive_reviews_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Positive reviews request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the positive reviews result
-            print(f"\n=== POSITIVE REVIEWS RESULT FOR {brand_name.upper()} ===")
-            print(positive_reviews_result)
-            print("=" * 50)
-            
-            # === 4. NEGATIVE REDDIT AGENT ===
-            print(f"\n📱👎 Step 4: Calling Negative Reddit Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Negative reddit attempt {attempt}")
-                    negative_reddit_response = await client.post(
-                        "https://redditnegativeagent-739298578243.us-central1.run.app/reddit/negative",
-                        json={"product_name": brand_name}
-                    )
-                    negative_reddit_response.raise_for_status()
-                    negative_reddit_data = negative_reddit_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if negative_reddit_data.get("success") and "reddit_result" in negative_reddit_data:
-                        # Check if the result contains an error message
-                        if "error" in negative_reddit_data["reddit_result"].lower() or "500" in negative_reddit_data["reddit_result"]:
-                            print(f"❌ Negative reddit returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        negative_reddit_result = negative_reddit_data["reddit_result"]
-                        print(f"✅ Negative reddit completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Negative reddit agent is processing... Status: {negative_reddit_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Negative reddit polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://redditnegativeagent-739298578243.us-central1.run.app/reddit/negative",
-                                json={"product_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "reddit_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["reddit_result"].lower() or "500" in poll_data["reddit_result"]:
-                                    print(f"❌ Negative reddit polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                negative_reddit_result = poll_data["reddit_result"]
-                                print(f"✅ Negative reddit completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Negative reddit agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'negative_reddit_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Negative reddit request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the negative reddit result
-            print(f"\n=== NEGATIVE REDDIT RESULT FOR {brand_name.upper()} ===")
-            print(negative_reddit_result)
-            print("=" * 50)
-            
-            # === 5. POSITIVE REDDIT AGENT ===
-            print(f"\n📱👍 Step 5: Calling Positive Reddit Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Positive reddit attempt {attempt}")
-                    positive_reddit_response = await client.post(
-                        "https://redditpositiveagent-739298578243.us-central1.run.app/reddit/positive",
-                        json={"product_name": brand_name}
-                    )
-                    positive_reddit_response.raise_for_status()
-                    positive_reddit_data = positive_reddit_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if positive_reddit_data.get("success") and "reddit_result" in positive_reddit_data:
-                        # Check if the result contains an error message
-                        if "error" in positive_reddit_data["reddit_result"].lower() or "500" in positive_reddit_data["reddit_result"]:
-                            print(f"❌ Positive reddit returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        positive_reddit_result = positive_reddit_data["reddit_result"]
-                        print(f"✅ Positive reddit completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Positive reddit agent is processing... Status: {positive_reddit_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Positive reddit polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://redditpositiveagent-739298578243.us-central1.run.app/reddit/positive",
-                                json={"product_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "reddit_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["reddit_result"].lower() or "500" in poll_data["reddit_result"]:
-                                    print(f"❌ Positive reddit polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                positive_reddit_result = poll_data["reddit_result"]
-                                print(f"✅ Positive reddit completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Positive reddit agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'positive_reddit_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Positive reddit request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the positive reddit result
-            print(f"\n=== POSITIVE REDDIT RESULT FOR {brand_name.upper()} ===")
-            print(positive_reddit_result)
-            print("=" * 50)
-            
-            # === 6. NEGATIVE SOCIAL AGENT ===
-            print(f"\n📱👎 Step 6: Calling Negative Social Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Negative social attempt {attempt}")
-                    negative_social_response = await client.post(
-                        "https://negativesocialsagent-739298578243.us-central1.run.app/social/negative",
-                        json={"brand_name": brand_name}
-                    )
-                    negative_social_response.raise_for_status()
-                    negative_social_data = negative_social_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if negative_social_data.get("success") and "social_media_result" in negative_social_data:
-                        # Check if the result contains an error message
-                        if "error" in negative_social_data["social_media_result"].lower() or "500" in negative_social_data["social_media_result"]:
-                            print(f"❌ Negative social returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        negative_social_result = negative_social_data["social_media_result"]
-                        print(f"✅ Negative social completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Negative social agent is processing... Status: {negative_social_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Negative social polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://negativesocialsagent-739298578243.us-central1.run.app/social/negative",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "social_media_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["social_media_result"].lower() or "500" in poll_data["social_media_result"]:
-                                    print(f"❌ Negative social polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                negative_social_result = poll_data["social_media_result"]
-                                print(f"✅ Negative social completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Negative social agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'negative_social_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Negative social request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the negative social result
-            print(f"\n=== NEGATIVE SOCIAL RESULT FOR {brand_name.upper()} ===")
-            print(negative_social_result)
-            print("=" * 50)
-            
-            # === 7. POSITIVE SOCIAL AGENT ===
-            print(f"\n📱👍 Step 7: Calling Positive Social Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Positive social attempt {attempt}")
-                    positive_social_response = await client.post(
-                        "https://positivesocialsagent-739298578243.us-central1.run.app/social/positive",
-                        json={"brand_name": brand_name}
-                    )
-                    positive_social_response.raise_for_status()
-                    positive_social_data = positive_social_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if positive_social_data.get("success") and "social_media_result" in positive_social_data:
-                        # Check if the result contains an error message
-                        if "error" in positive_social_data["social_media_result"].lower() or "500" in positive_social_data["social_media_result"]:
-                            print(f"❌ Positive social returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        positive_social_result = positive_social_data["social_media_result"]
-                        print(f"✅ Positive social completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Positive social agent is processing... Status: {positive_social_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Positive social polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://positivesocialsagent-739298578243.us-central1.run.app/social/positive",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "social_media_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["social_media_result"].lower() or "500" in poll_data["social_media_result"]:
-                                    print(f"❌ Positive social polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                positive_social_result = poll_data["social_media_result"]
-                                print(f"✅ Positive social completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Positive social agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'positive_social_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Positive social request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the positive social result
-            print(f"\n=== POSITIVE SOCIAL RESULT FOR {brand_name.upper()} ===")
-            print(positive_social_result)
-            print("=" * 50)
-            
-            print(f"\n🎉 ALL ANALYSIS COMPLETE FOR {brand_name.upper()}!")
-            
-            # === STORE RESULTS IN KNOWLEDGE GRAPH ===
-            print(f"\n🗄️ Storing results in Knowledge Graph for {brand_name}...")
-            try:
-                brand_data = {
-                    "web_results": web_search_result,
-                    "positive_reddit": positive_reddit_result,
-                    "negative_reddit": negative_reddit_result,
-                    "positive_reviews": positive_reviews_result,
-                    "negative_reviews": negative_reviews_result,
-                    "positive_social": positive_social_result,
-                    "negative_social": negative_social_result
-                }
-                
-                kg_result = kg_service.add_brand_data(brand_name, brand_data)
-                print(f"✅ Knowledge Graph storage successful: {kg_result}")
-                kg_storage_status = "Successfully stored in Knowledge Graph"
-                
-            except Exception as e:
-                print(f"❌ Knowledge Graph storage failed: {e}")
-                kg_storage_status = f"Knowledge Graph storage failed: {str(e)}"
-            
-            # === 8. METRICS AGENT ===
-            print(f"\n📊 Step 8: Calling Metrics Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Metrics agent attempt {attempt}")
-                    metrics_response = await client.post(
-                        "https://metricsagent-739298578243.us-central1.run.app/brand/metrics",
-                        json={"brand_name": brand_name}
-                    )
-                    metrics_response.raise_for_status()
-                    metrics_data = metrics_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if metrics_data.get("success") and "metrics" in metrics_data:
-                        # Check if the result contains an error message
-                        if "error" in str(metrics_data).lower() or "500" in str(metrics_data):
-                            print(f"❌ Metrics agent returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        metrics_result = str(metrics_data)
-                        print(f"✅ Metrics agent completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Metrics agent is processing... Status: {metrics_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Metrics agent polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://metricsagent-739298578243.us-central1.run.app/brand/metrics",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "metrics" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in str(poll_data).lower() or "500" in str(poll_data):
-                                    print(f"❌ Metrics agent polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                metrics_result = str(poll_data)
-                                print(f"✅ Metrics agent completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Metrics agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'metrics_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Metrics agent request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the metrics result
-            print(f"\n=== METRICS RESULT FOR {brand_name.upper()} ===")
-            print(metrics_result)
-            print("=" * 50)
-            
-            # === 9. BOUNTY AGENT (with 1 minute delay) ===
-            print(f"\n🎯 Step 9: Waiting 1 minute before calling Bounty Agent for {brand_name}...")
-            print("⏰ Waiting 2.5 minutes...")
-            await asyncio.sleep(150)  # Wait for 1 minute
-            
-            print(f"\n🎯 Calling Bounty Agent for {brand_name}...")
-            
-            # Simple retry logic: get bounty data or retry (max 50 attempts)
-            attempt = 0
-            max_attempts = 50
-            bounty_result = None
-            
-            while attempt < max_attempts and bounty_result is None:
-                attempt += 1
-                try:
-                    print(f"Bounty agent attempt {attempt}/{max_attempts}")
-                    bounty_response = await client.get(
-                        "https://bountyagent-739298578243.us-central1.run.app/bounties/auto-generated"
-                    )
-                    bounty_response.raise_for_status()
-                    bounty_data = bounty_response.json()
-                    
-                    # Simple check: if we have success and auto_generated_bounties, use it
-                    if bounty_data.get("success") and bounty_data.get("auto_generated_bounties"):
-                        bounty_result = str(bounty_data)
-                        print(f"✅ Bounty agent completed successfully after {attempt} attempts!")
-                        print(f"📊 Bounty data received: {len(bounty_result)} characters")
-                        break
-                    else:
-                        print(f"❌ Bounty agent not ready yet, retrying in 4 seconds...")
-                        await asyncio.sleep(4)
-                        
-                except Exception as e:
-                    print(f"❌ Bounty agent request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-            
-            # If we still don't have bounty data after max attempts, use empty result
-            if bounty_result is None:
-                print(f"❌ Bounty agent failed after {max_attempts} attempts, using empty result")
-                bounty_result = '{"success": false, "error": "Max attempts exceeded", "auto_generated_bounties": {}}'
-            
-            # Print the bounty result
-            print(f"\n=== BOUNTY RESULT FOR {brand_name.upper()} ===")
-            print(bounty_result)
-            print("=" * 50)
-            
-            print(f"\n🎉 ALL STEPS COMPLETED! Preparing final response...")
-            print(f"📊 Response will include:")
-            print(f"   - Web Search: {len(web_search_result)} chars")
-            print(f"   - Negative Reviews: {len(negative_reviews_result)} chars") 
-            print(f"   - Positive Reviews: {len(positive_reviews_result)} chars")
-            print(f"   - Negative Reddit: {len(negative_reddit_result)} chars")
-            print(f"   - Positive Reddit: {len(positive_reddit_result)} chars")
-            print(f"   - Negative Social: {len(negative_social_result)} chars")
-            print(f"   - Positive Social: {len(positive_social_result)} chars")
-            print(f"   - Metrics: {len(metrics_result)} chars")
-            print(f"   - Bounties: {len(bounty_result)} chars")
-            
-            print(f"\n🚀 Creating OrchestratorResponse object...")
-            try:
-                response = OrchestratorResponse(
-                brand_name=brand_name,
-                web_search_result=web_search_result,
-                negative_reviews_result=negative_reviews_result,
-                positive_reviews_result=positive_reviews_result,
-                negative_reddit_result=negative_reddit_result,
-                positive_reddit_result=positive_reddit_result,
-                negative_social_result=negative_social_result,
-                positive_social_result=positive_social_result,
-                    metrics_result=metrics_result,
-                    bounty_result=bounty_result,
-                timestamp=datetime.now().isoformat(),
-                kg_storage_status=kg_storage_status
-            )
-                print(f"✅ OrchestratorResponse created successfully!")
-                print(f"📤 Returning response to client...")
-                return response
-            except Exception as e:
-                print(f"❌ Error creating OrchestratorResponse: {e}")
-                raise HTTPException(status_code=500, detail=f"Error creating response: {str(e)}")
-        
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail=f"Agent error: {e.response.text}")
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=500, detail=f"Request error: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected an ISO 8601 timestamp")
+
+def make_etag(*parts) -> str:
+    return '"' + hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:20] + '"'
 
-# Knowledge Graph Query Endpoints
+def is_not_modified(request: Request, etag: str) -> bool:
+    """True when the client's If-None-Match already names this ETag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in tags or "*" in tags
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def set_etag(response: Response, etag: str):
+    # no-cache: clients may keep the body but must revalidate it with If-None-Match
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+# Knowledge Graph Query Endpoints. Data is the latest version unless `version` (as of that
+# version) or `since`/`until` (ISO 8601, every retained value in the window) are given.
+# `itemized=true` returns one line per parsed review / post / comment instead of whole agent results.
+# Responses carry an ETag derived from the brand's KG version and honour If-None-Match.
 @app.get("/kg/query_brand_data")
-async def query_brand_data(brand_name: str, data_type: str = None, sentiment: str = None):
+async def query_brand_data(request: Request, response: Response, brand_name: str, data_type: str = None,
+                           sentiment: str = None, version: int = None, since: str = None, until: str = None,
+                           itemized: bool = False):
     """Query brand data from the knowledge graph."""
+    since_ts, until_ts = parse_time_param("since", since), parse_time_param("until", until)
+    etag = make_etag("query", brand_key(brand_name), await kg_worker.call("get_brand_tag", brand_name), data_type, sentiment, version, since, until, itemized)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
     try:
-        results = kg_service.query_brand_data(brand_name, data_type, sentiment)
+        results = await kg_worker.call("query_brand_data", brand_name, data_type, sentiment, version, since_ts, until_ts, itemized)
+        set_etag(response, etag)
         return {"results": results, "status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/kg/get_brand_summary")
-async def get_brand_summary(brand_name: str):
+async def get_brand_summary(request: Request, response: Response, brand_name: str, version: int = None,
+                            since: str = None, until: str = None, itemized: bool = False):
     """Get comprehensive brand summary from knowledge graph."""
+    since_ts, until_ts = parse_time_param("since", since), parse_time_param("until", until)
+    etag = make_etag("summary", brand_key(brand_name), await kg_worker.call("get_brand_tag", brand_name), version, since, until, itemized)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
     try:
-        summary = kg_service.get_brand_summary(brand_name)
+        summary = await kg_worker.call("get_brand_summary", brand_name, version, since_ts, until_ts, itemized)
+        set_etag(response, etag)
         return {"summary": summary, "status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/kg/get_brand_items")
+async def get_brand_items(request: Request, response: Response, brand_name: str, data_type: str = None,
+                          sentiment: str = None, offset: int = 0, limit: int = 50, sample: int = None):
+    """Page (or evenly sample) the item records parsed from a brand's latest data, with per-field counts."""
+    if offset < 0 or not 0 < limit <= KG_ITEMS_MAX_LIMIT or (sample is not None and not 0 < sample <= KG_ITEMS_MAX_LIMIT):
+        raise HTTPException(status_code=400, detail=f"offset must be >= 0 and limit / sample between 1 and {KG_ITEMS_MAX_LIMIT}")
+    etag = make_etag("items", brand_key(brand_name), await kg_worker.call("get_brand_tag", brand_name), data_type, sentiment, offset, limit, sample)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    try:
+        items = await kg_worker.call("get_brand_items", brand_name, data_type, sentiment, offset, limit, sample)
+        set_etag(response, etag)
+        return {**items, "offset": offset, "limit": limit, "status": "success"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/kg/get_brand_digest")
+async def get_brand_digest(request: Request, response: Response, brand_name: str):
+    """The brand's digest, computed at ingestion: per-source stats, themes and representative items plus a prompt-ready text."""
+    etag = make_etag("digest", brand_key(brand_name), await kg_worker.call("get_brand_tag", brand_name))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    try:
+        digest = await kg_worker.call("get_brand_digest", brand_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if digest is None:
+        raise HTTPException(status_code=404, detail=f"Brand not found: {brand_name}")
+    set_etag(response, etag)
+    return {"digest": digest, "status": "success"}
+
+@app.get("/kg/search")
+async def kg_search(q: str, brand: List[str] = Query(None), source: List[str] = Query(None),
+                    sentiment: List[str] = Query(None), match: Literal["all", "any"] = "all",
+                    offset: int = 0, limit: int = 20):
+    """Full-text search over the items of every brand's latest data, ranked by relevance.
+    
+    brand / source (data type) / sentiment may each be repeated to allow several values.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q must not be empty")
+    if offset < 0 or not 0 < limit <= KG_SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"offset must be >= 0 and limit between 1 and {KG_SEARCH_MAX_LIMIT}")
+    unknown = [data_type for data_type in source or [] if data_type not in ATOM_RELATIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown source {unknown}: expected one of {list(ATOM_RELATIONS)}")
+    try:
+        found = await kg_worker.call("search", q, brand, source, sentiment, offset, limit, match == "all")
+        return {**found, "offset": offset, "limit": limit, "status": "success"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/kg/retrieve")
+async def kg_retrieve(request: KGRetrieveRequest):
+    """The brand's items most relevant to a prompt's task, best first, within k items and a token budget."""
+    if not 0 < request.k <= KG_RETRIEVE_MAX_K or request.token_budget <= 0:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {KG_RETRIEVE_MAX_K} and token_budget positive")
+    try:
+        retrieved = await kg_worker.call("retrieve", request.brand_name, request.query, request.k, request.token_budget,
+                                         request.data_types, request.sentiments)
+        return {**retrieved, "status": "success"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/kg/batch")
+async def kg_batch(request: KGBatchRequest):
+    """Fetch data for many brands (optionally projected onto some data types / sentiments) in one call."""
+    if len(request.brands) > KG_BATCH_MAX_BRANDS:
+        raise HTTPException(status_code=400, detail=f"Too many brands in one batch (max {KG_BATCH_MAX_BRANDS})")
+    try:
+        results, missing = await kg_worker.call("get_brands_batch", request.brands, request.data_types, request.sentiments)
+        response = {"results": results, "missing": missing, "status": "success"}
+        if request.include_all_brands:
+            response["all_brands"] = await kg_worker.call("get_all_brands")
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/kg/get_brand_versions")
+async def get_brand_versions(brand_name: str):
+    """List the versioned ingestion runs recorded for a brand."""
+    try:
+        versions = await kg_worker.call("get_brand_versions", brand_name)
+        return {"brand_name": brand_name, "versions": versions, "status": "success"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/kg/get_all_brands")
-async def get_all_brands():
+async def get_all_brands(request: Request, response: Response):
     """Get all brands in the knowledge graph."""
+    etag = make_etag("brands", await kg_worker.call("get_brands_tag"))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
     try:
-        brands = kg_service.get_all_brands()
+        brands = await kg_worker.call("get_all_brands")
+        set_etag(response, etag)
         return {"brands": brands, "status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/kg/metrics")
+async def kg_metrics():
+    """Queue depth, batching and per-operation latency of the knowledge graph worker."""
+    return {"worker": kg_worker.metrics(), "timestamp": datetime.now().isoformat()}
+
+@app.on_event("shutdown")
+async def shutdown_knowledge_graph():
+    """Drain the KG worker and write a final snapshot so the next start restores without replaying the journal."""
+    await asyncio.to_thread(kg_worker.stop)
+
 @app.get("/")
 async def root():
     return {"message": "Brand Research Orchestrator with Knowledge Graph API", "version": "1.0.0"}
@@ -1520,14 +1669,25 @@ print(f"   Local: http://localhost:8080")
 # print(f"   Public: {public_url}")
 print(f"\n📋 Available endpoints:")
 print(f"   - POST http://localhost:8080/research-brand (Start research)")
-print(f"   - GET  http://localhost:8080/research-status (Check status)")
+print(f"   - GET  http://localhost:8080/research-status (Check status of latest job)")
+print(f"   - GET  http://localhost:8080/research-status/{{job_id}} (Check status of a job)")
+print(f"   - GET  http://localhost:8080/research-stream/{{job_id}} (Stream a job's progress and results, SSE)")
+print(f"   - GET  http://localhost:8080/research-jobs (List jobs)")
+print(f"   - GET  http://localhost:8080/upstreams (Circuit breakers and retry counts)")
 print(f"   - POST http://localhost:8080/research-brand-sync (Original sync endpoint)")
 print(f"   - GET  http://localhost:8080/kg/query_brand_data")
 print(f"   - GET  http://localhost:8080/kg/get_brand_summary")
+print(f"   - GET  http://localhost:8080/kg/get_brand_versions")
+print(f"   - GET  http://localhost:8080/kg/get_brand_items")
+print(f"   - GET  http://localhost:8080/kg/get_brand_digest")
 print(f"   - GET  http://localhost:8080/kg/get_all_brands")
+print(f"   - GET  http://localhost:8080/kg/search")
+print(f"   - POST http://localhost:8080/kg/retrieve")
+print(f"   - POST http://localhost:8080/kg/batch")
+print(f"   - GET  http://localhost:8080/kg/metrics")
 print(f"   - GET  http://localhost:8080/health")
 print(f"\n🔄 How to use the simple polling mechanism:")
-print(f"   1. POST to /research-brand with {{'brand_name': 'YourBrand'}}")
+print(f"   1. POST to /research-brand with {{'brand_name': 'YourBrand'}} (add 'depth': 'fast' for a quick first report)")
 print(f"   2. Poll GET /research-status until you get the full results")
 print(f"   3. Status will be 'processing' while working, full data when done")
 # print(f"\n🔗 External agents can use the public URL to access the knowledge graph!")
@@ -0,0 +1,126 @@
+# search_index.py
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Hashable, List, Optional, Tuple
+
+TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or so that the their them they this "
+    "to was we were what when which who will with you your".split()
+)
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords, possessives folded ("tesla's" -> "tesla")."""
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        token = token.split("'")[0]
+        if len(token) > 1 and token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+class InvertedIndex:
+    """Incremental full-text index over item documents, ranked with BM25.
+    
+    Documents are grouped under a key (for the knowledge graph, one
+    ``(data_type, brand_id, sentiment)`` index key) so that a new ingestion
+    can replace all documents of a key at once. Each posting list maps a
+    document id to the term's frequency in it; a document keeps only its
+    metadata tuple and length, plus its distinct terms for removal.
+    """
+    
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_meta: Dict[int, tuple] = {}
+        self.doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self.doc_length: Dict[int, int] = {}
+        self.key_docs: Dict[Hashable, List[int]] = {}
+        self.total_length = 0
+        self.next_doc_id = 0
+    
+    def __len__(self) -> int:
+        return len(self.doc_meta)
+    
+    def replace(self, key: Hashable, documents: List[Tuple[str, tuple]]):
+        """Drop the documents indexed under ``key`` and index ``(text, meta)`` documents in their place."""
+        for doc_id in self.key_docs.pop(key, []):
+            for term in self.doc_terms.pop(doc_id):
+                postings = self.postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self.postings[term]
+            self.total_length -= self.doc_length.pop(doc_id)
+            del self.doc_meta[doc_id]
+        
+        doc_ids = []
+        for text, meta in documents:
+            counts = Counter(tokenize(text))
+            if not counts:
+                continue
+            doc_id = self.next_doc_id
+            self.next_doc_id += 1
+            for term, count in counts.items():
+                self.postings.setdefault(term, {})[doc_id] = count
+            self.doc_terms[doc_id] = tuple(counts)
+            self.doc_length[doc_id] = length = sum(counts.values())
+            self.doc_meta[doc_id] = meta
+            self.total_length += length
+            doc_ids.append(doc_id)
+        if doc_ids:
+            self.key_docs[key] = doc_ids
+    
+    def search(self, query: str, accept=None, match_all: bool = True, top: Optional[int] = None,
+               keys: Optional[List[Hashable]] = None) -> Tuple[int, List[Tuple[float, tuple]]]:
+        """Rank the documents matching ``query`` (every term, or any term) best first.
+        
+        ``keys`` limits the search to the documents indexed under those keys, and
+        ``accept(meta)`` filters candidates before they are scored. Returns the
+        number of matches and the best ``top`` (default all) ``(score, meta)`` pairs.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.doc_meta:
+            return 0, []
+        postings = [self.postings.get(term, {}) for term in terms]
+        if match_all and not all(postings):
+            return 0, []
+        matches = all if match_all else any
+        if keys is not None:
+            # Few documents per key: check them against the posting lists instead
+            candidates = {
+                doc_id for key in keys for doc_id in self.key_docs.get(key, ())
+                if matches(doc_id in term_postings for term_postings in postings)
+            }
+        elif match_all:
+            # Intersect starting from the rarest term
+            ordered = sorted(postings, key=len)
+            candidates = set(ordered[0])
+            for term_postings in ordered[1:]:
+                candidates.intersection_update(term_postings)
+        else:
+            candidates = set().union(*postings)
+        if accept is not None:
+            candidates = {doc_id for doc_id in candidates if accept(self.doc_meta[doc_id])}
+        
+        doc_count = len(self.doc_meta)
+        average_length = self.total_length / doc_count
+        idf = [math.log(1 + (doc_count - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+        ranked = []
+        for doc_id in candidates:
+            length_norm = K1 * (1 - B + B * self.doc_length[doc_id] / average_length)
+            score = 0.0
+            for term_idf, term_postings in zip(idf, postings):
+                frequency = term_postings.get(doc_id)
+                if frequency:
+                    score += term_idf * frequency * (K1 + 1) / (frequency + length_norm)
+            ranked.append((-score, doc_id))
+        # Ties keep ingestion order
+        ranked = heapq.nsmallest(top, ranked) if top is not None else sorted(ranked)
+        return len(candidates), [(round(-score, 4), self.doc_meta[doc_id]) for score, doc_id in ranked]
+    
+    def stats(self) -> Dict:
+        return {"documents": len(self.doc_meta), "terms": len(self.postings)}
@@ -0,0 +1,70 @@
+# vector_index.py
+import math
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from search_index import tokenize
+
+# Hashed feature buckets per vector (terms and adjacent-term bigrams share them)
+VECTOR_DIM = 4096
+
+@lru_cache(maxsize=65536)
+def feature_bucket(term: str) -> Tuple[int, float]:
+    """Bucket and sign of a term in the hashed vector space (crc32, so stable across processes)."""
+    digest = zlib.crc32(term.encode("utf-8"))
+    return digest % VECTOR_DIM, 1.0 if digest & 0x80000000 else -1.0
+
+def features(text: str) -> Counter:
+    tokens = tokenize(text)
+    return Counter(tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])])
+
+def embed(texts: List[str]) -> np.ndarray:
+    """Unit-length hashed term-frequency vectors (sublinear tf), one row per text."""
+    matrix = np.zeros((len(texts), VECTOR_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for term, count in features(text).items():
+            bucket, sign = feature_bucket(term)
+            matrix[row, bucket] += sign * (1.0 + math.log(count))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def embed_query(query: str, idf: Callable[[str], float]) -> np.ndarray:
+    """The query's hashed vector with each term weighted by its inverse document frequency."""
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for term, count in features(query).items():
+        bucket, sign = feature_bucket(term)
+        vector[bucket] += sign * (1.0 + math.log(count)) * idf(term)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return max(1, len(text) // 4)
+
+def select_passages(scores: np.ndarray, texts: List[str], k: int, token_budget: int) -> List[Tuple[int, float, int]]:
+    """The best-scoring passages, at most ``k`` and ``token_budget`` estimated tokens in total.
+    
+    Passages are taken best first; one that would overflow the budget is
+    skipped so that shorter ones after it can still fit. Passages sharing no
+    terms with the query are left out, unless none share any (then the
+    order is just the stored one). Returns ``(index, score, tokens)`` tuples.
+    """
+    picked = []
+    used = 0
+    order = np.argsort(-scores, kind="stable")
+    if (scores > 0).any():
+        order = order[scores[order] > 0]
+    for index in order:
+        tokens = estimate_tokens(texts[index])
+        if used + tokens > token_budget:
+            continue
+        picked.append((int(index), float(scores[index]), tokens))
+        used += tokens
+        if len(picked) == k:
+            break
+    return picked
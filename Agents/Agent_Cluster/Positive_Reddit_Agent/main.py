@@ -1,9 +1,11 @@
 import os
 import time
+import asyncio
 import json
-import requests
+import httpx
 from datetime import datetime
 from uuid import uuid4
+from typing import Optional
 from dotenv import load_dotenv
 
 from uagents import Agent, Protocol, Context, Model
@@ -40,6 +42,23 @@ class RedditPositiveResponse(Model):
     timestamp: str
     agent_address: str
 
+class RunStatusRequest(Model):
+    run_id: str
+
+class RedditPositiveRunResponse(Model):
+    success: bool
+    run_id: str
+    status: str
+    coalesced: bool = False
+    product_name: str
+    sentiment: str
+    reddit_result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
+    timestamp: str
+    agent_address: str
+
 # ASI:One API configuration
 ASI_BASE_URL = "https://api.asi1.ai/v1"
 ASI_HEADERS = {
@@ -47,11 +66,25 @@ ASI_HEADERS = {
     "Content-Type": "application/json"
 }
 
+# Async HTTP settings: pooled connections and explicit timeouts, so a slow upstream
+# call never blocks the agent's event loop or hangs forever
+ASI_TIMEOUT = httpx.Timeout(float(os.environ.get("ASI_TIMEOUT_SECONDS", "120")), connect=10.0)
+MCP_TIMEOUT = httpx.Timeout(float(os.environ.get("MCP_TIMEOUT_SECONDS", "300")), connect=10.0)
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+# Upper bound on tool calls from one ASI:One response that run at the same time
+MAX_CONCURRENT_TOOL_CALLS = int(os.environ.get("MAX_CONCURRENT_TOOL_CALLS", "4"))
+
+# REST requests always need the tool, so by default they call it directly and skip the
+# tool-selection LLM call; set DIRECT_TOOL_MODE=false to let ASI:One decide as in chat
+DIRECT_TOOL_MODE = os.environ.get("DIRECT_TOOL_MODE", "true").lower() != "false"
+
 class RedditSearchAgent:
     def __init__(self):
         self.reddit_endpoint = REDDIT_MCP_ENDPOINT
+        self.http_client = httpx.AsyncClient(limits=HTTP_LIMITS)
         
-    def search_reddit_posts(self, product_name: str, sentiment: str = "positive") -> dict:
+    async def search_reddit_posts(self, product_name: str, sentiment: str = "positive") -> dict:
         """Search for Reddit posts using the Reddit MCP endpoint"""
         try:
             print(f"🔍 Starting Reddit search for product: '{product_name}' with sentiment: '{sentiment}'")
@@ -65,10 +98,11 @@ class RedditSearchAgent:
             print(f"📤 Sending request to Reddit endpoint: {self.reddit_endpoint}")
             print(f"📤 Request payload: {json.dumps(payload, indent=2)}")
             
-            response = requests.post(
+            response = await self.http_client.post(
                 self.reddit_endpoint,
                 json=payload,
-                headers={"Content-Type": "application/json"}
+                headers={"Content-Type": "application/json"},
+                timeout=MCP_TIMEOUT
             )
             
             print(f"📥 Reddit API response status: {response.status_code}")
@@ -130,8 +164,13 @@ class RedditSearchAgent:
             }
         }
 
-    def process_reddit_query(self, user_query: str) -> str:
-        """Process user query using ASI:One with Reddit search tool"""
+    async def process_reddit_query(self, user_query: str, tool_args: Optional[dict] = None) -> str:
+        """Process user query using ASI:One with Reddit search tool
+        
+        When ``tool_args`` is given the caller already knows search_reddit_posts is needed,
+        so the tool-selection call is skipped: the tool runs directly with these
+        arguments and ASI:One is only asked to format its results.
+        """
         try:
             reddit_tool = self.create_reddit_tool_schema()
             
@@ -208,33 +247,46 @@ MOST IMPORTANT: Talk about all the positive content obtained from the reddit pos
                 {"role": "user", "content": user_query}
             ]
 
-            # Let ASI:One decide whether to use the tool based on reasoning
-            payload = {
-                "model": "asi1-mini",
-                "messages": messages,
-                "tools": [reddit_tool],
-                "tool_choice": "auto",  # Let the model decide intelligently
-                "temperature": 0.3
-            }
+            if tool_args is not None:
+                # Direct mode: skip the "should I call the tool?" round trip
+                print("Direct tool mode: calling search_reddit_posts without a selection call")
+                choice = {
+                    "content": "",
+                    "tool_calls": [{
+                        "id": "direct_tool_call",
+                        "type": "function",
+                        "function": {"name": "search_reddit_posts", "arguments": json.dumps(tool_args)}
+                    }]
+                }
+            else:
+                # Let ASI:One decide whether to use the tool based on reasoning
+                payload = {
+                    "model": "asi1-mini",
+                    "messages": messages,
+                    "tools": [reddit_tool],
+                    "tool_choice": "auto",  # Let the model decide intelligently
+                    "temperature": 0.3
+                }
 
-            print(f"Making ASI:One request with tool_choice: {payload['tool_choice']}")
+                print(f"Making ASI:One request with tool_choice: {payload['tool_choice']}")
             
-            response = requests.post(
-                f"{ASI_BASE_URL}/chat/completions",
-                headers=ASI_HEADERS,
-                json=payload
-            )
+                response = await self.http_client.post(
+                    f"{ASI_BASE_URL}/chat/completions",
+                    headers=ASI_HEADERS,
+                    json=payload,
+                    timeout=ASI_TIMEOUT
+                )
 
-            if response.status_code != 200:
-                return f"ASI:One API error: {response.status_code} - {response.text}"
+                if response.status_code != 200:
+                    return f"ASI:One API error: {response.status_code} - {response.text}"
 
-            response_data = response.json()
-            print(f"ASI:One response: {json.dumps(response_data, indent=2)}")
+                response_data = response.json()
+                print(f"ASI:One response: {json.dumps(response_data, indent=2)}")
             
-            if "choices" not in response_data or not response_data["choices"]:
-                return "No response received from ASI:One"
+                if "choices" not in response_data or not response_data["choices"]:
+                    return "No response received from ASI:One"
 
-            choice = response_data["choices"][0]["message"]
+                choice = response_data["choices"][0]["message"]
             
             # Check if the model wants to call a tool
             if "tool_calls" in choice and choice["tool_calls"]:
@@ -246,35 +298,43 @@ MOST IMPORTANT: Talk about all the positive content obtained from the reddit pos
                     "tool_calls": choice["tool_calls"]
                 })
                 
-                for tool_call in choice["tool_calls"]:
-                    print(f"🔧 Processing tool call: {tool_call}")
-                    if tool_call["function"]["name"] == "search_reddit_posts":
-                        # Parse arguments
-                        args = json.loads(tool_call["function"]["arguments"])
-                        print(f"🔍 Reddit search arguments: {args}")
-                        
-                        # Execute Reddit search
-                        print("🚀 Executing Reddit search...")
-                        search_result = self.search_reddit_posts(
-                            product_name=args["product_name"],
-                            sentiment=args.get("sentiment", "positive")
-                        )
-                        
-                        print(f"📊 Reddit search result status: {'✅ Success' if search_result.get('success') else '❌ Error'}")
-                        if search_result.get('success'):
-                            print(f"📄 Reddit data available for: {search_result.get('product_name')}")
-                            print(f"🎯 Sentiment filter: {search_result.get('sentiment')}")
-                        else:
-                            print(f"❌ Error details: {search_result.get('error', 'Unknown error')}")
-                        
-                        print(f"📋 Full search result keys: {list(search_result.keys())}")
-                        
-                        # Add tool result to messages
-                        messages.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call["id"],
-                            "content": json.dumps(search_result)
-                        })
+                semaphore = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
+                
+                async def run_tool_call(tool_call: dict):
+                    async with semaphore:
+                        print(f"🔧 Processing tool call: {tool_call}")
+                        if tool_call["function"]["name"] == "search_reddit_posts":
+                            # Parse arguments
+                            args = json.loads(tool_call["function"]["arguments"])
+                            print(f"🔍 Reddit search arguments: {args}")
+                            
+                            # Execute Reddit search
+                            print("🚀 Executing Reddit search...")
+                            search_result = await self.search_reddit_posts(
+                                product_name=args["product_name"],
+                                sentiment=args.get("sentiment", "positive")
+                            )
+                            
+                            print(f"📊 Reddit search result status: {'✅ Success' if search_result.get('success') else '❌ Error'}")
+                            if search_result.get('success'):
+                                print(f"📄 Reddit data available for: {search_result.get('product_name')}")
+                                print(f"🎯 Sentiment filter: {search_result.get('sentiment')}")
+                            else:
+                                print(f"❌ Error details: {search_result.get('error', 'Unknown error')}")
+                            
+                            print(f"📋 Full search result keys: {list(search_result.keys())}")
+                            
+                            # Hand the tool result back to be added to messages
+                            return {
+                                "role": "tool",
+                                "tool_call_id": tool_call["id"],
+                                "content": json.dumps(search_result)
+                            }
+                    return None
+                
+                # Independent tool calls run concurrently; results keep the original order
+                tool_messages = await asyncio.gather(*(run_tool_call(tool_call) for tool_call in choice["tool_calls"]))
+                messages.extend(message for message in tool_messages if message is not None)
 
                 # Send updated conversation back to ASI:One for final response
                 print("📤 Sending final request to ASI:One with Reddit results...")
@@ -285,10 +345,11 @@ MOST IMPORTANT: Talk about all the positive content obtained from the reddit pos
                     "temperature": 0.3 # Increased for comprehensive responses
                 }
 
-                final_response = requests.post(
+                final_response = await self.http_client.post(
                     f"{ASI_BASE_URL}/chat/completions",
                     headers=ASI_HEADERS,
-                    json=final_payload
+                    json=final_payload,
+                    timeout=ASI_TIMEOUT
                 )
 
                 print(f"📥 Final ASI:One response status: {final_response.status_code}")
@@ -315,7 +376,7 @@ MOST IMPORTANT: Talk about all the positive content obtained from the reddit pos
 
         except json.JSONDecodeError as e:
             return f"JSON parsing error: {str(e)}"
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             return f"Request error: {str(e)}"
         except Exception as e:
             return f"Unexpected error: {str(e)}"
@@ -323,6 +384,86 @@ MOST IMPORTANT: Talk about all the positive content obtained from the reddit pos
 # Initialize the Reddit search agent
 reddit_search_agent = RedditSearchAgent()
 
+class RunRegistry:
+    """Background runs keyed by request, so retries and polling never redo in-flight work.
+    
+    ``submit`` hands back the run already in flight for an identical request
+    instead of starting a second one. Finished runs are kept (up to
+    ``max_runs``) so their results can still be fetched by run ID.
+    """
+    
+    def __init__(self, max_runs: int = 200):
+        self.max_runs = max_runs
+        self.runs = {}
+        self.tasks = {}
+        self.in_flight = {}
+    
+    def submit(self, key: str, subject: str, work):
+        """Start ``work()`` in the background unless a run for ``key`` is already in flight.
+        
+        Returns ``(run, coalesced)``.
+        """
+        run_id = self.in_flight.get(key)
+        if run_id is not None:
+            return self.runs[run_id], True
+        
+        run_id = str(uuid4())
+        run = {
+            "run_id": run_id,
+            "key": key,
+            "subject": subject,
+            "status": "running",
+            "result": None,
+            "error": None,
+            "created_at": datetime.utcnow().isoformat(),
+            "finished_at": None
+        }
+        self.runs[run_id] = run
+        self.in_flight[key] = run_id
+        self.tasks[run_id] = asyncio.create_task(self._execute(run, work))
+        return run, False
+    
+    async def _execute(self, run: dict, work):
+        try:
+            run["result"] = await work()
+            run["status"] = "completed"
+        except Exception as e:
+            run["error"] = str(e)
+            run["status"] = "failed"
+        finally:
+            run["finished_at"] = datetime.utcnow().isoformat()
+            self.in_flight.pop(run["key"], None)
+            self.tasks.pop(run["run_id"], None)
+            self._prune()
+    
+    async def wait(self, run: dict) -> dict:
+        """Wait for a run to finish without cancelling it if the caller goes away."""
+        task = self.tasks.get(run["run_id"])
+        if task is not None:
+            await asyncio.shield(task)
+        return run
+    
+    def get(self, run_id: str):
+        return self.runs.get(run_id)
+    
+    def _prune(self):
+        finished = [run_id for run_id, run in self.runs.items() if run["status"] != "running"]
+        for run_id in finished[:max(0, len(self.runs) - self.max_runs)]:
+            del self.runs[run_id]
+
+# Runs of the Reddit positive posts search, shared by every REST route below
+search_runs = RunRegistry()
+
+def start_search_run(product_name: str):
+    """Submit (or join) the Reddit positive posts run for this product."""
+    reddit_query = f"Find positive Reddit posts for {product_name}"
+    tool_args = {"product_name": product_name, "sentiment": "positive"} if DIRECT_TOOL_MODE else None
+    return search_runs.submit(
+        f"positive:{product_name.strip().lower()}",
+        product_name,
+        lambda: reddit_search_agent.process_reddit_query(reddit_query, tool_args)
+    )
+
 # Create uAgent
 agent = Agent(
     name="brandx_positive_reddit_search_agent",
@@ -344,6 +485,11 @@ async def startup_handler(ctx: Context):
     ctx.logger.info("The agent will reason about whether queries need positive Reddit post searches or can be answered directly")
     ctx.logger.info("REST API endpoint available at: http://localhost:8080/reddit/positive")
 
+# Shutdown Handler
+@agent.on_event("shutdown")
+async def shutdown_handler(ctx: Context):
+    await reddit_search_agent.http_client.aclose()
+
 # Message Handler
 @chat_proto.on_message(ChatMessage)
 async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
@@ -364,7 +510,7 @@ async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
     
     try:
         # Process the query using ASI:One with Reddit search
-        response_text = reddit_search_agent.process_reddit_query(user_query)
+        response_text = await reddit_search_agent.process_reddit_query(user_query)
         
         # Send response back to sender
         response_msg = ChatMessage(
@@ -400,8 +546,11 @@ async def handle_reddit_positive(ctx: Context, req: RedditPositiveRequest) -> Re
     
     try:
         # Process the Reddit positive posts query using the existing Reddit search agent
-        reddit_query = f"Find positive Reddit posts for {req.product_name}"
-        response_text = reddit_search_agent.process_reddit_query(reddit_query)
+        run, _ = start_search_run(req.product_name)
+        run = await search_runs.wait(run)
+        if run["status"] == "failed":
+            raise RuntimeError(run["error"])
+        response_text = run["result"]
         
         ctx.logger.info(f"Reddit positive posts search completed for: {req.product_name}")
         
@@ -427,6 +576,47 @@ async def handle_reddit_positive(ctx: Context, req: RedditPositiveRequest) -> Re
             agent_address=ctx.agent.address
         )
 
+def build_run_response(ctx: Context, run: dict, product_name: str, coalesced: bool = False) -> RedditPositiveRunResponse:
+    return RedditPositiveRunResponse(
+        success=run["status"] != "failed",
+        run_id=run["run_id"],
+        status=run["status"],
+        coalesced=coalesced,
+        product_name=product_name,
+        sentiment="positive",
+        reddit_result=run["result"],
+        error=run["error"],
+        created_at=run["created_at"],
+        finished_at=run["finished_at"],
+        timestamp=datetime.utcnow().isoformat(),
+        agent_address=ctx.agent.address
+    )
+
+# Async job API: submit returns a run ID right away, status returns progress or the result.
+# uAgents REST routes match exact paths only, so the run ID travels in the POST body.
+@agent.on_rest_post("/reddit/positive/runs", RedditPositiveRequest, RedditPositiveRunResponse)
+async def handle_submit_run(ctx: Context, req: RedditPositiveRequest) -> RedditPositiveRunResponse:
+    run, coalesced = start_search_run(req.product_name)
+    ctx.logger.info(f"{'Joined' if coalesced else 'Started'} Reddit positive posts run {run['run_id']} for: {req.product_name}")
+    return build_run_response(ctx, run, req.product_name, coalesced)
+
+@agent.on_rest_post("/reddit/positive/status", RunStatusRequest, RedditPositiveRunResponse)
+async def handle_run_status(ctx: Context, req: RunStatusRequest) -> RedditPositiveRunResponse:
+    run = search_runs.get(req.run_id)
+    if run is None:
+        return RedditPositiveRunResponse(
+            success=False,
+            run_id=req.run_id,
+            status="not_found",
+            product_name="",
+            sentiment="positive",
+            error=f"Unknown run: {req.run_id}",
+            created_at="",
+            timestamp=datetime.utcnow().isoformat(),
+            agent_address=ctx.agent.address
+        )
+    return build_run_response(ctx, run, run["subject"])
+
 # Include the chat protocol
 agent.include(chat_proto, publish_manifest=True)
 
@@ -439,6 +629,8 @@ if __name__ == '__main__':
     print("\n🌐 REST API Endpoint:")
     print("POST http://localhost:8080/reddit/positive")
     print("Body: {\"product_name\": \"iPhone\", \"sentiment\": \"positive\"}")
+    print("POST http://localhost:8080/reddit/positive/runs  (submit, returns run_id)")
+    print("POST http://localhost:8080/reddit/positive/status  Body: {\"run_id\": \"...\"}")
     print("\n🧪 Test queries (agent will decide whether to search positive Reddit posts):")
     print("- 'Find positive Reddit posts for iPhone' (will search positive Reddit posts)")
     print("- 'What do Reddit users discuss about Tesla?' (will search positive Reddit posts)")
@@ -1,9 +1,11 @@
 import os
 import time
+import asyncio
 import json
-import requests
+import httpx
 from datetime import datetime
 from uuid import uuid4
+from typing import Optional
 from dotenv import load_dotenv
 
 from uagents import Agent, Protocol, Context, Model
@@ -32,6 +34,7 @@ if not AGENTVERSE_API_KEY:
 # REST API Models
 class BrandResearchRequest(Model):
     brand_name: str
+    depth: str = "deep"
 
 class BrandResearchResponse(Model):
     success: bool
@@ -40,6 +43,23 @@ class BrandResearchResponse(Model):
     timestamp: str
     agent_address: str
 
+class RunStatusRequest(Model):
+    run_id: str
+
+class BrandResearchRunResponse(Model):
+    success: bool
+    run_id: str
+    status: str
+    coalesced: bool = False
+    brand_name: str
+    depth: str = "deep"
+    research_result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
+    timestamp: str
+    agent_address: str
+
 # ASI:One API configuration
 ASI_BASE_URL = "https://api.asi1.ai/v1"
 ASI_HEADERS = {
@@ -47,12 +67,188 @@ ASI_HEADERS = {
     "Content-Type": "application/json"
 }
 
+# Async HTTP settings: pooled connections and explicit timeouts, so a slow upstream
+# call never blocks the agent's event loop or hangs forever
+ASI_TIMEOUT = httpx.Timeout(float(os.environ.get("ASI_TIMEOUT_SECONDS", "120")), connect=10.0)
+EXA_TIMEOUT = httpx.Timeout(float(os.environ.get("EXA_TIMEOUT_SECONDS", "60")), connect=10.0)
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+# Upper bound on tool calls from one ASI:One response that run at the same time
+MAX_CONCURRENT_TOOL_CALLS = int(os.environ.get("MAX_CONCURRENT_TOOL_CALLS", "4"))
+
+# Exa research polling: the first check waits until close to the typical completion
+# time learned from past runs, then intervals start short and back off
+RESEARCH_STATE_FILE = os.environ.get("RESEARCH_STATE_FILE", "exa_research_state.json")
+RESEARCH_MIN_POLL_INTERVAL = float(os.environ.get("RESEARCH_MIN_POLL_INTERVAL", "2"))
+RESEARCH_MAX_POLL_INTERVAL = float(os.environ.get("RESEARCH_MAX_POLL_INTERVAL", "30"))
+RESEARCH_MAX_WAIT = float(os.environ.get("RESEARCH_MAX_WAIT", "600"))
+RESEARCH_MAX_AGE = float(os.environ.get("RESEARCH_MAX_AGE", "3600"))
+RESEARCH_DEFAULT_DURATION = 90.0
+
+# Research depth: "deep" runs an Exa research job (minutes), "fast" fans out Exa answer
+# calls in parallel (seconds) for a quick first report
+RESEARCH_DEPTHS = ("fast", "deep")
+FAST_RESEARCH_FACETS = {
+    "Recent News & Developments": "What are the latest news, product launches and corporate developments for {query}?",
+    "Brand Perception & Reputation": "How do customers and analysts currently perceive {query}?",
+    "Controversies & Challenges": "What recent controversies, legal issues or challenges has {query} faced?",
+    "Market Trends & Analysis": "What is the current market position and competitive landscape of {query}?",
+    "Products & Services": "What are the current products, services and recent innovations of {query}?"
+}
+
+class ResearchTracker:
+    """Book-keeping for Exa research jobs shared by every caller of exa_search.
+    
+    - Requests for the same query join the research already in progress
+      instead of starting a new one.
+    - In-progress research IDs are persisted to ``RESEARCH_STATE_FILE`` so a
+      restarted agent resumes polling them rather than paying for a new job.
+    - Completion times are remembered to pick the polling schedule.
+    """
+    
+    def __init__(self, state_file: str):
+        self.state_file = state_file
+        self.tasks = {}
+        self.recent_results = {}
+        self.state = self.load_state()
+    
+    def load_state(self) -> dict:
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("in_progress", {})
+        state.setdefault("durations", [])
+        state["in_progress"] = {
+            key: entry for key, entry in state["in_progress"].items()
+            if not self.is_stale(entry)
+        }
+        return state
+    
+    @staticmethod
+    def is_stale(entry: dict) -> bool:
+        """Research older than RESEARCH_MAX_AGE is not worth resuming."""
+        return time.time() - entry["started_at"] >= RESEARCH_MAX_AGE
+    
+    def in_progress(self, key: str) -> Optional[dict]:
+        """The research being tracked for ``key``, dropping it once it has gone stale."""
+        entry = self.state["in_progress"].get(key)
+        if entry is not None and self.is_stale(entry):
+            print(f"🗑️ Dropping stale research {entry['research_id']} for: '{entry['query']}'")
+            del self.state["in_progress"][key]
+            self.save_state()
+            entry = None
+        return entry
+    
+    def save_state(self):
+        try:
+            tmp_file = self.state_file + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_file, self.state_file)
+        except OSError as e:
+            print(f"⚠️ Could not save research state: {e}")
+    
+    @staticmethod
+    def key_for(query: str) -> str:
+        return " ".join(query.lower().split())
+    
+    def expected_duration(self) -> float:
+        """Exponential moving average of recent completion times."""
+        durations = self.state["durations"]
+        if not durations:
+            return RESEARCH_DEFAULT_DURATION
+        average = durations[0]
+        for duration in durations[1:]:
+            average = 0.3 * duration + 0.7 * average
+        return average
+    
+    def record_duration(self, seconds: float):
+        self.state["durations"] = (self.state["durations"] + [round(seconds, 1)])[-20:]
+    
+    def next_interval(self, elapsed: float, polls: int) -> float:
+        """Seconds to wait before the next status check."""
+        quiet_until = 0.7 * self.expected_duration()
+        if elapsed < quiet_until:
+            return min(quiet_until - elapsed, RESEARCH_MAX_POLL_INTERVAL)
+        return min(RESEARCH_MIN_POLL_INTERVAL * (1.5 ** polls), RESEARCH_MAX_POLL_INTERVAL)
+    
+    async def run(self, query: str, start_research, poll, target: Optional[str] = None) -> dict:
+        """Return the research result for ``query``, joining or resuming any research in progress.
+        
+        Research is keyed on ``target`` (e.g. the brand being researched) when given,
+        so differently worded queries for the same brand share one Exa job.
+        """
+        key = self.key_for(target or query)
+        recent = self.recent_results.pop(key, None)
+        if recent is not None:
+            print(f"♻️ Using research result finished in the background for: '{query}'")
+            return recent
+        
+        task = self.tasks.get(key)
+        if task is None:
+            task = self.track(key, query, start_research, poll)
+        else:
+            print(f"♻️ Joining research already in progress for: '{query}'")
+        # Shielded so one caller giving up does not cancel the research for everyone else
+        return await asyncio.shield(task)
+    
+    def track(self, key: str, query: str, start_research, poll) -> asyncio.Task:
+        task = asyncio.create_task(self._track(key, query, start_research, poll))
+        self.tasks[key] = task
+        task.add_done_callback(lambda _: self.tasks.pop(key, None))
+        return task
+    
+    async def _track(self, key: str, query: str, start_research, poll) -> dict:
+        entry = self.in_progress(key)
+        if entry is not None:
+            print(f"♻️ Resuming research {entry['research_id']} for: '{query}'")
+        elif start_research is None:
+            return {"error": f"Research for '{query}' expired before it could be resumed"}
+        else:
+            started = await start_research()
+            if "research_id" not in started:
+                return started
+            entry = {"research_id": started["research_id"], "query": query, "started_at": time.time()}
+            self.state["in_progress"][key] = entry
+            self.save_state()
+        
+        result = await poll(entry["research_id"], entry["started_at"])
+        if not result.get("timed_out"):
+            # Finished one way or another: stop tracking it
+            self.state["in_progress"].pop(key, None)
+            if result.get("success"):
+                self.record_duration(time.time() - entry["started_at"])
+            self.save_state()
+        return result
+    
+    def resume_pending(self, poll):
+        """Restart polling for research left running by a previous process."""
+        for key, entry in list(self.state["in_progress"].items()):
+            if key not in self.tasks:
+                task = self.track(key, entry["query"], None, poll)
+                task.add_done_callback(lambda t, key=key: self.keep_result(key, t))
+    
+    def keep_result(self, key: str, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is None and task.result().get("success"):
+            self.recent_results[key] = task.result()
+    
+    async def cancel_all(self):
+        """Stop polling (e.g. on shutdown); in-progress IDs stay on disk to be resumed."""
+        for task in list(self.tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.save_state()
+
 class WebSearchAgent:
     def __init__(self):
         self.exa_api_key = EXA_API_KEY
+        self.http_client = httpx.AsyncClient(limits=HTTP_LIMITS)
+        self.research_tracker = ResearchTracker(RESEARCH_STATE_FILE)
         
-    def exa_search(self, query: str) -> dict:
-        """Perform comprehensive web research using Exa API"""
+    async def exa_search(self, query: str, research_target: Optional[str] = None) -> dict:
+        """Perform comprehensive web research using Exa API (shared per ``research_target`` if given)"""
         try:
             print(f"🔍 Starting Exa research for query: '{query}'")
             
@@ -104,112 +300,186 @@ class WebSearchAgent:
             Focus on the most recent information (within the last 6-12 months) but include relevant historical context where necessary.
             """
             
-            print("📤 Sending research request to Exa API...")
-            response = requests.post(
-                "https://api.exa.ai/research/v1",
-                json={
-                    "model": "exa-research",
-                    "instructions": brand_research_instructions
-                },
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.exa_api_key}"
-                }
+            return await self.research_tracker.run(
+                query,
+                lambda: self.start_research(brand_research_instructions),
+                self.poll_research_completion,
+                research_target
             )
-            
-            print(f"📥 Exa API response status: {response.status_code}")
-            print(f"📥 Exa API response: {response.text}")
-            
-            if response.status_code == 201:
-                research_data = response.json()
-                research_id = research_data.get("researchId")
-                
-                print(f"🆔 Research ID received: {research_id}")
-                
-                if research_id:
-                    # Poll for completion
-                    print("⏳ Starting polling for research completion...")
-                    return self.poll_research_completion(research_id)
-                else:
-                    print("❌ No research ID in response")
-                    return {"error": "No research ID returned from Exa API"}
-            else:
-                print(f"❌ Exa API error: {response.status_code} - {response.text}")
-                return {"error": f"Exa API error: {response.status_code} - {response.text}"}
                 
         except Exception as e:
             print(f"❌ Search failed with exception: {str(e)}")
             return {"error": f"Search failed: {str(e)}"}
     
-    def poll_research_completion(self, research_id: str, max_attempts: int = 100, delay: int = 5) -> dict:
-        """Poll Exa API for research completion"""
+    async def exa_fast_search(self, query: str) -> dict:
+        """Quick web research: one Exa answer call per research area, all in parallel"""
+        try:
+            print(f"⚡ Starting fast Exa research for query: '{query}'")
+            facets = list(FAST_RESEARCH_FACETS.items())
+            answers = await asyncio.gather(
+                *(self.exa_answer(question.format(query=query)) for _, question in facets),
+                return_exceptions=True
+            )
+            
+            sections = []
+            sources = {}
+            for (title, _), answer in zip(facets, answers):
+                if isinstance(answer, Exception) or "error" in answer:
+                    print(f"⚠️ Fast research for '{title}' failed: {answer if isinstance(answer, Exception) else answer['error']}")
+                    continue
+                sections.append(f"## {title}\n{answer['answer']}")
+                for citation in answer["citations"]:
+                    sources.setdefault(citation.get("url"), citation)
+            
+            print(f"⚡ Fast research finished: {len(sections)}/{len(facets)} areas, {len(sources)} sources")
+            if not sections:
+                return {"error": "Fast research returned no answers"}
+            return {
+                "success": True,
+                "depth": "fast",
+                "data": {"content": "\n\n".join(sections)},
+                "sources": list(sources.values())
+            }
+        
+        except Exception as e:
+            print(f"❌ Fast search failed with exception: {str(e)}")
+            return {"error": f"Fast search failed: {str(e)}"}
+    
+    async def fast_brand_report(self, brand_name: str) -> str:
+        """Quick first report for a brand: the parallel Exa answers rendered as is, without ASI:One calls"""
+        search_result = await self.exa_fast_search(query=brand_name)
+        if not search_result.get("success"):
+            return f"Fast research error: {search_result.get('error', 'Unknown error')}"
+        
+        lines = [f"# {brand_name}: quick web research", "", search_result["data"]["content"]]
+        if search_result["sources"]:
+            lines += ["", "## Sources"]
+            lines += [f"- {source.get('title') or source.get('url')}: {source.get('url')}" for source in search_result["sources"]]
+        return "\n".join(lines)
+    
+    async def exa_answer(self, question: str) -> dict:
+        """Ask Exa a single question and return its answer with citations"""
+        response = await self.http_client.post(
+            "https://api.exa.ai/answer",
+            json={"query": question, "text": False},
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.exa_api_key}"
+            },
+            timeout=EXA_TIMEOUT
+        )
+        if response.status_code != 200:
+            return {"error": f"Exa answer error: {response.status_code} - {response.text}"}
+        result = response.json()
+        return {
+            "answer": result.get("answer", ""),
+            "citations": [
+                {"title": citation.get("title"), "url": citation.get("url"), "publishedDate": citation.get("publishedDate")}
+                for citation in result.get("citations", [])
+            ]
+        }
+    
+    async def start_research(self, instructions: str) -> dict:
+        """Start an Exa research job and return its research ID"""
+        print("📤 Sending research request to Exa API...")
+        response = await self.http_client.post(
+            "https://api.exa.ai/research/v1",
+            json={
+                "model": "exa-research",
+                "instructions": instructions
+            },
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.exa_api_key}"
+            },
+            timeout=EXA_TIMEOUT
+        )
+        
+        print(f"📥 Exa API response status: {response.status_code}")
+        
+        if response.status_code == 201:
+            research_id = response.json().get("researchId")
+            print(f"🆔 Research ID received: {research_id}")
+            if research_id:
+                return {"research_id": research_id}
+            print("❌ No research ID in response")
+            return {"error": "No research ID returned from Exa API"}
+        
+        print(f"❌ Exa API error: {response.status_code} - {response.text}")
+        return {"error": f"Exa API error: {response.status_code} - {response.text}"}
+    
+    async def poll_research_completion(self, research_id: str, started_at: float) -> dict:
+        """Poll Exa API for research completion on the tracker's adaptive schedule.
+        
+        The schedule follows the research's age (``started_at``), while the
+        RESEARCH_MAX_WAIT limit applies to this call, so joining or resuming
+        older research still waits for it. At least one status check is made.
+        """
         try:
             print(f"🔄 Polling research completion for ID: {research_id}")
             
-            for attempt in range(max_attempts):
-                print(f"📡 Polling attempt {attempt + 1}/{max_attempts}")
+            polling_since = time.time()
+            polls = 0
+            while True:
+                elapsed = time.time() - started_at
+                waited = time.time() - polling_since
+                if polls and waited >= RESEARCH_MAX_WAIT:
+                    print(f"⏰ Research {research_id} still running after {int(elapsed)}s, leaving it to be resumed")
+                    return {"error": "Research timed out - took too long to complete", "timed_out": True}
                 
-                response = requests.get(
+                interval = self.research_tracker.next_interval(elapsed, polls)
+                await asyncio.sleep(max(0.0, min(interval, RESEARCH_MAX_WAIT - waited)))
+                polls += 1
+                
+                response = await self.http_client.get(
                     f"https://api.exa.ai/research/v1/{research_id}",
                     headers={
                         "Authorization": f"Bearer {self.exa_api_key}"
-                    }
+                    },
+                    timeout=EXA_TIMEOUT
                 )
                 
-                print(f"📥 Poll response status: {response.status_code}")
-                print(f"📥 Poll response: {response.text}")
+                if response.status_code != 200:
+                    print(f"❌ Failed to check research status: {response.status_code} - {response.text}")
+                    return {"error": f"Failed to check research status: {response.status_code} - {response.text}"}
+                
+                result = response.json()
+                status = result.get("status")
+                print(f"📡 Poll {polls} for {research_id}: {status} after {int(time.time() - started_at)}s")
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    status = result.get("status")
+                if status == "completed":
+                    print("✅ Research completed successfully!")
                     
-                    print(f"📊 Research status: {status}")
+                    result_data = result.get("result", {})
+                    sources_data = result.get("sources", [])
                     
-                    if status == "completed":
-                        print("✅ Research completed successfully!")
-                        
-                        result_data = result.get("result", {})
-                        sources_data = result.get("sources", [])
-                        
-                        print(f"📄 Result data keys: {list(result_data.keys()) if result_data else 'No result data'}")
-                        print(f"📚 Sources count: {len(sources_data)}")
-                        
-                        # Check if we actually got meaningful data
-                        if not result_data and not sources_data:
-                            print("⚠️ Warning: Research completed but no data or sources returned")
-                            return {
-                                "success": False,
-                                "error": "Research completed but returned no data or sources",
-                                "research_id": research_id,
-                                "full_response": result
-                            }
-                        
+                    print(f"📄 Result data keys: {list(result_data.keys()) if result_data else 'No result data'}")
+                    print(f"📚 Sources count: {len(sources_data)}")
+                    
+                    # Check if we actually got meaningful data
+                    if not result_data and not sources_data:
+                        print("⚠️ Warning: Research completed but no data or sources returned")
                         return {
-                            "success": True,
-                            "data": result_data,
-                            "sources": sources_data,
-                            "research_id": research_id,
-                            "full_response": result  # Include full response for debugging
+                            "success": False,
+                            "error": "Research completed but returned no data or sources",
+                            "research_id": research_id
                         }
-                    elif status == "failed":
-                        print(f"❌ Research failed: {result.get('error', 'Unknown error')}")
-                        return {"error": f"Research failed: {result.get('error', 'Unknown error')}"}
-                    elif status == "running":
-                        print(f"⏳ Research in progress... (attempt {attempt + 1}/{max_attempts})")
-                        time.sleep(delay)
-                        continue
-                    else:
-                        print(f"⚠️ Unknown status: {status}")
-                        print(f"📄 Full response: {result}")
-                        time.sleep(delay)
-                        continue
-                else:
-                    print(f"❌ Failed to check research status: {response.status_code} - {response.text}")
-                    return {"error": f"Failed to check research status: {response.status_code} - {response.text}"}
-            
-            print("⏰ Research timed out - took too long to complete")
-            return {"error": "Research timed out - took too long to complete"}
+                    
+                    return {
+                        "success": True,
+                        "data": result_data,
+                        "sources": sources_data,
+                        "research_id": research_id
+                    }
+                elif status == "failed":
+                    print(f"❌ Research failed: {result.get('error', 'Unknown error')}")
+                    return {"error": f"Research failed: {result.get('error', 'Unknown error')}"}
+                elif status != "running":
+                    print(f"⚠️ Unknown status: {status}")
             
+        except asyncio.CancelledError:
+            print(f"🛑 Polling for research {research_id} cancelled; it can be resumed later")
+            raise
         except Exception as e:
             print(f"❌ Failed to poll research completion: {str(e)}")
             return {"error": f"Failed to poll research completion: {str(e)}"}
@@ -236,8 +506,12 @@ class WebSearchAgent:
             }
         }
 
-    def process_search_query(self, user_query: str) -> str:
-        """Process user query using ASI:One with Exa search tool"""
+    async def process_search_query(self, user_query: str, depth: str = "deep", research_target: Optional[str] = None) -> str:
+        """Process user query using ASI:One with Exa search tool at the given research depth
+        
+        ``research_target`` (the brand a REST request asked about) keys the Exa research
+        instead of whatever query ASI:One writes into its tool call.
+        """
         try:
             search_tool = self.create_search_tool_schema()
             
@@ -290,10 +564,11 @@ After using the tool, provide detailed analysis with proper source citations and
 
             print(f"Making ASI:One request with tool_choice: {payload['tool_choice']}")
             
-            response = requests.post(
+            response = await self.http_client.post(
                 f"{ASI_BASE_URL}/chat/completions",
                 headers=ASI_HEADERS,
-                json=payload
+                json=payload,
+                timeout=ASI_TIMEOUT
             )
 
             if response.status_code != 200:
@@ -317,32 +592,43 @@ After using the tool, provide detailed analysis with proper source citations and
                     "tool_calls": choice["tool_calls"]
                 })
                 
-                for tool_call in choice["tool_calls"]:
-                    print(f"🔧 Processing tool call: {tool_call}")
-                    if tool_call["function"]["name"] == "exa_search":
-                        # Parse arguments
-                        args = json.loads(tool_call["function"]["arguments"])
-                        print(f"🔍 Search arguments: {args}")
-                        
-                        # Execute Exa search
-                        print("🚀 Executing Exa search...")
-                        search_result = self.exa_search(query=args["query"])
-                        
-                        print(f"📊 Search result status: {'✅ Success' if search_result.get('success') else '❌ Error'}")
-                        if search_result.get('success'):
-                            print(f"📄 Data keys: {list(search_result.get('data', {}).keys())}")
-                            print(f"📚 Sources: {len(search_result.get('sources', []))}")
-                        else:
-                            print(f"❌ Error details: {search_result.get('error', 'Unknown error')}")
-                        
-                        print(f"📋 Full search result: {json.dumps(search_result, indent=2)}")
-                        
-                        # Add tool result to messages
-                        messages.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call["id"],
-                            "content": json.dumps(search_result)
-                        })
+                semaphore = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
+                
+                async def run_tool_call(tool_call: dict):
+                    async with semaphore:
+                        print(f"🔧 Processing tool call: {tool_call}")
+                        if tool_call["function"]["name"] == "exa_search":
+                            # Parse arguments
+                            args = json.loads(tool_call["function"]["arguments"])
+                            print(f"🔍 Search arguments: {args}")
+                            
+                            # Execute Exa search
+                            print(f"🚀 Executing Exa search ({depth})...")
+                            if depth == "fast":
+                                search_result = await self.exa_fast_search(query=args["query"])
+                            else:
+                                search_result = await self.exa_search(query=args["query"], research_target=research_target)
+                            
+                            print(f"📊 Search result status: {'✅ Success' if search_result.get('success') else '❌ Error'}")
+                            if search_result.get('success'):
+                                print(f"📄 Data keys: {list(search_result.get('data', {}).keys())}")
+                                print(f"📚 Sources: {len(search_result.get('sources', []))}")
+                            else:
+                                print(f"❌ Error details: {search_result.get('error', 'Unknown error')}")
+                            
+                            print(f"📋 Full search result: {json.dumps(search_result, indent=2)}")
+                            
+                            # Hand the tool result back to be added to messages
+                            return {
+                                "role": "tool",
+                                "tool_call_id": tool_call["id"],
+                                "content": json.dumps(search_result)
+                            }
+                    return None
+                
+                # Independent tool calls run concurrently; results keep the original order
+                tool_messages = await asyncio.gather(*(run_tool_call(tool_call) for tool_call in choice["tool_calls"]))
+                messages.extend(message for message in tool_messages if message is not None)
 
                 # Send updated conversation back to ASI:One for final response
                 print("📤 Sending final request to ASI:One with search results...")
@@ -353,10 +639,11 @@ After using the tool, provide detailed analysis with proper source citations and
                     "temperature": 0.3 # Increased for comprehensive responses
                 }
 
-                final_response = requests.post(
+                final_response = await self.http_client.post(
                     f"{ASI_BASE_URL}/chat/completions",
                     headers=ASI_HEADERS,
-                    json=final_payload
+                    json=final_payload,
+                    timeout=ASI_TIMEOUT
                 )
 
                 print(f"📥 Final ASI:One response status: {final_response.status_code}")
@@ -383,7 +670,7 @@ After using the tool, provide detailed analysis with proper source citations and
 
         except json.JSONDecodeError as e:
             return f"JSON parsing error: {str(e)}"
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             return f"Request error: {str(e)}"
         except Exception as e:
             return f"Unexpected error: {str(e)}"
@@ -391,6 +678,90 @@ After using the tool, provide detailed analysis with proper source citations and
 # Initialize the web search agent
 web_search_agent = WebSearchAgent()
 
+class RunRegistry:
+    """Background runs keyed by request, so retries and polling never redo in-flight work.
+    
+    ``submit`` hands back the run already in flight for an identical request
+    instead of starting a second one. Finished runs are kept (up to
+    ``max_runs``) so their results can still be fetched by run ID.
+    """
+    
+    def __init__(self, max_runs: int = 200):
+        self.max_runs = max_runs
+        self.runs = {}
+        self.tasks = {}
+        self.in_flight = {}
+    
+    def submit(self, key: str, subject: str, work):
+        """Start ``work()`` in the background unless a run for ``key`` is already in flight.
+        
+        Returns ``(run, coalesced)``.
+        """
+        run_id = self.in_flight.get(key)
+        if run_id is not None:
+            return self.runs[run_id], True
+        
+        run_id = str(uuid4())
+        run = {
+            "run_id": run_id,
+            "key": key,
+            "subject": subject,
+            "status": "running",
+            "result": None,
+            "error": None,
+            "created_at": datetime.utcnow().isoformat(),
+            "finished_at": None
+        }
+        self.runs[run_id] = run
+        self.in_flight[key] = run_id
+        self.tasks[run_id] = asyncio.create_task(self._execute(run, work))
+        return run, False
+    
+    async def _execute(self, run: dict, work):
+        try:
+            run["result"] = await work()
+            run["status"] = "completed"
+        except Exception as e:
+            run["error"] = str(e)
+            run["status"] = "failed"
+        finally:
+            run["finished_at"] = datetime.utcnow().isoformat()
+            self.in_flight.pop(run["key"], None)
+            self.tasks.pop(run["run_id"], None)
+            self._prune()
+    
+    async def wait(self, run: dict) -> dict:
+        """Wait for a run to finish without cancelling it if the caller goes away."""
+        task = self.tasks.get(run["run_id"])
+        if task is not None:
+            await asyncio.shield(task)
+        return run
+    
+    def get(self, run_id: str):
+        return self.runs.get(run_id)
+    
+    def _prune(self):
+        finished = [run_id for run_id, run in self.runs.items() if run["status"] != "running"]
+        for run_id in finished[:max(0, len(self.runs) - self.max_runs)]:
+            del self.runs[run_id]
+
+# Runs of the brand research search, shared by every REST route below
+search_runs = RunRegistry()
+
+def start_search_run(brand_name: str, depth: str = "deep"):
+    """Submit (or join) the brand research run for this brand at this depth."""
+    if depth not in RESEARCH_DEPTHS:
+        raise ValueError(f"Unknown research depth '{depth}', expected one of: {', '.join(RESEARCH_DEPTHS)}")
+    research_query = f"Research {brand_name} brand comprehensively"
+    if depth == "fast":
+        # The quick first report goes straight to Exa; ASI:One is only used for deep research
+        work = lambda: web_search_agent.fast_brand_report(brand_name)
+    else:
+        work = lambda: web_search_agent.process_search_query(research_query, depth, brand_name)
+    run, coalesced = search_runs.submit(f"{depth}:{brand_name.strip().lower()}", brand_name, work)
+    run.setdefault("depth", depth)
+    return run, coalesced
+
 # Create uAgent
 agent = Agent(
     name="brandx_exa_search_agent",
@@ -410,6 +781,13 @@ async def startup_handler(ctx: Context):
     ctx.logger.info("Agent is ready to intelligently decide when to perform research using ASI:One and Exa!")
     ctx.logger.info("The agent will reason about whether queries need current information or can be answered with general knowledge")
     ctx.logger.info("REST API endpoint available at: http://localhost:8081/research/brand")
+    web_search_agent.research_tracker.resume_pending(web_search_agent.poll_research_completion)
+
+# Shutdown Handler
+@agent.on_event("shutdown")
+async def shutdown_handler(ctx: Context):
+    await web_search_agent.research_tracker.cancel_all()
+    await web_search_agent.http_client.aclose()
 
 # Message Handler
 @chat_proto.on_message(ChatMessage)
@@ -431,7 +809,7 @@ async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
     
     try:
         # Process the query using ASI:One with Exa search
-        response_text = web_search_agent.process_search_query(user_query)
+        response_text = await web_search_agent.process_search_query(user_query)
         
         # Send response back to sender
         response_msg = ChatMessage(
@@ -467,8 +845,11 @@ async def handle_brand_research(ctx: Context, req: BrandResearchRequest) -> Bran
     
     try:
         # Process the brand research query using the existing web search agent
-        research_query = f"Research {req.brand_name} brand comprehensively"
-        response_text = web_search_agent.process_search_query(research_query)
+        run, _ = start_search_run(req.brand_name, req.depth)
+        run = await search_runs.wait(run)
+        if run["status"] == "failed":
+            raise RuntimeError(run["error"])
+        response_text = run["result"]
         
         ctx.logger.info(f"Brand research completed for: {req.brand_name}")
         
@@ -492,6 +873,59 @@ async def handle_brand_research(ctx: Context, req: BrandResearchRequest) -> Bran
             agent_address=ctx.agent.address
         )
 
+def build_run_response(ctx: Context, run: dict, brand_name: str, coalesced: bool = False) -> BrandResearchRunResponse:
+    return BrandResearchRunResponse(
+        success=run["status"] != "failed",
+        run_id=run["run_id"],
+        status=run["status"],
+        coalesced=coalesced,
+        brand_name=brand_name,
+        depth=run["depth"],
+        research_result=run["result"],
+        error=run["error"],
+        created_at=run["created_at"],
+        finished_at=run["finished_at"],
+        timestamp=datetime.utcnow().isoformat(),
+        agent_address=ctx.agent.address
+    )
+
+# Async job API: submit returns a run ID right away, status returns progress or the result.
+# uAgents REST routes match exact paths only, so the run ID travels in the POST body.
+@agent.on_rest_post("/research/brand/runs", BrandResearchRequest, BrandResearchRunResponse)
+async def handle_submit_run(ctx: Context, req: BrandResearchRequest) -> BrandResearchRunResponse:
+    try:
+        run, coalesced = start_search_run(req.brand_name, req.depth)
+    except ValueError as e:
+        return BrandResearchRunResponse(
+            success=False,
+            run_id="",
+            status="failed",
+            brand_name=req.brand_name,
+            depth=req.depth,
+            error=str(e),
+            created_at="",
+            timestamp=datetime.utcnow().isoformat(),
+            agent_address=ctx.agent.address
+        )
+    ctx.logger.info(f"{'Joined' if coalesced else 'Started'} brand research run {run['run_id']} for: {req.brand_name}")
+    return build_run_response(ctx, run, req.brand_name, coalesced)
+
+@agent.on_rest_post("/research/brand/status", RunStatusRequest, BrandResearchRunResponse)
+async def handle_run_status(ctx: Context, req: RunStatusRequest) -> BrandResearchRunResponse:
+    run = search_runs.get(req.run_id)
+    if run is None:
+        return BrandResearchRunResponse(
+            success=False,
+            run_id=req.run_id,
+            status="not_found",
+            brand_name="",
+            error=f"Unknown run: {req.run_id}",
+            created_at="",
+            timestamp=datetime.utcnow().isoformat(),
+            agent_address=ctx.agent.address
+        )
+    return build_run_response(ctx, run, run["subject"])
+
 # Include the chat protocol
 agent.include(chat_proto, publish_manifest=True)
 
@@ -503,6 +937,8 @@ if __name__ == '__main__':
     print("\n🌐 REST API Endpoint:")
     print("POST http://localhost:8081/research/brand")
     print("Body: {\"brand_name\": \"Tesla\"}")
+    print("POST http://localhost:8081/research/brand/runs  (submit, returns run_id)")
+    print("POST http://localhost:8081/research/brand/status  Body: {\"run_id\": \"...\"}")
     print("\n🧪 Test queries (agent will decide whether to research):")
     print("- 'Research Tesla brand comprehensively' (will research)")
     print("- 'What is machine learning?' (will answer directly)")
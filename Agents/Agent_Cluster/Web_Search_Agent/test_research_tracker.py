@@ -0,0 +1,93 @@
+# test_research_tracker.py
+import asyncio
+import os
+
+import httpx
+import pytest
+
+for name in ("ASI_ONE_API_KEY", "EXA_API_KEY", "AGENTVERSE_API_KEY"):
+    os.environ.setdefault(name, "test")
+
+import main
+
+class FakeExa:
+    """Exa research API stand-in: one research ID per POST, "running" until ``done`` is set."""
+    
+    def __init__(self):
+        self.started = 0
+        self.status_checks = 0
+        self.done = False
+    
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            self.started += 1
+            return httpx.Response(201, json={"researchId": f"research-{self.started}"})
+        self.status_checks += 1
+        if not self.done:
+            return httpx.Response(200, json={"status": "running"})
+        return httpx.Response(200, json={"status": "completed", "result": {"summary": "Tesla news"}, "sources": []})
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "RESEARCH_MAX_WAIT", 0.3)
+    monkeypatch.setattr(main, "RESEARCH_DEFAULT_DURATION", 0.05)
+    monkeypatch.setattr(main, "RESEARCH_MIN_POLL_INTERVAL", 0.02)
+    monkeypatch.setattr(main, "RESEARCH_MAX_POLL_INTERVAL", 0.05)
+    exa = FakeExa()
+    agent = main.WebSearchAgent()
+    agent.http_client = httpx.AsyncClient(transport=httpx.MockTransport(exa.handler))
+    agent.research_tracker = main.ResearchTracker(str(tmp_path / "state.json"))
+    agent.exa = exa
+    return agent
+
+def test_timed_out_research_is_polled_again_on_the_next_call(agent):
+    async def scenario():
+        first = await agent.exa_search("Tesla")
+        assert first.get("timed_out")
+        assert "tesla" in agent.research_tracker.state["in_progress"]
+        
+        # The research is now older than RESEARCH_MAX_WAIT; the next call still checks it
+        await asyncio.sleep(0.35)
+        agent.exa.done = True
+        checks = agent.exa.status_checks
+        second = await agent.exa_search("Tesla")
+        assert second["success"]
+        assert second["research_id"] == "research-1"
+        assert agent.exa.status_checks > checks
+        assert agent.exa.started == 1
+        assert agent.research_tracker.state["in_progress"] == {}
+    
+    asyncio.run(scenario())
+
+def test_stale_research_is_replaced_by_a_new_one(agent, monkeypatch):
+    async def scenario():
+        assert (await agent.exa_search("Tesla")).get("timed_out")
+        monkeypatch.setattr(main, "RESEARCH_MAX_AGE", 0.0)
+        agent.exa.done = True
+        result = await agent.exa_search("Tesla")
+        assert result["research_id"] == "research-2"
+        assert agent.exa.started == 2
+    
+    asyncio.run(scenario())
+
+def test_research_is_shared_per_target_whatever_the_query_wording(agent):
+    async def scenario():
+        agent.exa.done = True
+        first, second = await asyncio.gather(
+            agent.exa_search("Tesla brand news", research_target="Tesla"),
+            agent.exa_search("latest on Tesla Inc", research_target=" tesla ")
+        )
+        assert first["research_id"] == second["research_id"] == "research-1"
+        assert agent.exa.started == 1
+    
+    asyncio.run(scenario())
+
+def test_timed_out_research_resumes_for_a_differently_worded_query(agent):
+    async def scenario():
+        assert (await agent.exa_search("Tesla brand news", research_target="Tesla")).get("timed_out")
+        agent.exa.done = True
+        result = await agent.exa_search("Research Tesla comprehensively", research_target="Tesla")
+        assert result["research_id"] == "research-1"
+        assert agent.exa.started == 1
+    
+    asyncio.run(scenario())
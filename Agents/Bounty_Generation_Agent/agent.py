@@ -2,6 +2,8 @@ from datetime import datetime, timezone
 import mailbox
 from uuid import uuid4
 from typing import Any, Dict, List, Optional
+import asyncio
+from collections import OrderedDict
 import json
 import os
 import requests
@@ -72,6 +74,7 @@ class MetricsData(Model):
     negative_social: List[str]
     timestamp: str
     source_agent: str
+    run_id: Optional[str] = None
 
 class MetricsResponse(Model):
     success: bool
@@ -103,6 +106,22 @@ class BrandBountiesResponse(Model):
     timestamp: str
     agent_address: str
 
+class BountyWaitRequest(Model):
+    brand_name: str
+    run_id: Optional[str] = None
+    timeout_seconds: float = 25
+
+class BountyWaitResponse(Model):
+    success: bool
+    ready: bool
+    status: str
+    brand_name: str
+    run_id: Optional[str] = None
+    auto_generated_bounties: Dict[str, Any]
+    timestamp: str
+    agent_address: str
+    error: Optional[str] = None
+
 # Initialize global components
 metta = MeTTa()
 llm_client = None
@@ -110,26 +129,78 @@ llm_client = None
 # Storage for received metrics data from brand-metrics-agent
 received_metrics = {}
 
+# Long-poll support: waiters on /bounties/wait are woken whenever a brand finishes
+# (or fails) auto-generation. Failures are kept per brand so waiters return early.
+BOUNTY_WAIT_MAX_TIMEOUT = float(os.environ.get("BOUNTY_WAIT_MAX_TIMEOUT", "55"))
+bounty_ready = asyncio.Condition()
+failed_bounty_runs = {}
+
+KG_CACHE_SIZE = int(os.environ.get("KG_CACHE_SIZE", "128"))
+# Token budget for the evidence retrieved into an LLM prompt (each agent has its own variable)
+KG_EVIDENCE_TOKENS = int(os.environ.get("BOUNTY_EVIDENCE_TOKENS", "2000"))
+EVIDENCE_FIELDS = ['web_results', 'positive_reddit', 'negative_reddit', 'positive_reviews',
+                   'negative_reviews', 'positive_social', 'negative_social']
+# Prompt with the brand digest the KG computes at ingestion instead of sampled items
+KG_USE_DIGEST = os.environ.get("KG_USE_DIGEST", "false").lower() == "true"
+
 class BrandRAG:
     """Brand RAG class for knowledge graph interactions."""
     def __init__(self, metta_instance):
         self.metta = metta_instance
         # Knowledge graph base URL
         self.kg_base_url = "https://orchestrator-739298578243.us-central1.run.app"
+        # Responses kept for conditional (ETag) revalidation
+        self.cache = OrderedDict()
+        self.cache_size = KG_CACHE_SIZE
+        self.cache_stats = {"downloaded": 0, "revalidated": 0}
+        self.use_digest = KG_USE_DIGEST
     
-    def get_brand_summary(self, brand_name: str) -> Dict:
-        """Get comprehensive brand summary from knowledge graph."""
+    def cached_get(self, url: str, params: Dict = None):
+        """GET through the local LRU cache, revalidating cached responses with If-None-Match.
+        
+        Returns (status_code, parsed JSON or None, error text).
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        cached = self.cache.get(key)
+        headers = {"If-None-Match": cached["etag"]} if cached else {}
+        response = requests.get(url, params=params, headers=headers, timeout=30)
+        
+        if response.status_code == 304 and cached:
+            self.cache.move_to_end(key)
+            self.cache_stats["revalidated"] += 1
+            print(f"♻️ Not modified, using cached response ({self.cache_stats['revalidated']} revalidated so far)")
+            return 200, cached["data"], ""
+        if response.status_code != 200:
+            return response.status_code, None, response.text
+        
+        data = response.json()
+        self.cache_stats["downloaded"] += 1
+        etag = response.headers.get("ETag")
+        if etag:
+            self.cache[key] = {"etag": etag, "data": data}
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return 200, data, ""
+    
+    def get_brand_summary(self, brand_name: str, itemized: bool = False) -> Dict:
+        """Get comprehensive brand summary from knowledge graph.
+        
+        With itemized=True each field lists one line per parsed review / post / comment
+        instead of the agents' whole results, so counts and [:n] slices are per item.
+        """
         try:
             url = f"{self.kg_base_url}/kg/get_brand_summary"
             params = {"brand_name": brand_name}
+            if itemized:
+                params["itemized"] = "true"
             print(f"🌐 Making request to: {url}")
             print(f"📤 Request params: {params}")
             
-            response = requests.get(url, params=params, timeout=30)
-            print(f"📡 Response status: {response.status_code}")
+            status_code, data, error_text = self.cached_get(url, params)
+            print(f"📡 Response status: {status_code}")
             
-            if response.status_code == 200:
-                data = response.json()
+            if status_code == 200:
                 print(f"📊 Response data: {data}")
                 summary = data.get("summary", {})
                 print(f"📊 Extracted summary: {type(summary)} - {bool(summary)}")
@@ -137,11 +208,99 @@ class BrandRAG:
                     print(f"📊 Summary keys: {list(summary.keys()) if isinstance(summary, dict) else 'Not a dict'}")
                 return summary
             else:
-                print(f"❌ Error response: {response.text}")
+                print(f"❌ Error response: {error_text}")
             return {}
         except Exception as e:
             print(f"❌ Error getting brand summary: {e}")
             return {}
+    
+    def get_brand_digest(self, brand_name: str) -> str:
+        """The brand's digest text (per-source counts, ratings, themes and representative items), or "" if unavailable."""
+        try:
+            url = f"{self.kg_base_url}/kg/get_brand_digest"
+            params = {"brand_name": brand_name}
+            print(f"🌐 Making request to: {url}")
+            
+            status_code, data, error_text = self.cached_get(url, params)
+            print(f"📡 Response status: {status_code}")
+            
+            if status_code == 200:
+                return data.get("digest", {}).get("text", "")
+            else:
+                print(f"❌ Error response: {error_text}")
+            return ""
+        except Exception as e:
+            print(f"❌ Error getting brand digest: {e}")
+            return ""
+    
+    def retrieve_evidence(self, brand_name: str, query: str, k: int = 20, token_budget: int = None,
+                          data_types: List[str] = None, sentiments: List[str] = None) -> Dict[str, List[str]]:
+        """The brand's items most relevant to a prompt's task (best first, within k items and a token budget).
+        
+        Returns a summary-shaped dict (field -> list of item lines) to build the prompt from,
+        or {} when nothing could be retrieved so callers can fall back to the full summary.
+        """
+        try:
+            url = f"{self.kg_base_url}/kg/retrieve"
+            payload = {"brand_name": brand_name, "query": query, "k": k,
+                       "token_budget": token_budget or KG_EVIDENCE_TOKENS}
+            if data_types:
+                payload["data_types"] = data_types
+            if sentiments:
+                payload["sentiments"] = sentiments
+            print(f"🌐 Making request to: {url}")
+            print(f"📤 Request payload: {payload}")
+            
+            response = requests.post(url, json=payload, timeout=30)
+            print(f"📡 Response status: {response.status_code}")
+            
+            if response.status_code == 200:
+                data = response.json()
+                passages = data.get("passages", [])
+                print(f"📊 Retrieved {len(passages)} of {data.get('candidates', 0)} items ({data.get('tokens_used', 0)} tokens)")
+                if not passages:
+                    return {}
+                evidence = {field: [] for field in EVIDENCE_FIELDS}
+                for passage in passages:
+                    evidence.setdefault(passage["field"], []).append(passage["text"])
+                return evidence
+            else:
+                print(f"❌ Error response: {response.text}")
+            return {}
+        except Exception as e:
+            print(f"❌ Error retrieving evidence: {e}")
+            return {}
+    
+    def get_brands_batch(self, brand_names: List[str], data_types: List[str] = None, sentiments: List[str] = None,
+                         include_all_brands: bool = False) -> Dict:
+        """Get data for several brands (optionally only some data types / sentiments) in one request.
+        
+        Returns {"results": {brand: summary}, "missing": [brands not in the KG]} plus
+        "all_brands" when include_all_brands is set.
+        """
+        try:
+            url = f"{self.kg_base_url}/kg/batch"
+            payload = {"brands": brand_names, "include_all_brands": include_all_brands}
+            if data_types:
+                payload["data_types"] = data_types
+            if sentiments:
+                payload["sentiments"] = sentiments
+            print(f"🌐 Making request to: {url}")
+            print(f"📤 Request payload: {payload}")
+            
+            response = requests.post(url, json=payload, timeout=30)
+            print(f"📡 Response status: {response.status_code}")
+            
+            if response.status_code == 200:
+                data = response.json()
+                print(f"📊 Batch results for {len(data.get('results', {}))} brands, missing: {data.get('missing', [])}")
+                return data
+            else:
+                print(f"❌ Error response: {response.text}")
+            return {"results": {}, "missing": brand_names}
+        except Exception as e:
+            print(f"❌ Error fetching brand batch: {e}")
+            return {"results": {}, "missing": brand_names}
 
 # Initialize BrandRAG
 rag = BrandRAG(metta)
@@ -191,8 +350,12 @@ def combine_brand_data(metrics_data: Dict, kg_data: Dict, brand_name: str) -> Di
     return None
 
 def get_brand_data_from_research_agent(brand_name: str) -> Dict:
-    """Fetch brand data from the knowledge graph using BrandRAG approach."""
-    return rag.get_brand_summary(brand_name)
+    """Fetch brand data from the knowledge graph using BrandRAG approach (one entry per parsed item)."""
+    return rag.get_brand_summary(brand_name, itemized=True)
+
+# Retrieval query for the evidence behind the weakness analysis
+WEAKNESS_EVIDENCE_QUERY = ("complaints problems issues broken defect poor bad worst slow expensive refund "
+                           "support service quality disappointed frustrated")
 
 def analyze_brand_weaknesses(brand_data: Dict, brand_name: str, llm: LLM) -> Dict:
     """Analyze brand data to identify weaknesses and areas for improvement."""
@@ -210,6 +373,29 @@ def analyze_brand_weaknesses(brand_data: Dict, brand_name: str, llm: LLM) -> Dic
     positive_count = len(positive_reviews) + len(positive_reddit) + len(positive_social)
     negative_count = len(negative_reviews) + len(negative_reddit) + len(negative_social)
     
+    # Use the precomputed digest when opted in, else sample the items most relevant to
+    # weaknesses (within the token budget), else the first few
+    digest = rag.get_brand_digest(brand_name) if rag.use_digest else ""
+    if digest:
+        samples = digest
+    else:
+        evidence = rag.retrieve_evidence(brand_name, WEAKNESS_EVIDENCE_QUERY)
+        negative_reviews_sample = evidence['negative_reviews'] if evidence else negative_reviews[:3]
+        negative_reddit_sample = evidence['negative_reddit'] if evidence else negative_reddit[:3]
+        negative_social_sample = evidence['negative_social'] if evidence else negative_social[:3]
+        web_results_sample = evidence['web_results'] if evidence else web_results[:3]
+        samples = f"""NEGATIVE REVIEWS SAMPLE:
+{chr(10).join(negative_reviews_sample) if negative_reviews_sample else "No negative reviews found"}
+
+NEGATIVE REDDIT DISCUSSIONS SAMPLE:
+{chr(10).join(negative_reddit_sample) if negative_reddit_sample else "No negative Reddit discussions found"}
+
+NEGATIVE SOCIAL MEDIA SAMPLE:
+{chr(10).join(negative_social_sample) if negative_social_sample else "No negative social media found"}
+
+WEB RESULTS SAMPLE:
+{chr(10).join(web_results_sample) if web_results_sample else "No web results found"}"""
+    
     # Create analysis prompt
     analysis_prompt = f"""
 Brand Analysis for: {brand_name}
@@ -223,17 +409,7 @@ BRAND DATA SUMMARY:
 - Positive Social Media: {len(positive_social)} items
 - Negative Social Media: {len(negative_social)} items
 
-NEGATIVE REVIEWS SAMPLE:
-{chr(10).join(negative_reviews[:3]) if negative_reviews else "No negative reviews found"}
-
-NEGATIVE REDDIT DISCUSSIONS SAMPLE:
-{chr(10).join(negative_reddit[:3]) if negative_reddit else "No negative Reddit discussions found"}
-
-NEGATIVE SOCIAL MEDIA SAMPLE:
-{chr(10).join(negative_social[:3]) if negative_social else "No negative social media found"}
-
-WEB RESULTS SAMPLE:
-{chr(10).join(web_results[:3]) if web_results else "No web results found"}
+{samples}
 
 TASK: Analyze this brand data and identify:
 1. Main weaknesses and pain points
@@ -469,6 +645,11 @@ def create_text_chat(text: str, end_session: bool = False) -> ChatMessage:
         content=content,
     )
 
+async def notify_bounty_waiters():
+    """Wake every /bounties/wait request so it can re-check its brand and run."""
+    async with bounty_ready:
+        bounty_ready.notify_all()
+
 # Message Handler for receiving metrics from brand-metrics-agent
 @agent.on_message(MetricsData)
 async def handle_metrics_data(ctx: Context, sender: str, msg: MetricsData):
@@ -507,7 +688,8 @@ async def handle_metrics_data(ctx: Context, sender: str, msg: MetricsData):
                 else:
                     generated_bounties = existing_bounties
                 
-                # Add new bounties for this brand
+                # Add new bounties for this brand, tagged with the run that asked for them
+                bounty_result["run_id"] = msg.run_id
                 generated_bounties[msg.brand_name] = bounty_result
                 
                 # Store back to storage
@@ -517,9 +699,14 @@ async def handle_metrics_data(ctx: Context, sender: str, msg: MetricsData):
                 ctx.storage.set('most_recent_company', msg.brand_name)
                 ctx.logger.info(f"💾 Stored bounties for {msg.brand_name} in storage")
                 ctx.logger.info(f"📝 Updated most recent company to: {msg.brand_name}")
+                failed_bounty_runs.pop(msg.brand_name, None)
             except Exception as storage_error:
                 ctx.logger.error(f"❌ Error storing bounties: {storage_error}")
-                # Continue without failing the whole process
+                # Continue without failing the whole process, but record the failure so
+                # /bounties/wait callers for this run return instead of waiting out their timeout
+                failed_bounty_runs[msg.brand_name] = {"run_id": msg.run_id, "error": f"Generated bounties could not be stored: {storage_error}"}
+            
+            await notify_bounty_waiters()
             
             # Send acknowledgment with bounty generation status
             response = MetricsResponse(
@@ -530,6 +717,8 @@ async def handle_metrics_data(ctx: Context, sender: str, msg: MetricsData):
             )
         else:
             ctx.logger.error(f"❌ Failed to auto-generate bounties for {msg.brand_name}: {bounty_result.get('analysis_summary', 'Unknown error')}")
+            failed_bounty_runs[msg.brand_name] = {"run_id": msg.run_id, "error": bounty_result.get('analysis_summary', 'Unknown error')}
+            await notify_bounty_waiters()
             
             # Send acknowledgment with error status
             response = MetricsResponse(
@@ -541,6 +730,8 @@ async def handle_metrics_data(ctx: Context, sender: str, msg: MetricsData):
             
     except Exception as e:
         ctx.logger.error(f"❌ Error during auto-bounty generation for {msg.brand_name}: {e}")
+        failed_bounty_runs[msg.brand_name] = {"run_id": msg.run_id, "error": str(e)}
+        await notify_bounty_waiters()
         
         # Send acknowledgment with error status
         response = MetricsResponse(
@@ -849,6 +1040,65 @@ async def handle_auto_generated_bounties_for_brand(ctx: Context, brand_name: str
             agent_address=ctx.agent.address
         )
 
+@agent.on_rest_post("/bounties/wait", BountyWaitRequest, BountyWaitResponse)
+async def handle_wait_for_bounties(ctx: Context, req: BountyWaitRequest) -> BountyWaitResponse:
+    """Long-poll until auto-generated bounties exist for this brand (and run), or the timeout expires.
+    
+    uAgents REST routes do not support path parameters, so brand and run are
+    passed in the request body.
+    """
+    ctx.logger.info(f"Waiting for auto-generated bounties for {req.brand_name} (run: {req.run_id})")
+    timeout = max(0, min(req.timeout_seconds, BOUNTY_WAIT_MAX_TIMEOUT))
+    
+    def find_bounties():
+        generated_bounties = ctx.storage.get('generated_bounties') or {}
+        brand_bounties = generated_bounties.get(req.brand_name)
+        if brand_bounties and (req.run_id is None or brand_bounties.get("run_id") == req.run_id):
+            return brand_bounties
+        return None
+    
+    def find_failure():
+        failure = failed_bounty_runs.get(req.brand_name)
+        if failure and (req.run_id is None or failure["run_id"] == req.run_id):
+            return failure
+        return None
+    
+    try:
+        async with bounty_ready:
+            await asyncio.wait_for(
+                bounty_ready.wait_for(lambda: find_bounties() is not None or find_failure() is not None),
+                timeout=timeout
+            )
+    except asyncio.TimeoutError:
+        pass
+    
+    brand_bounties = find_bounties()
+    if brand_bounties is not None:
+        ctx.logger.info(f"📋 Returning bounties for {req.brand_name} (run: {req.run_id})")
+        return BountyWaitResponse(
+            success=True,
+            ready=True,
+            status="completed",
+            brand_name=req.brand_name,
+            run_id=req.run_id,
+            auto_generated_bounties={req.brand_name: brand_bounties},
+            timestamp=datetime.now(timezone.utc).isoformat(),
+            agent_address=ctx.agent.address
+        )
+    
+    failure = find_failure()
+    return BountyWaitResponse(
+        success=False,
+        ready=False,
+        status="failed" if failure else "pending",
+        brand_name=req.brand_name,
+        run_id=req.run_id,
+        auto_generated_bounties={},
+        error=failure["error"] if failure else None,
+        timestamp=datetime.now(timezone.utc).isoformat(),
+        agent_address=ctx.agent.address
+    )
+
 # Include the chat protocol
 agent.include(chat_proto, publish_manifest=True)
 
@@ -869,6 +1119,8 @@ if __name__ == '__main__':
     print("GET  http://localhost:8080/metrics/received")
     print("GET  http://localhost:8080/bounties/auto-generated (returns most recent company)")
     print("GET  http://localhost:8080/bounties/auto-generated/Tesla")
+    print("POST http://localhost:8080/bounties/wait")
+    print("Body: {\"brand_name\": \"Tesla\", \"run_id\": \"<orchestrator job id>\", \"timeout_seconds\": 25}")
     print("\n🧪 Test queries:")
     print("- 'generate bounties for Tesla'")
     print("- 'bounties for Apple'")
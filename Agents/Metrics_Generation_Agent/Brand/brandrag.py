@@ -1,31 +1,72 @@
 # brandrag.py
+import os
 import requests
 import json
+from collections import OrderedDict
 from typing import List, Dict, Optional
 
+# Knowledge graph responses kept for conditional (ETag) revalidation
+KG_CACHE_SIZE = int(os.environ.get("KG_CACHE_SIZE", "128"))
+# Token budget for the evidence retrieved into an LLM prompt (each agent has its own variable)
+KG_EVIDENCE_TOKENS = int(os.environ.get("METRICS_EVIDENCE_TOKENS", "3000"))
+# Prompt with the brand digest the KG computes at ingestion instead of raw items
+KG_USE_DIGEST = os.environ.get("KG_USE_DIGEST", "false").lower() == "true"
+EVIDENCE_FIELDS = ['web_results', 'positive_reddit', 'negative_reddit', 'positive_reviews',
+                   'negative_reviews', 'positive_social', 'negative_social']
+
 class BrandRAG:
     def __init__(self, metta_instance):
         self.metta = metta_instance
         # Your ngrok URL - update this with your current ngrok URL
         self.kg_base_url = "https://orchestrator-739298578243.us-central1.run.app"
+        self.cache = OrderedDict()
+        self.cache_size = KG_CACHE_SIZE
+        self.cache_stats = {"downloaded": 0, "revalidated": 0}
+        self.use_digest = KG_USE_DIGEST
+    
+    def cached_get(self, url: str, params: Dict = None):
+        """GET through the local LRU cache, revalidating cached responses with If-None-Match.
+        
+        Returns (status_code, parsed JSON or None, error text).
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        cached = self.cache.get(key)
+        headers = {"If-None-Match": cached["etag"]} if cached else {}
+        response = requests.get(url, params=params, headers=headers, timeout=30)
+        
+        if response.status_code == 304 and cached:
+            self.cache.move_to_end(key)
+            self.cache_stats["revalidated"] += 1
+            print(f"♻️ Not modified, using cached response ({self.cache_stats['revalidated']} revalidated so far)")
+            return 200, cached["data"], ""
+        if response.status_code != 200:
+            return response.status_code, None, response.text
+        
+        data = response.json()
+        self.cache_stats["downloaded"] += 1
+        etag = response.headers.get("ETag")
+        if etag:
+            self.cache[key] = {"etag": etag, "data": data}
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return 200, data, ""
     
     def get_all_brands(self) -> List[str]:
         """Get all brands available in the knowledge graph."""
         try:
             url = f"{self.kg_base_url}/kg/get_all_brands"
             print(f"🌐 Making request to: {url}")
-            response = requests.get(url)
-            print(f"📡 Response status: {response.status_code}")
-            print(f"📡 Response headers: {dict(response.headers)}")
+            status_code, data, error_text = self.cached_get(url)
+            print(f"📡 Response status: {status_code}")
             
-            if response.status_code == 200:
-                data = response.json()
+            if status_code == 200:
                 print(f"📊 Response data: {data}")
                 brands = data.get("brands", [])
                 print(f"📊 Extracted brands: {brands}")
                 return brands
             else:
-                print(f"❌ Error response: {response.text}")
+                print(f"❌ Error response: {error_text}")
             return []
         except Exception as e:
             print(f"❌ Error fetching brands: {e}")
@@ -44,11 +85,10 @@ class BrandRAG:
             print(f"🌐 Making request to: {url}")
             print(f"📤 Request params: {params}")
             
-            response = requests.get(url, params=params)
-            print(f"📡 Response status: {response.status_code}")
+            status_code, data, error_text = self.cached_get(url, params)
+            print(f"📡 Response status: {status_code}")
             
-            if response.status_code == 200:
-                data = response.json()
+            if status_code == 200:
                 print(f"📊 Response data: {data}")
                 results = data.get("results", [])
                 print(f"📊 Extracted results: {len(results)} items")
@@ -56,25 +96,30 @@ class BrandRAG:
                     print(f"📊 Sample result: {results[0][:100]}..." if len(results[0]) > 100 else f"📊 Sample result: {results[0]}")
                 return results
             else:
-                print(f"❌ Error response: {response.text}")
+                print(f"❌ Error response: {error_text}")
             return []
         except Exception as e:
             print(f"❌ Error querying brand data: {e}")
             return []
     
-    def get_brand_summary(self, brand_name: str) -> Dict:
-        """Get comprehensive brand summary from knowledge graph."""
+    def get_brand_summary(self, brand_name: str, itemized: bool = False) -> Dict:
+        """Get comprehensive brand summary from knowledge graph.
+        
+        With itemized=True each field lists one line per parsed review / post / comment
+        instead of the agents' whole results, so counts and [:n] slices are per item.
+        """
         try:
             url = f"{self.kg_base_url}/kg/get_brand_summary"
             params = {"brand_name": brand_name}
+            if itemized:
+                params["itemized"] = "true"
             print(f"🌐 Making request to: {url}")
             print(f"📤 Request params: {params}")
             
-            response = requests.get(url, params=params)
-            print(f"📡 Response status: {response.status_code}")
+            status_code, data, error_text = self.cached_get(url, params)
+            print(f"📡 Response status: {status_code}")
             
-            if response.status_code == 200:
-                data = response.json()
+            if status_code == 200:
                 print(f"📊 Response data: {data}")
                 summary = data.get("summary", {})
                 print(f"📊 Extracted summary: {type(summary)} - {bool(summary)}")
@@ -82,12 +127,166 @@ class BrandRAG:
                     print(f"📊 Summary keys: {list(summary.keys()) if isinstance(summary, dict) else 'Not a dict'}")
                 return summary
             else:
-                print(f"❌ Error response: {response.text}")
+                print(f"❌ Error response: {error_text}")
             return {}
         except Exception as e:
             print(f"❌ Error getting brand summary: {e}")
             return {}
     
+    def get_brand_items(self, brand_name: str, data_type: str = None, sentiment: str = None,
+                        offset: int = 0, limit: int = 50, sample: int = None) -> Dict:
+        """Get parsed item records (quote, author, rating, date, platform, url, sentiment) for a brand.
+        
+        Returns {"total", "counts" per field, "items"}; page with offset/limit or take an even sample.
+        """
+        try:
+            url = f"{self.kg_base_url}/kg/get_brand_items"
+            params = {"brand_name": brand_name, "offset": offset, "limit": limit}
+            if data_type:
+                params["data_type"] = data_type
+            if sentiment:
+                params["sentiment"] = sentiment
+            if sample:
+                params["sample"] = sample
+            print(f"🌐 Making request to: {url}")
+            print(f"📤 Request params: {params}")
+            
+            status_code, data, error_text = self.cached_get(url, params)
+            print(f"📡 Response status: {status_code}")
+            
+            if status_code == 200:
+                print(f"📊 {len(data.get('items', []))} of {data.get('total', 0)} items, counts: {data.get('counts', {})}")
+                return data
+            else:
+                print(f"❌ Error response: {error_text}")
+            return {"total": 0, "counts": {}, "items": []}
+        except Exception as e:
+            print(f"❌ Error getting brand items: {e}")
+            return {"total": 0, "counts": {}, "items": []}
+    
+    def get_brand_digest(self, brand_name: str) -> str:
+        """The brand's digest text (per-source counts, ratings, themes and representative items), or "" if unavailable."""
+        try:
+            url = f"{self.kg_base_url}/kg/get_brand_digest"
+            params = {"brand_name": brand_name}
+            print(f"🌐 Making request to: {url}")
+            print(f"📤 Request params: {params}")
+            
+            status_code, data, error_text = self.cached_get(url, params)
+            print(f"📡 Response status: {status_code}")
+            
+            if status_code == 200:
+                digest = data.get("digest", {})
+                print(f"📊 Digest for version {digest.get('version')}: {len(digest.get('text', ''))} chars")
+                return digest.get("text", "")
+            else:
+                print(f"❌ Error response: {error_text}")
+            return ""
+        except Exception as e:
+            print(f"❌ Error getting brand digest: {e}")
+            return ""
+    
+    def retrieve_evidence(self, brand_name: str, query: str, k: int = 20, token_budget: int = None,
+                          data_types: List[str] = None, sentiments: List[str] = None) -> Dict[str, List[str]]:
+        """The brand's items most relevant to a prompt's task (best first, within k items and a token budget).
+        
+        Returns a summary-shaped dict (field -> list of item lines) to build the prompt from,
+        or {} when nothing could be retrieved so callers can fall back to the full summary.
+        """
+        try:
+            url = f"{self.kg_base_url}/kg/retrieve"
+            payload = {"brand_name": brand_name, "query": query, "k": k,
+                       "token_budget": token_budget or KG_EVIDENCE_TOKENS}
+            if data_types:
+                payload["data_types"] = data_types
+            if sentiments:
+                payload["sentiments"] = sentiments
+            print(f"🌐 Making request to: {url}")
+            print(f"📤 Request payload: {payload}")
+            
+            response = requests.post(url, json=payload, timeout=30)
+            print(f"📡 Response status: {response.status_code}")
+            
+            if response.status_code == 200:
+                data = response.json()
+                passages = data.get("passages", [])
+                print(f"📊 Retrieved {len(passages)} of {data.get('candidates', 0)} items ({data.get('tokens_used', 0)} tokens)")
+                if not passages:
+                    return {}
+                evidence = {field: [] for field in EVIDENCE_FIELDS}
+                for passage in passages:
+                    evidence.setdefault(passage["field"], []).append(passage["text"])
+                return evidence
+            else:
+                print(f"❌ Error response: {response.text}")
+            return {}
+        except Exception as e:
+            print(f"❌ Error retrieving evidence: {e}")
+            return {}
+    
+    def search(self, query: str, brands: List[str] = None, sources: List[str] = None, sentiments: List[str] = None,
+               match: str = "all", offset: int = 0, limit: int = 20) -> Dict:
+        """Full-text search across brands' stored items, best matches first.
+        
+        Returns {"total", "results": [item + brand_name, field, data_type, score]}.
+        """
+        try:
+            url = f"{self.kg_base_url}/kg/search"
+            params = {"q": query, "match": match, "offset": offset, "limit": limit}
+            if brands:
+                params["brand"] = brands
+            if sources:
+                params["source"] = sources
+            if sentiments:
+                params["sentiment"] = sentiments
+            print(f"🌐 Making request to: {url}")
+            print(f"📤 Request params: {params}")
+            
+            response = requests.get(url, params=params, timeout=30)
+            print(f"📡 Response status: {response.status_code}")
+            
+            if response.status_code == 200:
+                data = response.json()
+                print(f"📊 {data.get('total', 0)} matches for '{query}'")
+                return data
+            else:
+                print(f"❌ Error response: {response.text}")
+            return {"total": 0, "results": []}
+        except Exception as e:
+            print(f"❌ Error searching knowledge graph: {e}")
+            return {"total": 0, "results": []}
+    
+    def get_brands_batch(self, brand_names: List[str], data_types: List[str] = None, sentiments: List[str] = None,
+                         include_all_brands: bool = False) -> Dict:
+        """Get data for several brands (optionally only some data types / sentiments) in one request.
+        
+        Returns {"results": {brand: summary}, "missing": [brands not in the KG]} plus
+        "all_brands" when include_all_brands is set.
+        """
+        try:
+            url = f"{self.kg_base_url}/kg/batch"
+            payload = {"brands": brand_names, "include_all_brands": include_all_brands}
+            if data_types:
+                payload["data_types"] = data_types
+            if sentiments:
+                payload["sentiments"] = sentiments
+            print(f"🌐 Making request to: {url}")
+            print(f"📤 Request payload: {payload}")
+            
+            response = requests.post(url, json=payload, timeout=30)
+            print(f"📡 Response status: {response.status_code}")
+            
+            if response.status_code == 200:
+                data = response.json()
+                print(f"📊 Batch results for {len(data.get('results', {}))} brands, missing: {data.get('missing', [])}")
+                return data
+            else:
+                print(f"❌ Error response: {response.text}")
+            return {"results": {}, "missing": brand_names}
+        except Exception as e:
+            print(f"❌ Error fetching brand batch: {e}")
+            return {"results": {}, "missing": brand_names}
+    
     def query_web_results(self, brand_name: str) -> List[str]:
         """Get web search results for a brand."""
         return self.query_brand_data(brand_name, "web_results")
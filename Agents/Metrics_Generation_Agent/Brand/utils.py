@@ -92,7 +92,7 @@ def process_query(query, rag: BrandRAG, llm: LLM):
     elif intent == "brand_research" and keyword:
         # Get comprehensive brand data
         print(f"🔍 Fetching comprehensive brand data for: '{keyword}'")
-        brand_summary = rag.get_brand_summary(keyword)
+        brand_summary = rag.get_brand_summary(keyword, itemized=True)
         print(f"📊 Brand summary received: {type(brand_summary)} - {bool(brand_summary)}")
         
         if brand_summary:
@@ -116,6 +116,18 @@ def process_query(query, rag: BrandRAG, llm: LLM):
             print(f"   Positive Social: {len(positive_social) if positive_social else 0} items")
             print(f"   Negative Social: {len(negative_social) if negative_social else 0} items")
             
+            # Prompt with the precomputed digest when opted in, else the items most relevant to the query
+            digest = rag.get_brand_digest(keyword) if rag.use_digest else ""
+            evidence = {} if digest else rag.retrieve_evidence(keyword, query)
+            if evidence:
+                web_results = evidence['web_results']
+                positive_reviews = evidence['positive_reviews']
+                negative_reviews = evidence['negative_reviews']
+                positive_reddit = evidence['positive_reddit']
+                negative_reddit = evidence['negative_reddit']
+                positive_social = evidence['positive_social']
+                negative_social = evidence['negative_social']
+            
             # Create comprehensive data summary for LLM
             all_data = []
             
@@ -140,7 +152,7 @@ def process_query(query, rag: BrandRAG, llm: LLM):
             if negative_social:
                 all_data.append(f"NEGATIVE SOCIAL MEDIA:\n{chr(10).join(negative_social[:5])}")  # Top 5 negative social
             
-            comprehensive_data = "\n\n".join(all_data)
+            comprehensive_data = digest or "\n\n".join(all_data)
             
             prompt = (
                 f"Query: '{query}'\n"
@@ -175,7 +187,7 @@ def process_query(query, rag: BrandRAG, llm: LLM):
         print(f"🔍 Fetching comprehensive brand data for sentiment analysis: '{keyword}'")
         
         # Get ALL brand data from knowledge graph
-        brand_summary = rag.get_brand_summary(keyword)
+        brand_summary = rag.get_brand_summary(keyword, itemized=True)
         print(f"📊 Brand summary received: {type(brand_summary)} - {bool(brand_summary)}")
         
         if brand_summary:
@@ -199,6 +211,18 @@ def process_query(query, rag: BrandRAG, llm: LLM):
             print(f"   Positive Social: {len(positive_social) if positive_social else 0} items")
             print(f"   Negative Social: {len(negative_social) if negative_social else 0} items")
             
+            # Prompt with the precomputed digest when opted in, else the items most relevant to the query
+            digest = rag.get_brand_digest(keyword) if rag.use_digest else ""
+            evidence = {} if digest else rag.retrieve_evidence(keyword, query)
+            if evidence:
+                web_results = evidence['web_results']
+                positive_reviews = evidence['positive_reviews']
+                negative_reviews = evidence['negative_reviews']
+                positive_reddit = evidence['positive_reddit']
+                negative_reddit = evidence['negative_reddit']
+                positive_social = evidence['positive_social']
+                negative_social = evidence['negative_social']
+            
             # Create comprehensive data summary for LLM
             all_data = []
             
@@ -223,7 +247,7 @@ def process_query(query, rag: BrandRAG, llm: LLM):
             if negative_social:
                 all_data.append(f"NEGATIVE SOCIAL MEDIA:\n{chr(10).join(negative_social[:3])}")  # Top 3 negative social
             
-            comprehensive_data = "\n\n".join(all_data)
+            comprehensive_data = digest or "\n\n".join(all_data)
             
             prompt = (
                 f"Query: '{query}'\n"
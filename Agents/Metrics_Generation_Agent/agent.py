@@ -113,6 +113,7 @@ class MetricsData(Model):
     negative_social: List[str]
     timestamp: str
     source_agent: str
+    run_id: Optional[str] = None
 
 class MetricsResponse(Model):
     success: bool
@@ -122,6 +123,9 @@ class MetricsResponse(Model):
 
 class BrandMetricsRequest(Model):
     brand_name: str
+    run_id: Optional[str] = None
+    # False recomputes metrics without starting another bounty generation (e.g. a refresh)
+    forward_to_bounty: bool = True
 
 class BrandMetricsResponse(Model):
     success: bool
@@ -130,8 +134,12 @@ class BrandMetricsResponse(Model):
     timestamp: str
     agent_address: str
 
-async def send_metrics_to_bounty_agent(ctx: Context, brand_name: str, brand_summary: Dict):
-    """Send brand metrics data to the bounty agent via A2A communication."""
+async def send_metrics_to_bounty_agent(ctx: Context, brand_name: str, brand_summary: Dict, run_id: Optional[str] = None):
+    """Send brand metrics data to the bounty agent via A2A communication.
+    
+    ``run_id`` identifies the orchestrator run so the bounty agent can wake up
+    whoever is waiting on bounties for this exact run.
+    """
     try:
         # Extract data from brand summary
         web_results = brand_summary.get('web_results', [])
@@ -153,7 +161,8 @@ async def send_metrics_to_bounty_agent(ctx: Context, brand_name: str, brand_summ
             positive_social=positive_social,
             negative_social=negative_social,
             timestamp=datetime.now(timezone.utc).isoformat(),
-            source_agent=ctx.agent.address
+            source_agent=ctx.agent.address,
+            run_id=run_id
         )
         
         # Get bounty agent address from environment variable or use default
@@ -170,17 +179,26 @@ async def send_metrics_to_bounty_agent(ctx: Context, brand_name: str, brand_summ
     except Exception as e:
         ctx.logger.error(f"❌ Error sending metrics to bounty agent: {e}")
 
+# Retrieval query for the evidence behind the metrics prompt
+METRICS_EVIDENCE_QUERY = ("customer satisfaction sentiment product quality price value service support "
+                          "reliability reputation trust complaints problems praise love recommend")
+
 def generate_brand_metrics(brand_name: str, brand_summary: Dict, llm: LLM) -> Dict:
     """Generate comprehensive brand metrics using LLM analysis."""
     
+    # Use the precomputed digest when opted in, else the items most relevant to brand health
+    # (within the token budget), else the summary
+    digest = rag.get_brand_digest(brand_name) if rag.use_digest else ""
+    evidence = {} if digest else rag.retrieve_evidence(brand_name, METRICS_EVIDENCE_QUERY) or brand_summary
+    
     # Extract all data types
-    web_results = brand_summary.get('web_results', [])
-    positive_reviews = brand_summary.get('positive_reviews', [])
-    negative_reviews = brand_summary.get('negative_reviews', [])
-    positive_reddit = brand_summary.get('positive_reddit', [])
-    negative_reddit = brand_summary.get('negative_reddit', [])
-    positive_social = brand_summary.get('positive_social', [])
-    negative_social = brand_summary.get('negative_social', [])
+    web_results = evidence.get('web_results', [])
+    positive_reviews = evidence.get('positive_reviews', [])
+    negative_reviews = evidence.get('negative_reviews', [])
+    positive_reddit = evidence.get('positive_reddit', [])
+    negative_reddit = evidence.get('negative_reddit', [])
+    positive_social = evidence.get('positive_social', [])
+    negative_social = evidence.get('negative_social', [])
     
     # Create comprehensive data summary for LLM
     all_data = []
@@ -206,7 +224,7 @@ def generate_brand_metrics(brand_name: str, brand_summary: Dict, llm: LLM) -> Di
     if negative_social:
         all_data.append(f"NEGATIVE SOCIAL MEDIA:\n{chr(10).join(negative_social[:5])}")
     
-    comprehensive_data = "\n\n".join(all_data)
+    comprehensive_data = digest or "\n\n".join(all_data)
     
     # Create the comprehensive metrics generation prompt
     prompt = f"""
@@ -653,8 +671,8 @@ async def handle_brand_metrics(ctx: Context, req: BrandMetricsRequest) -> BrandM
     ctx.logger.info(f"Received brand metrics request for: {req.brand_name}")
     
     try:
-        # Get comprehensive brand data from knowledge graph
-        brand_summary = rag.get_brand_summary(req.brand_name)
+        # Get comprehensive brand data from knowledge graph, one entry per review / post / comment
+        brand_summary = rag.get_brand_summary(req.brand_name, itemized=True)
         
         if brand_summary:
             # Generate comprehensive metrics using LLM
@@ -666,7 +684,10 @@ async def handle_brand_metrics(ctx: Context, req: BrandMetricsRequest) -> BrandM
             last_brand_name = req.brand_name
             
             # Send metrics data to bounty agent via A2A communication
-            await send_metrics_to_bounty_agent(ctx, req.brand_name, brand_summary)
+            if req.forward_to_bounty:
+                await send_metrics_to_bounty_agent(ctx, req.brand_name, brand_summary, req.run_id)
+            else:
+                ctx.logger.info(f"⏭️ Not forwarding metrics for {req.brand_name} to the bounty agent (forward_to_bounty=false)")
             
             return BrandMetricsResponse(
                 success=True,
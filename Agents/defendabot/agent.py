@@ -42,6 +42,8 @@ class BrandDefenseRequest(Model):
     negative_social_sentiment: Union[List[str], str]
     negative_reviews: Union[List[str], str]
     negative_reddit_threads: Union[List[str], str]
+    # With a brand name the tweet is based on the most relevant negative items in the knowledge graph
+    brand_name: Optional[str] = None
 
 class BrandDefenseResponse(Model):
     success: bool
@@ -67,6 +69,76 @@ class LLM:
         )
         return completion.choices[0].message.content
 
+# Knowledge graph evidence for the defense prompt
+KG_BASE_URL = os.environ.get("KG_BASE_URL", "https://orchestrator-739298578243.us-central1.run.app")
+# (a budget of its own: defense replies need far less evidence than metrics or bounty analysis)
+DEFENSE_EVIDENCE_TOKENS = int(os.environ.get("DEFENDABOT_EVIDENCE_TOKENS", "600"))
+DEFENSE_EVIDENCE_QUERY = "complaints problems frustrations disappointed broken slow expensive bad service"
+# Use the per-source digests the knowledge graph computes at ingestion instead of retrieved items
+KG_USE_DIGEST = os.environ.get("KG_USE_DIGEST", "false").lower() == "true"
+NEGATIVE_FIELDS = {
+    "negative_social": "negative_social_sentiment",
+    "negative_reviews": "negative_reviews",
+    "negative_reddit": "negative_reddit_threads"
+}
+
+def retrieve_negative_evidence(brand_name: str) -> Dict:
+    """The brand's negative items most relevant to a defense, within the token budget ({} when unavailable)."""
+    try:
+        payload = {
+            "brand_name": brand_name,
+            "query": DEFENSE_EVIDENCE_QUERY,
+            "k": 9,
+            "token_budget": DEFENSE_EVIDENCE_TOKENS,
+            "sentiments": ["negative"]
+        }
+        response = requests.post(f"{KG_BASE_URL}/kg/retrieve", json=payload, timeout=30)
+        print(f"📡 Knowledge graph retrieve response status: {response.status_code}")
+        if response.status_code != 200:
+            return {}
+        passages = response.json().get("passages", [])
+        print(f"📊 Retrieved {len(passages)} negative items for {brand_name}")
+        if not passages:
+            return {}
+        evidence = {key: [] for key in NEGATIVE_FIELDS.values()}
+        for passage in passages:
+            if passage["field"] in NEGATIVE_FIELDS:
+                evidence[NEGATIVE_FIELDS[passage["field"]]].append(passage["text"])
+        return evidence
+    except Exception as e:
+        print(f"❌ Error retrieving knowledge graph evidence: {e}")
+        return {}
+
+def retrieve_negative_digest(brand_name: str) -> Dict:
+    """The digests of the brand's negative sources (counts, themes, representative items), {} when unavailable."""
+    try:
+        response = requests.get(f"{KG_BASE_URL}/kg/get_brand_digest", params={"brand_name": brand_name}, timeout=30)
+        print(f"📡 Knowledge graph digest response status: {response.status_code}")
+        if response.status_code != 200:
+            return {}
+        sources = response.json().get("digest", {}).get("sources", {})
+        digest = {
+            key: [sources[field]["text"]] if sources.get(field, {}).get("items") else []
+            for field, key in NEGATIVE_FIELDS.items()
+        }
+        return digest if any(digest.values()) else {}
+    except Exception as e:
+        print(f"❌ Error getting knowledge graph digest: {e}")
+        return {}
+
+def trim_to_budget(values: List[str], tokens: int) -> List[str]:
+    """Keep whole entries while they fit in the token budget (about four characters per token), cutting the first one if needed."""
+    budget = tokens * 4
+    trimmed = []
+    for value in values:
+        if len(value) > budget:
+            if not trimmed:
+                trimmed.append(value[:budget])
+            break
+        trimmed.append(value)
+        budget -= len(value)
+    return trimmed
+
 def generate_defense_tweet(negative_data: Dict, llm: LLM) -> str:
     """Generate a positive defense tweet based on negative sentiment data."""
     
@@ -75,17 +147,22 @@ def generate_defense_tweet(negative_data: Dict, llm: LLM) -> str:
     negative_reviews = negative_data.get('negative_reviews', [])
     negative_reddit = negative_data.get('negative_reddit_threads', [])
     
+    # Raw agent results can be huge: give each source a third of the token budget
+    negative_social = trim_to_budget(negative_social[:3], DEFENSE_EVIDENCE_TOKENS // 3)
+    negative_reviews = trim_to_budget(negative_reviews[:3], DEFENSE_EVIDENCE_TOKENS // 3)
+    negative_reddit = trim_to_budget(negative_reddit[:3], DEFENSE_EVIDENCE_TOKENS // 3)
+    
     # Create comprehensive negative data summary for LLM
     all_negative_data = []
     
     if negative_social:
-        all_negative_data.append(f"NEGATIVE SOCIAL MEDIA:\n{chr(10).join(negative_social[:3])}")
+        all_negative_data.append(f"NEGATIVE SOCIAL MEDIA:\n{chr(10).join(negative_social)}")
     
     if negative_reviews:
-        all_negative_data.append(f"NEGATIVE REVIEWS:\n{chr(10).join(negative_reviews[:3])}")
+        all_negative_data.append(f"NEGATIVE REVIEWS:\n{chr(10).join(negative_reviews)}")
     
     if negative_reddit:
-        all_negative_data.append(f"NEGATIVE REDDIT THREADS:\n{chr(10).join(negative_reddit[:3])}")
+        all_negative_data.append(f"NEGATIVE REDDIT THREADS:\n{chr(10).join(negative_reddit)}")
     
     comprehensive_negative_data = "\n\n".join(all_negative_data)
     
@@ -271,6 +348,9 @@ async def handle_brand_defense(ctx: Context, req: BrandDefenseRequest) -> BrandD
             "negative_reviews": ensure_list(req.negative_reviews),
             "negative_reddit_threads": ensure_list(req.negative_reddit_threads)
         }
+        if req.brand_name:
+            evidence = retrieve_negative_digest(req.brand_name) if KG_USE_DIGEST else {}
+            negative_data = evidence or retrieve_negative_evidence(req.brand_name) or negative_data
         
         # Generate defense tweet
         defense_tweet = generate_defense_tweet(negative_data, llm)